@@ -0,0 +1,224 @@
+import datetime, gzip, os
+
+import singer
+from singer.messages import Message
+
+from . import codec
+
+
+LOGGER = singer.get_logger()
+
+BATCH_FORMATS = ("jsonl", "parquet")
+
+
+class BatchMessage(Message):
+    """Singer BATCH message pointing the target to locally written files.
+
+    The message carries the file encoding and a manifest of file URLs, e.g.
+    {"type": "BATCH", "stream": "users",
+     "encoding": {"format": "jsonl", "compression": "gzip"},
+     "manifest": ["file:///tmp/batch/users-...-00000.jsonl.gz"]}
+    """
+    def __init__(self, stream, encoding, manifest):
+        self.stream = stream
+        self.encoding = encoding
+        self.manifest = manifest
+
+    def asdict(self):
+        return {
+            "type": "BATCH",
+            "stream": self.stream,
+            "encoding": self.encoding,
+            "manifest": self.manifest,
+        }
+
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _json_string(value):
+    return None if value is None else codec.dumps(value)
+
+
+def _compile_arrow_type(prop):
+    """Return (arrow type, converter) for a JSON schema property. The converter
+    (None when the value is written as is) reshapes a record value to the type.
+
+    Properties without a single fixed type (no type, anyOf, free-form objects and
+    arrays, mixed types) are written as JSON strings.
+    """
+    import pyarrow as pa
+
+    types = prop.get("type")
+    if isinstance(types, str):
+        types = [types]
+    types = set(types or []) - {"null"}
+    if "anyOf" in prop or not types:
+        return pa.string(), _json_string
+    if types <= {"integer", "number"}:
+        return (pa.float64() if "number" in types else pa.int64()), None
+    if len(types) > 1:
+        return pa.string(), _json_string
+    json_type = types.pop()
+    if json_type == "string":
+        return pa.string(), None
+    if json_type == "boolean":
+        return pa.bool_(), None
+    if json_type == "object" and prop.get("properties"):
+        fields = [(name, ) + _compile_arrow_type(sub)
+                  for name, sub in prop["properties"].items()]
+
+        def convert(value):
+            if value is None:
+                return None
+            return {name: conv(value.get(name)) if conv else value.get(name)
+                    for name, _, conv in fields}
+        return pa.struct([pa.field(name, t) for name, t, _ in fields]), convert
+    if json_type == "array" and isinstance(prop.get("items"), dict):
+        item_type, item_conv = _compile_arrow_type(prop["items"])
+        if item_conv is None:
+            return pa.list_(item_type), None
+
+        def convert(value):
+            return None if value is None else [item_conv(v) for v in value]
+        return pa.list_(item_type), convert
+    return pa.string(), _json_string
+
+
+def get_arrow_schema(schema):
+    """Return (pyarrow schema, record converter) for the stream's JSON schema.
+
+    Every file of the stream then has the same columns and types, whatever the
+    records of the file happen to hold. Fields missing from the schema are
+    dropped.
+    """
+    import pyarrow as pa
+    arrow_type, convert = _compile_arrow_type(schema)
+    return pa.schema([arrow_type.field(i) for i in range(arrow_type.num_fields)]), convert
+
+
+class BatchWriter(object):
+    """Write the records of one stream to rolling local files and announce each
+    file with a BATCH message once it is durably closed.
+
+    - batch_format: jsonl (gzip'd JSON lines) or parquet (requires pyarrow)
+    - batch_dir: Directory the batch files are written to
+    - batch_max_records: Roll the file after this number of records
+    - batch_max_bytes: Roll the file after this many (uncompressed JSON) bytes
+
+    A file is written under a temporary name, fsync'ed and renamed before its
+    BATCH message goes out, so a STATE message that follows flush() never
+    refers to records the target cannot read.
+
+    schema: The stream's JSON schema. The parquet columns are derived from it,
+    so that all the files of a stream share one Arrow schema.
+    """
+    def __init__(self, config, tap_stream_id, schema=None):
+        self.tap_stream_id = tap_stream_id
+        self.format = config.get("batch_format")
+        if self.format not in BATCH_FORMATS:
+            raise ValueError(f"Unknown batch_format: {self.format}. "
+                             f"Must be one of {', '.join(BATCH_FORMATS)}")
+        self.batch_dir = os.path.abspath(config.get("batch_dir") or "./batch")
+        self.max_records = config.get("batch_max_records") or 100000
+        self.max_bytes = config.get("batch_max_bytes") or 100 * 1024 * 1024
+
+        if self.format == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise Exception("batch_format parquet requires pyarrow. "
+                                "Install it with: pip install tap-rest-api[parquet]")
+        self._arrow_schema = None
+        self._to_row = None
+        if self.format == "parquet":
+            if schema and schema.get("properties"):
+                self._arrow_schema, self._to_row = get_arrow_schema(schema)
+            else:
+                LOGGER.warning(f"{tap_stream_id} has no schema properties. The parquet "
+                               "columns are inferred from the records of each file.")
+
+        os.makedirs(self.batch_dir, exist_ok=True)
+        self._prefix = "%s-%s" % (
+            tap_stream_id,
+            datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S%f"))
+        self._seq = 0
+        self._file = None
+        self._rows = None
+        self._tmp_path = None
+        self._path = None
+        self._records = 0
+        self._bytes = 0
+        self.files_written = 0
+        self.records_written = 0
+
+    def _open(self):
+        ext = "jsonl.gz" if self.format == "jsonl" else "parquet"
+        self._path = os.path.join(self.batch_dir,
+                                  f"{self._prefix}-{self._seq:05d}.{ext}")
+        self._tmp_path = self._path + ".tmp"
+        self._seq += 1
+        self._records = 0
+        self._bytes = 0
+        if self.format == "jsonl":
+            self._file = gzip.open(self._tmp_path, "wb")
+        else:
+            self._rows = []
+
+    def write(self, record):
+        if self._path is None:
+            self._open()
+        line = (codec.dumps(record) + "\n").encode("utf-8")
+        if self.format == "jsonl":
+            self._file.write(line)
+        else:
+            self._rows.append(self._to_row(record) if self._to_row else record)
+        self._records += 1
+        self._bytes += len(line)
+        if self._records >= self.max_records or self._bytes >= self.max_bytes:
+            self.flush()
+
+    def _close_parquet(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pylist(self._rows, schema=self._arrow_schema)
+        with open(self._tmp_path, "wb") as f:
+            pq.write_table(table, f, compression="snappy")
+            f.flush()
+            os.fsync(f.fileno())
+        self._rows = None
+
+    def flush(self):
+        """Close the current file (if any), make it durable and emit its BATCH
+        message. Call this before writing a STATE message."""
+        if self._path is None:
+            return
+        if self.format == "jsonl":
+            self._file.close()
+            with open(self._tmp_path, "rb+") as f:
+                os.fsync(f.fileno())
+            self._file = None
+            encoding = {"format": "jsonl", "compression": "gzip"}
+        else:
+            self._close_parquet()
+            encoding = {"format": "parquet", "compression": "snappy"}
+        os.replace(self._tmp_path, self._path)
+        _fsync_dir(self.batch_dir)
+
+        LOGGER.info(f"Batch file {self._path} closed with {self._records} records.")
+        singer.write_message(BatchMessage(self.tap_stream_id, encoding,
+                                          ["file://" + self._path]))
+        self.files_written += 1
+        self.records_written += self._records
+        self._path = None
+        self._tmp_path = None
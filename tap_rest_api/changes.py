@@ -0,0 +1,90 @@
+"""Change detection for streams re-extracted in full on every run: a persistent
+index of key -> record digest per stream, to write only the new and changed
+records and, optionally, deletion markers for the keys that disappeared.
+
+The index is a sqlite3 database per stream under change_detection_dir. The
+changes of a run are committed once its records were flushed, so a run that
+fails re-emits them on the next run (at least once).
+"""
+import os
+import sqlite3
+
+import simplejson as json
+import singer
+
+from . import codec
+
+
+LOGGER = singer.get_logger()
+
+DELETED_AT = "_sdc_deleted_at"
+
+
+class ChangeIndex(object):
+    """key -> digest of the records of a stream, with the run each key was
+    last seen in"""
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute("CREATE TABLE IF NOT EXISTS records "
+                         "(key TEXT PRIMARY KEY, digest TEXT NOT NULL, "
+                         "run INTEGER NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS runs (run INTEGER NOT NULL)")
+        row = self._db.execute("SELECT MAX(run) FROM runs").fetchone()
+        self.run = (row[0] or 0) + 1
+        self.new = 0
+        self.changed = 0
+        self.unchanged = 0
+
+    def update(self, key, digest):
+        """Record that the record of key has digest in this run. Returns True
+        when the record is new or changed."""
+        key = codec.dumps(key)
+        row = self._db.execute("SELECT digest FROM records WHERE key = ?",
+                               (key,)).fetchone()
+        if row is None:
+            self._db.execute("INSERT INTO records VALUES (?, ?, ?)",
+                             (key, digest, self.run))
+            self.new += 1
+            return True
+        self._db.execute("UPDATE records SET digest = ?, run = ? WHERE key = ?",
+                         (digest, self.run, key))
+        if row[0] == digest:
+            self.unchanged += 1
+            return False
+        self.changed += 1
+        return True
+
+    def missing_keys(self):
+        """The keys not seen in this run"""
+        for key, in self._db.execute("SELECT key FROM records WHERE run < ?",
+                                     (self.run,)):
+            yield codec.loads(key)
+
+    def commit(self, remove_missing=False):
+        if remove_missing:
+            self._db.execute("DELETE FROM records WHERE run < ?", (self.run,))
+        self._db.execute("INSERT INTO runs VALUES (?)", (self.run,))
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+
+def get_change_detection_keys(config, tap_stream_id):
+    """The key properties of the stream in change_detection_keys, or None"""
+    keys = config.get("change_detection_keys") or {}
+    if isinstance(keys, str):
+        keys = json.loads(keys)
+    return keys.get(tap_stream_id)
+
+
+def get_change_index(config, tap_stream_id):
+    """The ChangeIndex of the stream when change_detection_keys lists its keys,
+    or None"""
+    directory = config.get("change_detection_dir")
+    keys = get_change_detection_keys(config, tap_stream_id)
+    if not directory or not keys:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    return ChangeIndex(os.path.join(directory, tap_stream_id + ".sqlite"))
@@ -0,0 +1,119 @@
+"""JSON codec used to decode responses, write raw/batch records and digest records.
+
+orjson is used when it is installed (pip install tap-rest-api[fast]); otherwise
+simplejson. Both backends give the same semantics:
+
+- Integers of any size are decoded exactly, and NaN/Infinity are accepted
+  (orjson cannot do either, so such documents are decoded by simplejson).
+- Decimal and integers beyond 64 bits are written as JSON numbers (orjson does
+  not support them, so such documents are encoded by simplejson).
+- dumps() writes compact JSON in UTF-8 with non-finite floats as null, and
+  dumps_canonical() additionally sorts the keys, so the output and the record
+  digest are the same bytes whichever backend is installed (except for the
+  spelling of floats in exponent notation: 1e+16 vs 1e16).
+- Non-string dict keys are written as strings.
+"""
+import re
+
+import simplejson
+
+import singer
+
+
+LOGGER = singer.get_logger()
+
+_LONG_DIGITS = re.compile(rb"\d{20}")
+
+
+class SimplejsonCodec(object):
+    name = "simplejson"
+
+    def loads(self, data):
+        return simplejson.loads(data)
+
+    def dumps(self, obj):
+        return simplejson.dumps(obj, separators=(",", ":"), ensure_ascii=False,
+                                ignore_nan=True)
+
+    def dumps_canonical(self, obj):
+        return simplejson.dumps(obj, sort_keys=True, separators=(",", ":"),
+                                ensure_ascii=False, ignore_nan=True).encode("utf-8")
+
+
+class OrjsonCodec(SimplejsonCodec):
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+        self._option = orjson.OPT_NON_STR_KEYS
+        self._canonical_option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
+
+    def loads(self, data):
+        # orjson turns integers beyond 64 bits into floats. A run of 20+ digits
+        # (possibly inside a string, which only costs the slower path) may be one.
+        if _LONG_DIGITS.search(data if isinstance(data, bytes) else data.encode("utf-8")):
+            return super().loads(data)
+        try:
+            return self._orjson.loads(data)
+        except ValueError:
+            # orjson.JSONDecodeError, e.g. on NaN/Infinity
+            return super().loads(data)
+
+    def dumps(self, obj):
+        try:
+            return self._orjson.dumps(obj, option=self._option).decode("utf-8")
+        except TypeError:
+            # orjson.JSONEncodeError (a TypeError) e.g. on Decimal
+            return super().dumps(obj)
+
+    def dumps_canonical(self, obj):
+        try:
+            return self._orjson.dumps(obj, option=self._canonical_option)
+        except TypeError:
+            return super().dumps_canonical(obj)
+
+
+CODECS = {
+    "orjson": OrjsonCodec,
+    "simplejson": SimplejsonCodec,
+}
+
+_codec = None
+
+
+def set_codec(name=None):
+    """Select the codec by name. None or "auto" picks the fastest installed one."""
+    global _codec
+    if name in (None, "auto"):
+        for candidate in ("orjson", "simplejson"):
+            try:
+                _codec = CODECS[candidate]()
+                break
+            except ImportError:
+                continue
+    else:
+        if name not in CODECS:
+            raise ValueError(f"Unknown json_codec: {name}. "
+                             f"Must be one of auto, {', '.join(CODECS)}")
+        _codec = CODECS[name]()
+    LOGGER.debug(f"Using {_codec.name} JSON codec.")
+    return _codec
+
+
+def get_codec():
+    if _codec is None:
+        set_codec()
+    return _codec
+
+
+def loads(data):
+    return get_codec().loads(data)
+
+
+def dumps(obj):
+    return get_codec().dumps(obj)
+
+
+def dumps_canonical(obj):
+    return get_codec().dumps_canonical(obj)
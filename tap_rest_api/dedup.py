@@ -0,0 +1,94 @@
+"""Bounded indexes of the digests of the records written in a run, to drop the
+duplicates that overlapping pages, offset drift and {last_update} URLs return.
+
+- DigestIndex: exact, the last `size` digests (LRU).
+- BloomDigestIndex: two rotating Bloom filters of `size` digests each, so at
+  least the last `size` digests are covered in a fixed number of bytes. A
+  false positive (at about false_positive_rate) drops a record that is not a
+  duplicate.
+"""
+import collections
+import math
+
+import singer
+
+
+LOGGER = singer.get_logger()
+
+
+class DigestIndex(object):
+    """The last size digests written"""
+    def __init__(self, size):
+        self.size = size
+        self._digests = collections.OrderedDict()
+
+    def __contains__(self, digest):
+        if digest in self._digests:
+            self._digests.move_to_end(digest)
+            return True
+        return False
+
+    def add(self, digest):
+        self._digests[digest] = None
+        self._digests.move_to_end(digest)
+        if len(self._digests) > self.size:
+            self._digests.popitem(last=False)
+
+
+class BloomFilter(object):
+    def __init__(self, capacity, false_positive_rate):
+        self.capacity = capacity
+        self.bits = max(8, int(-capacity * math.log(false_positive_rate) /
+                               math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self._array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, digest):
+        # Double hashing over the two 64-bit halves of the md5 hex digest
+        h1 = int(digest[:16], 16)
+        h2 = int(digest[16:32], 16) | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def __contains__(self, digest):
+        return all(self._array[p >> 3] & (1 << (p & 7))
+                   for p in self._positions(digest))
+
+    def add(self, digest):
+        for p in self._positions(digest):
+            self._array[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+
+class BloomDigestIndex(object):
+    """At least the last size digests written, in two Bloom filters of size
+    digests: when the current one is full, it becomes the previous one."""
+    def __init__(self, size, false_positive_rate=0.001):
+        self.size = size
+        self.false_positive_rate = false_positive_rate
+        self._current = BloomFilter(size, false_positive_rate)
+        self._previous = None
+
+    def __contains__(self, digest):
+        return digest in self._current or (
+            self._previous is not None and digest in self._previous)
+
+    def add(self, digest):
+        if self._current.count >= self.size:
+            self._previous = self._current
+            self._current = BloomFilter(self.size, self.false_positive_rate)
+        self._current.add(digest)
+
+
+def get_digest_index(config):
+    """The digest index configured by dedup_window, dedup_method and
+    dedup_false_positive_rate, or None"""
+    size = config.get("dedup_window")
+    if not size:
+        return None
+    method = config.get("dedup_method") or "lru"
+    if method == "lru":
+        return DigestIndex(size)
+    if method == "bloom":
+        return BloomDigestIndex(size, config.get("dedup_false_positive_rate") or 0.001)
+    raise ValueError(f"Unknown dedup_method: {method}. Must be one of lru, bloom")
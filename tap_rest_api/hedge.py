@@ -0,0 +1,126 @@
+"""Hedged GET requests: when a request is slower than the stream's recent p95
+latency, a duplicate is sent and the first response wins.
+
+Only the idempotent page GETs of generate_request go through here: requests
+with another method or a body (http_method, request_body) are sent once. The number
+of duplicates is capped to hedge_max_rate of the requests, so hedging cannot
+multiply the traffic to an API that is slow across the board.
+"""
+import collections
+import threading
+import time
+
+import singer
+
+
+LOGGER = singer.get_logger()
+
+
+class LatencyTracker(object):
+    """Recent request latencies of one stream"""
+    def __init__(self, window=200):
+        self._latencies = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def percentile(self, q, min_samples=1):
+        """The q-th percentile (0-100) of the recent latencies, or None until
+        min_samples latencies were recorded."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies or len(latencies) < min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * q / 100))]
+
+
+class Hedger(object):
+    """Send a duplicate of a request that exceeds the p95 latency of its stream.
+
+    - hedge_max_rate: Max ratio of duplicates to requests (default 0.05)
+    - hedge_min_samples: Latencies to observe per stream before hedging (default 20)
+
+    requests cannot abort a request in flight: the loser runs to completion in
+    its worker thread and its response is closed and discarded.
+    """
+    PERCENTILE = 95
+
+    def __init__(self, config, max_workers=64):
+        from concurrent.futures import ThreadPoolExecutor
+        self.max_rate = config.get("hedge_max_rate")
+        if self.max_rate is None:
+            self.max_rate = 0.05
+        self.min_samples = config.get("hedge_min_samples") or 20
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="hedge")
+        self._trackers = collections.defaultdict(LatencyTracker)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedges = 0
+
+    def _allow_hedge(self):
+        with self._lock:
+            if self.hedges + 1 > self.max_rate * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+    def _timed(self, tracker, send):
+        started_at = time.monotonic()
+        resp = send()
+        tracker.add(time.monotonic() - started_at)
+        return resp
+
+    def get(self, stream_id, send):
+        """Call send() (a GET returning a response), hedged past the p95 latency"""
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        tracker = self._trackers[stream_id]
+        with self._lock:
+            self.requests += 1
+        threshold = tracker.percentile(self.PERCENTILE, self.min_samples)
+        primary = self._executor.submit(self._timed, tracker, send)
+        if threshold is None:
+            return primary.result()
+        done, _ = wait([primary], timeout=threshold)
+        if done or not self._allow_hedge():
+            return primary.result()
+
+        LOGGER.info("%s: request slower than p95 (%.3fs). Sending a hedged request."
+                    % (stream_id, threshold))
+        hedge = self._executor.submit(self._timed, tracker, send)
+        pending = {primary, hedge}
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = done.pop()
+            if winner.exception() is None or not pending:
+                break
+        for loser in pending | done:
+            loser.add_done_callback(_close_response)
+        return winner.result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+def _close_response(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+_hedger = None
+
+
+def configure(config):
+    """Enable hedging when the config sets hedge_requests"""
+    global _hedger
+    if _hedger is not None:
+        _hedger.shutdown()
+    _hedger = Hedger(config) if config.get("hedge_requests") else None
+    return _hedger
+
+
+def get_hedger():
+    return _hedger
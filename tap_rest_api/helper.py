@@ -1,15 +1,15 @@
-import attr, backoff, dateutil, datetime, hashlib, os, requests
+import backoff, collections, dataclasses, dateutil, datetime, functools, hashlib, os, re, requests, string, threading, time
 import simplejson as json
 from urllib.parse import quote as urlquote
 from requests.auth import HTTPBasicAuth, HTTPDigestAuth
 from dateutil.tz import tzoffset
 
-import jsonpath_ng as jsonpath
-
 import singer
-from singer import utils
+import singer.metadata
 import singer.metrics as metrics
 
+from . import codec, hedge, oauth, replay
+
 
 USER_AGENT = ("Mozilla/5.0 (Macintosh; scitylana.singer.io) " +
               "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/50.0.2661.102 " +
@@ -26,10 +26,10 @@ EXTRACT_TIMESTAMP = "_sdc_extracted_at"
 BATCH_TIMESTAMP = "_sdc_batched_at"
 
 
-@attr.s
+@dataclasses.dataclass(order=True)
 class Stream(object):
-    tap_stream_id = attr.ib()
-    kwargs = attr.ib()
+    tap_stream_id: str
+    kwargs: dict
 
 
 def get_streams(config):
@@ -71,8 +71,16 @@ def human_readable(bookmark_type, t):
     return readable
 
 
+@functools.lru_cache(maxsize=None)
+def _parse_jsonpath(path):
+    # jsonpath_ng (and its parser generator) is imported on first use: most
+    # streams and the discover mode never evaluate a jsonpath.
+    import jsonpath_ng
+    return jsonpath_ng.parse(path)
+
+
 def _get_jsonpath(raw, path):
-    jsonpath_expr = jsonpath.parse(path)
+    jsonpath_expr = _parse_jsonpath(path)
     record = [match.value for match in jsonpath_expr.find(raw)]
     return record
 
@@ -108,6 +116,60 @@ def unnest(data, json_path, target_col_name):
     return data
 
 
+def get_parent_stream(config, tap_stream_id):
+    """
+    Returns the parent stream setting of a child stream, or None:
+
+    parent_streams: {"<child stream>": {"parent": "<parent stream>",
+                                        "params": {"<URL param>": "<jsonpath>", ...}}}
+
+    The jsonpaths are evaluated against each parent record to produce the
+    params of that parent's child query.
+
+    Instead of a parent stream, "keys" can list the parent records, e.g.
+    {"keys": [1, 2, 3], "params": {"order_ids": "$"}}.
+    """
+    parent_streams = config.get("parent_streams")
+    if not parent_streams:
+        return None
+    if isinstance(parent_streams, str):
+        parent_streams = json.loads(parent_streams)
+    parent = parent_streams.get(tap_stream_id)
+    if parent and not parent.get("parent") and parent.get("keys") is None:
+        raise KeyError(f"parent_streams.{tap_stream_id} needs to set parent or keys")
+    if parent and isinstance(parent.get("keys"), str):
+        parent = dict(parent, keys=json.loads(parent["keys"]))
+    return parent
+
+
+def get_parent_params(record, param_paths):
+    """Extract the child query params from a parent record"""
+    params = dict()
+    for param, path in param_paths.items():
+        values = _get_jsonpath(record, path)
+        params[param] = values[0] if values else None
+    return params
+
+
+def split_rows_by_key(rows, keys, key_path, record_level=None):
+    """Split the rows of a coalesced child query (one request for several parent
+    keys) back per key.
+
+    Returns ([(key, rows), ...] in the order of keys, with an empty list for a
+    key without records, and the rows whose key is not one of keys).
+    """
+    by_key = collections.OrderedDict((str(key), []) for key in keys)
+    unmatched = []
+    for row in rows:
+        values = _get_jsonpath(get_record(row, record_level), key_path)
+        group = by_key.get(str(values[0])) if values else None
+        if group is None:
+            unmatched.append(row)
+        else:
+            group.append(row)
+    return list(by_key.items()), unmatched
+
+
 def get_bookmark_type_and_key(config, stream):
     """
     If config value timestamp_key, datetime_key, or index_key is a dictionary
@@ -160,18 +222,46 @@ def get_streams_to_sync(streams, state):
     return result
 
 
+def get_selected_properties(catalog, tap_stream_id, schema, always=()):
+    """Returns the top-level properties selected by the catalog metadata
+    (breadcrumb ["properties", <name>]), or None when every property is selected
+    or the catalog has no property metadata for the stream.
+
+    A property is selected when its inclusion is automatic, or when it is not
+    unsupported and "selected" (or else "selected-by-default") is not false.
+    The properties in always are kept in any case (e.g. the bookmark key).
+    """
+    if catalog is None:
+        return None
+    entry = catalog.get_stream(tap_stream_id)
+    if entry is None or not entry.metadata:
+        return None
+    mdata = singer.metadata.to_map(entry.metadata)
+    properties = list(schema.get("properties", {}))
+    selected = []
+    for name in properties:
+        md = mdata.get(("properties", name), {})
+        if (name in always or md.get("inclusion") == "automatic" or
+                (md.get("inclusion") != "unsupported" and
+                 md.get("selected", md.get("selected-by-default", True)) is not False)):
+            selected.append(name)
+    if len(selected) == len(properties):
+        return None
+    return selected
+
+
 def get_selected_streams(remaining_streams, annotated_schema):
-    selected_streams = []
+    selected_ids = set()
+    for annotated_stream in annotated_schema.streams:
+        schema = annotated_stream.schema
+        if (hasattr(schema, "selected")) and (schema.selected is True):
+            selected_ids.add(annotated_stream.tap_stream_id)
 
+    selected_streams = []
     for key in remaining_streams.keys():
         stream = remaining_streams[key]
-        tap_stream_id = stream.tap_stream_id
-        for stream_idx, annotated_stream in enumerate(
-                annotated_schema.streams):
-            if tap_stream_id == annotated_stream.tap_stream_id:
-                schema = annotated_stream.schema
-                if (hasattr(schema, "selected")) and (schema.selected is True):
-                    selected_streams.append(stream)
+        if stream.tap_stream_id in selected_ids:
+            selected_streams.append(stream)
 
     return selected_streams
 
@@ -253,10 +343,18 @@ def get_end(config, tap_stream_id):
     return end_from_config
 
 
-def get_digest_from_record(record):
-    digest = hashlib.md5(
-        json.dumps(record, sort_keys=True).encode("utf-8")
-    ).hexdigest()
+def get_digest_from_record(record, legacy=False):
+    """
+    md5 of the canonical JSON (see codec.dumps_canonical) of the record.
+
+    legacy: Digest of the simplejson-formatted record as persisted in
+    last_record_extracted by versions up to 0.2.19.
+    """
+    if legacy:
+        dumped = json.dumps(record, sort_keys=True).encode("utf-8")
+    else:
+        dumped = codec.dumps_canonical(record)
+    digest = hashlib.md5(dumped).hexdigest()
     return digest
 
 
@@ -317,9 +415,85 @@ def get_last_update(config, tap_stream_id, record, current):
     return last_update
 
 
+def get_record_bookmark(config, tap_stream_id, record):
+    """The bookmark value of a record in the form of last_update (a float
+    timestamp, a formatted datetime or an index), or None when it is missing"""
+    bookmark_type, bookmark_key = get_bookmark_type_and_key(config, tap_stream_id)
+    try:
+        value = _get_jsonpath(record, bookmark_key)[0]
+    except Exception:
+        return None
+    if value is None or value == "":
+        return None
+    if bookmark_type == "timestamp":
+        return get_float_timestamp(value)
+    if bookmark_type == "datetime":
+        return format_datetime(config, parse_datetime_tz(value))
+    try:
+        return int(value)
+    except ValueError:
+        return str(value)
+
+
+class SortednessTracker(object):
+    """Bookmark values seen on the pages of an unsorted (assume_sorted=False)
+    query: the min/max per page, to tell when the pages lie entirely past the
+    end, and the rows older than an earlier row, to tell how sorted the stream
+    looked."""
+    def __init__(self, end):
+        self.end = end
+        self.pages = 0
+        self.rows = 0
+        self.rows_out_of_order = 0
+        self.consecutive_pages_past_end = 0
+        self._max = None
+        self._page_min = None
+        self._page_max = None
+
+    def add(self, value):
+        if value is None:
+            return
+        try:
+            if self._max is not None and value < self._max:
+                self.rows_out_of_order += 1
+            else:
+                self._max = value
+            if self._page_min is None or value < self._page_min:
+                self._page_min = value
+            if self._page_max is None or value > self._page_max:
+                self._page_max = value
+        except TypeError:
+            # An index changing from int to str
+            return
+        self.rows += 1
+
+    def end_page(self):
+        """Close the current page. Returns the number of consecutive pages, up
+        to this one, whose rows all lie at or past the end."""
+        self.pages += 1
+        LOGGER.debug("Page bookmark values: min %s max %s" %
+                     (self._page_min, self._page_max))
+        if (self.end is not None and self._page_min is not None and
+                self._page_min >= self.end):
+            self.consecutive_pages_past_end += 1
+        else:
+            self.consecutive_pages_past_end = 0
+        self._page_min = self._page_max = None
+        return self.consecutive_pages_past_end
+
+    def summary(self):
+        in_order = self.rows - self.rows_out_of_order
+        return ("%d of %d rows (%.1f%%) on %d pages were not older than an "
+                "earlier row" % (in_order, self.rows,
+                                 100.0 * in_order / self.rows if self.rows else 100.0,
+                                 self.pages))
+
+
 def get_init_endpoint_params(config, state, tap_stream_id):
+    """Returns the URL params of the stream: the run-time params in front of the
+    config values (a ChainMap, so that the config is not copied)."""
     bookmark_type, bookmark_key = get_bookmark_type_and_key(config, tap_stream_id)
-    params = dict(config)
+    params = collections.ChainMap({}, config)
     start = get_start(config, state, tap_stream_id, "last_update")
     end = get_end(config, tap_stream_id)
     if bookmark_type == "timestamp":
@@ -397,7 +571,7 @@ def get_windowed_endpoint_params(config, tap_stream_id, w_start_epoch, w_end_epo
     and timestamp bookmark types are supported.
     """
     bookmark_type, bookmark_key = get_bookmark_type_and_key(config, tap_stream_id)
-    params = dict(config)
+    params = collections.ChainMap({}, config)
     # utcfromtimestamp (not fromtimestamp): the window epochs are UTC, and the
     # formatted bounds go into the URL filter and the per-record write-gate, both
     # of which compare against UTC record timestamps. Local conversion would skew
@@ -482,11 +656,212 @@ def get_endpoint(url_format, tap_stream_id, data):
           last_update_start={start_datetime}&last_update_end={end_datetime}& \
           items_per_page={items_per_page}&page={current_page}
     """
-    params = dict()
-    for key in data:
-        params[key] = urlquote(str(data[key]).encode("utf-8"))
-    params["resource"] = urlquote(str(tap_stream_id).encode("utf-8"))
-    return url_format.format(**params)
+    return get_url_template(url_format).render(tap_stream_id, data)
+
+
+class UrlTemplate(object):
+    """A URL format parsed once into the fields it references.
+
+    render() quotes only those fields, and reuses the quoted value of a field
+    whose value is the same as on the previous call (config values, the bounds
+    of the query), so per page only the pagination position is quoted again.
+    """
+    def __init__(self, url_format):
+        self.url_format = url_format
+        self.fields = get_url_fields(url_format)
+        # field -> (str(value), quoted value)
+        self._quoted = dict()
+
+    def render(self, tap_stream_id, data):
+        values = dict()
+        for field in self.fields:
+            raw = str(tap_stream_id if field == "resource" else data[field])
+            cached = self._quoted.get(field)
+            if cached is None or cached[0] != raw:
+                cached = (raw, urlquote(raw.encode("utf-8")))
+                self._quoted[field] = cached
+            values[field] = cached[1]
+        return self.url_format.format_map(values)
+
+
+@functools.lru_cache(maxsize=256)
+def get_url_template(url_format):
+    return UrlTemplate(url_format)
+
+
+# Run-time URL params that move with the pagination position
+PAGINATION_PARAMS = ("current_page", "current_page_one_base", "current_offset")
+
+
+def get_url_fields(url_format):
+    """Returns the set of param names referenced by the URL format.
+
+    "...?page={current_page}&since={start_datetime}" -> {"current_page", "start_datetime"}
+    """
+    fields = set()
+    for _, field_name, _, _ in string.Formatter().parse(url_format):
+        if field_name:
+            fields.add(re.split(r"[.\[]", field_name, 1)[0])
+    return fields
+
+
+def get_request_body(config, tap_stream_id):
+    """The JSON body template of the stream's requests: request_bodies for the
+    stream, else request_body, else None (no body)."""
+    body = (config.get("request_bodies") or {}).get(
+        tap_stream_id, config.get("request_body"))
+    if isinstance(body, str):
+        body = json.loads(body)
+    return body
+
+
+def get_http_method(config, tap_stream_id):
+    """http_methods for the stream, else http_method, else POST for the streams
+    with a request body and GET for the others"""
+    method = (config.get("http_methods") or {}).get(
+        tap_stream_id, config.get("http_method"))
+    if not method:
+        method = "GET" if get_request_body(config, tap_stream_id) is None else "POST"
+    return method.upper()
+
+
+def get_body_fields(body):
+    """Returns the set of param names referenced by the strings (keys and
+    values) of a request body template"""
+    fields = set()
+    if isinstance(body, dict):
+        for key, value in body.items():
+            fields |= get_body_fields(key) | get_body_fields(value)
+    elif isinstance(body, list):
+        for value in body:
+            fields |= get_body_fields(value)
+    elif isinstance(body, str):
+        fields |= get_url_fields(body)
+    return fields
+
+
+def render_body(body, tap_stream_id, data):
+    """Render a request body template with the params of the query, like the URL
+    (see get_endpoint) but without quoting. A string that is a single
+    placeholder, e.g. "{current_offset}", is replaced by the value itself, so
+    numbers stay numbers in the JSON body:
+
+        {"filter": {"updated_after": "{start_datetime}"},
+         "from": "{current_offset}", "size": "{items_per_page}"}
+    """
+    if isinstance(body, dict):
+        return {render_body(key, tap_stream_id, data): render_body(value, tap_stream_id, data)
+                for key, value in body.items()}
+    if isinstance(body, list):
+        return [render_body(value, tap_stream_id, data) for value in body]
+    if not isinstance(body, str):
+        return body
+    fields = get_url_fields(body)
+    values = {field: tap_stream_id if field == "resource" else data[field]
+              for field in fields}
+    if len(fields) == 1 and body == "{%s}" % next(iter(fields)):
+        return next(iter(values.values()))
+    return body.format_map(values)
+
+
+def get_query_fields(config, tap_stream_id):
+    """The params referenced by the stream's URL and request body"""
+    url = config.get("urls", {}).get(tap_stream_id, config["url"])
+    return get_url_fields(url) | get_body_fields(get_request_body(config, tap_stream_id))
+
+
+# Params derived from the end bound, which defaults to now when not configured
+END_PARAMS = ("end_timestamp", "end_datetime", "end_date")
+
+
+def is_open_ended(config):
+    """True when neither end_datetime nor end_timestamp is configured, i.e. the
+    end of the datetime/timestamp range is now and moves with every run."""
+    return not config.get("end_datetime") and config.get("end_timestamp") is None
+
+
+def get_pagination_bounds(url_format, params, open_end=False, body=None):
+    """Returns the values of the params, other than the pagination position, that
+    the URL format references. Two queries with the same bounds are the same query,
+    so a page/offset position saved from one is valid for the other.
+
+    open_end: The end params derive from now (see is_open_ended) and are left out,
+    so an open-ended query counts as the same query on the next run.
+    body: The request body template, whose params count as well.
+
+    Returns None when the URL references last_update: the pages then depend on the
+    last record written, and a saved position is meaningless on the next run.
+    """
+    fields = get_url_fields(url_format) | get_body_fields(body)
+    if "last_update" in fields:
+        return None
+    excluded = PAGINATION_PARAMS + (END_PARAMS if open_end else ())
+    return {key: str(params.get(key)) for key in sorted(fields)
+            if key not in excluded}
+
+
+# Max connections kept alive per host in the shared session
+HTTP_POOL_SIZE = 32
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Returns the requests.Session shared by all the streams and threads so the
+    connections to the API are pooled and reused."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=HTTP_POOL_SIZE,
+                                                    pool_maxsize=HTTP_POOL_SIZE)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+    return _session
+
+
+def ratelimit(limit, every):
+    """Thread-safe singer.utils.ratelimit: at most limit calls in every seconds,
+    shared by all the threads calling the decorated function."""
+    def limitdecorator(func):
+        times = collections.deque()
+        lock = threading.Lock()
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with lock:
+                if len(times) >= limit:
+                    tim0 = times.pop()
+                    sleep_time = every - (time.time() - tim0)
+                    if sleep_time > 0:
+                        time.sleep(sleep_time)
+                times.appendleft(time.time())
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    return limitdecorator
+
+
+# Default (connect, read) timeouts in seconds
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 300
+
+
+# Size in bytes of the last response body decoded by generate_request in
+# this thread (response_sizes.last), for the memory budget of the prefetch
+response_sizes = threading.local()
+
+
+class DeadlineExceeded(Exception):
+    """The run's deadline (global_timeout) passed before or during a request"""
+
+
+def get_request_timeout(config):
+    """Returns the (connect, read) timeouts of the requests"""
+    return (config.get("connect_timeout") or CONNECT_TIMEOUT,
+            config.get("read_timeout") or READ_TIMEOUT)
 
 
 def _giveup(exc):
@@ -495,30 +870,103 @@ def _giveup(exc):
         and exc.response.status_code != 429
 
 
-@utils.backoff((requests.exceptions.RequestException,), _giveup)
-@utils.ratelimit(20, 1)
 def generate_request(stream_id, url, auth_method="no_auth", headers=None,
-                     username=None, password=None):
+                     username=None, password=None, timeout=None, deadline=None,
+                     method="GET", body=None):
     """
     url: URL with pre-encoded query. See get_endpoint()
+    method: HTTP method. See get_http_method()
+    body: JSON request body (rendered). See render_body()
+    timeout: (connect, read) timeouts in seconds
+    deadline: time.time() by which the request and its retries must be done.
+              The timeouts are shortened to fit, the backoff stops retrying at
+              the deadline, and DeadlineExceeded is raised once it passed.
+
+    Failed requests are retried up to 5 times with an exponential backoff,
+    except on 4xx errors other than 429.
+
+    With replay_mode record, the responses are also stored in replay_dir; with
+    replay, they are read from there instead of requesting the API.
     """
+    max_time = None
+    if deadline is not None:
+        max_time = deadline - time.time()
+        if max_time <= 0:
+            raise DeadlineExceeded(f"Deadline passed before requesting {url}")
+    replayer = replay.get_replayer()
+    if replayer and replayer.mode == "replay":
+        content = replayer.replay(get_replay_key(url, method, body))
+        response_sizes.last = len(content)
+        return codec.loads(content)
+    request = backoff.on_exception(
+        backoff.expo,
+        (requests.exceptions.RequestException,),
+        max_tries=5,
+        max_time=max_time,
+        giveup=_giveup,
+        factor=2)(_request)
+    return request(stream_id, url, auth_method, headers, username, password,
+                   timeout or (CONNECT_TIMEOUT, READ_TIMEOUT), deadline,
+                   method, body)
+
+
+def get_replay_key(url, method="GET", body=None):
+    """What identifies a response for record/replay: the URL of a GET, plus the
+    method and the body of the other requests"""
+    if method == "GET" and body is None:
+        return url
+    return "%s %s %s" % (method, url, codec.dumps_canonical(body).decode("utf-8"))
+
+
+@ratelimit(20, 1)
+def _request(stream_id, url, auth_method, headers, username, password,
+             timeout, deadline, method="GET", body=None):
+    if deadline is not None:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Deadline passed before requesting {url}")
+        timeout = tuple(min(t, remaining) for t in timeout)
+
     if not auth_method or auth_method == "no_auth":
         auth = None
     elif auth_method == "basic":
         auth = HTTPBasicAuth(username, password)
     elif auth_method == "digest":
         auth = HTTPDigestAuth(username, password)
+    elif auth_method == "oauth2":
+        auth = None
     else:
         raise ValueError("Unknown auth method: " + auth_method)
 
     LOGGER.info("Using %s authentication method." % auth_method)
 
     headers = headers or get_http_headers()
-
+    token = None
+    if auth_method == "oauth2":
+        token = oauth.get_token_manager().get_token()
+        headers = dict(headers, Authorization="Bearer " + token)
+
+    # Only the idempotent GETs are hedged: a duplicate POST may not be safe
+    hedger = None
+    if method == "GET" and body is None:
+        send = functools.partial(get_session().get, url, headers=headers,
+                                 auth=auth, timeout=timeout)
+        hedger = hedge.get_hedger()
+    else:
+        send = functools.partial(get_session().request, method, url, json=body,
+                                 headers=headers, auth=auth, timeout=timeout)
     with metrics.http_request_timer(stream_id) as timer:
-        resp = requests.get(url,
-                            headers=headers,
-                            auth=auth)
+        resp = hedger.get(stream_id, send) if hedger else send()
+        if token is not None and resp.status_code == 401:
+            # The token was revoked before its expiry: retry once with a new one
+            resp.close()
+            token = oauth.get_token_manager().get_token(rejected=token)
+            headers["Authorization"] = "Bearer " + token
+            resp = send()
         timer.tags[metrics.Tag.http_status_code] = resp.status_code
         resp.raise_for_status()
-        return resp.json()
+        response_sizes.last = len(resp.content)
+        replayer = replay.get_replayer()
+        if replayer:
+            replayer.record(get_replay_key(url, method, body), resp.content)
+        return codec.loads(resp.content)
@@ -5,9 +5,8 @@ import singer
 from singer import utils
 from singer.catalog import Catalog
 
-from .helper import Stream, get_abs_path
-from .sync import sync
-from .schema import discover, infer_schema
+from . import codec
+from .helper import get_abs_path
 
 LOG_LEVELS = {
     "DEBUG": logging.DEBUG,
@@ -141,6 +140,27 @@ def parse_args(spec_file, required_config_keys):
         action='store_true',
         help='Do infer schema')
 
+    parser.add_argument(
+        '--fetch_only',
+        action='store_true',
+        help='Fetch the pages of the streams without processing or writing the '
+             'records, and write the request statistics')
+
+    parser.add_argument(
+        '--plan',
+        type=int,
+        help='Write the configs of this many shards of the [start, end) range')
+
+    parser.add_argument(
+        '--shard_dir',
+        default='shards',
+        help='Directory of the shard configs written by --plan')
+
+    parser.add_argument(
+        '--merge_state',
+        nargs='+',
+        help='Merge these shard state files into one state file, written to stdout')
+
     args = parser.parse_args()
 
     if args.config:
@@ -184,18 +204,45 @@ def main():
             continue
         CONFIG[arg] = args_dict[arg]
 
+    codec.set_codec(CONFIG.get("json_codec"))
+
     if args.loglevel:
         log_level = LOG_LEVELS.get(args.loglevel.upper())
         if not log_level:
             raise (f"Log level must be one of {','.join(LOG_LEVELS)}")
         LOGGER.setLevel(log_level)
 
-    if args.infer_schema:
+    # Each mode imports only the modules it uses (see tests/unit/test_startup.py)
+    if args.plan:
+        from .shard import plan_shards
+        # Only the values given in the config file or on the command line
+        config = {k: v for k, v in CONFIG.items()
+                  if k in args.config or (k in SPEC["args"] and "--" + k in sys.argv)}
+        os.makedirs(args.shard_dir, exist_ok=True)
+        for shard in plan_shards(config, args.plan):
+            path = os.path.join(args.shard_dir,
+                                "config_shard_%d.json" % shard["shard"]["index"])
+            with open(path, "w") as f:
+                json.dump(shard, f, indent=2)
+            LOGGER.info("Shard %d [%s, %s): %s" % (
+                shard["shard"]["index"], shard["shard"]["start"],
+                shard["shard"]["end"], path))
+    elif args.merge_state:
+        from .shard import merge_states
+        states = [utils.load_json(path) for path in args.merge_state]
+        sys.stdout.write(json.dumps(merge_states(states)) + "\n")
+    elif args.fetch_only:
+        from .sync import sync
+        sync(CONFIG, args.state, args.catalog)
+    elif args.infer_schema:
+        from .schema import infer_schema
         safe_schema_update = args.safe_schema_update
         infer_schema(CONFIG, safe_update=safe_schema_update)
     elif args.discover:
+        from .schema import discover
         discover(CONFIG)
     elif args.catalog:
+        from .sync import sync
         state = {}
         if args.state:
             state.update(args.state)
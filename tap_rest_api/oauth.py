@@ -0,0 +1,165 @@
+"""OAuth2 bearer tokens for auth_method oauth2: the client credentials grant, or
+the refresh token grant when oauth2_refresh_token is set.
+
+One TokenManager is shared by all the streams and threads. The token is cached
+in oauth2_token_cache (when set) across runs, and refreshed
+oauth2_refresh_margin seconds before it expires: the first request past that
+point refreshes it while the others keep using the current token, so the
+requests in flight are not stalled. Only an expired (or missing) token makes
+the requests wait for the refresh.
+"""
+import json
+import os
+import threading
+import time
+
+import singer
+
+
+LOGGER = singer.get_logger()
+
+DEFAULT_REFRESH_MARGIN = 60
+# When the token endpoint does not say how long the token lasts
+DEFAULT_EXPIRES_IN = 3600
+
+
+class TokenError(Exception):
+    """The token endpoint did not return an access token"""
+
+
+class TokenManager(object):
+    def __init__(self, config):
+        self.token_url = config.get("oauth2_token_url")
+        if not self.token_url:
+            raise KeyError("oauth2_token_url is required with auth_method oauth2")
+        self.client_id = config.get("oauth2_client_id")
+        self.client_secret = config.get("oauth2_client_secret")
+        self.scope = config.get("oauth2_scope")
+        self.refresh_token = config.get("oauth2_refresh_token")
+        self.cache_path = config.get("oauth2_token_cache")
+        margin = config.get("oauth2_refresh_margin")
+        self.refresh_margin = DEFAULT_REFRESH_MARGIN if margin is None else margin
+        self.timeout = (config.get("connect_timeout") or 10,
+                        config.get("read_timeout") or 60)
+
+        self.access_token = None
+        self.expires_at = 0
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._load_cache()
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.isfile(self.cache_path):
+            return
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+        except ValueError:
+            LOGGER.warning(f"Ignoring the unreadable token cache {self.cache_path}")
+            return
+        if (cached.get("token_url"), cached.get("client_id")) != (
+                self.token_url, self.client_id):
+            return
+        self.access_token = cached.get("access_token")
+        self.expires_at = cached.get("expires_at", 0)
+        # The refresh tokens may be rotated: the cached one is the latest
+        self.refresh_token = cached.get("refresh_token") or self.refresh_token
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        tmp_path = self.cache_path + ".tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump({
+                "token_url": self.token_url,
+                "client_id": self.client_id,
+                "access_token": self.access_token,
+                "refresh_token": self.refresh_token,
+                "expires_at": self.expires_at,
+            }, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def _request_token(self):
+        from .helper import get_session
+
+        data = {}
+        if self.refresh_token:
+            data.update({"grant_type": "refresh_token",
+                         "refresh_token": self.refresh_token})
+        else:
+            data["grant_type"] = "client_credentials"
+        if self.client_id:
+            data["client_id"] = self.client_id
+        if self.client_secret:
+            data["client_secret"] = self.client_secret
+        if self.scope:
+            data["scope"] = self.scope
+
+        LOGGER.info(f"Requesting an OAuth2 token ({data['grant_type']})")
+        resp = get_session().post(self.token_url, data=data,
+                                  headers={"Accept": "application/json"},
+                                  timeout=self.timeout)
+        resp.raise_for_status()
+        token = resp.json()
+        if not token.get("access_token"):
+            raise TokenError(f"No access_token in the response of {self.token_url}")
+        with self._lock:
+            self.access_token = token["access_token"]
+            self.expires_at = time.time() + float(
+                token.get("expires_in") or DEFAULT_EXPIRES_IN)
+            if token.get("refresh_token"):
+                self.refresh_token = token["refresh_token"]
+            self._save_cache()
+
+    def get_token(self, rejected=None):
+        """The current access token, refreshed when it is due.
+
+        rejected: A token the API rejected (401): it is refreshed unless another
+        thread already did.
+        """
+        with self._lock:
+            token, expires_at = self.access_token, self.expires_at
+        now = time.time()
+        if token and token != rejected and now < expires_at - self.refresh_margin:
+            return token
+
+        if token and token != rejected and now < expires_at:
+            # Due for a refresh but still valid: refresh it unless another
+            # thread is, and keep using it meanwhile
+            if self._refreshing.acquire(blocking=False):
+                try:
+                    self._request_token()
+                except Exception as e:
+                    LOGGER.warning(f"Could not refresh the OAuth2 token: {e}")
+                finally:
+                    self._refreshing.release()
+            with self._lock:
+                return self.access_token
+
+        with self._refreshing:
+            with self._lock:
+                token, expires_at = self.access_token, self.expires_at
+            if not token or token == rejected or time.time() >= expires_at:
+                self._request_token()
+            with self._lock:
+                return self.access_token
+
+
+_token_manager = None
+
+
+def configure(config):
+    """Set up the token manager when auth_method is oauth2"""
+    global _token_manager
+    if config.get("auth_method") == "oauth2":
+        _token_manager = TokenManager(config)
+    else:
+        _token_manager = None
+    return _token_manager
+
+
+def get_token_manager():
+    if _token_manager is None:
+        raise KeyError("auth_method oauth2 is not configured")
+    return _token_manager
@@ -0,0 +1,115 @@
+"""Fetch the pages of a query ahead of the writing, within a memory budget."""
+import collections
+import threading
+
+import singer
+
+from . import codec
+from .helper import response_sizes
+
+
+LOGGER = singer.get_logger()
+
+
+class PagePrefetcher(object):
+    """Fetch (and decode) the pages of a query in a background thread while the
+    caller transforms and writes the previous ones.
+
+    The pages fetched but not yet released by the caller hold at most
+    max_inflight_bytes of responses, plus the page being fetched. When the
+    target reads stdout slower than the API serves pages, the fetching blocks
+    instead of piling pages up in memory.
+
+    The pages are fetched in the same order and with the same page/offset
+    params as the caller would. The thread stops after a short page, max_page
+    pages, or when should_stop() returns True.
+    """
+    def __init__(self, fetch_page, params, items_per_page, max_inflight_bytes,
+                 max_page=None, should_stop=None):
+        self._fetch_page = fetch_page
+        self._params = params
+        self._items_per_page = items_per_page
+        self._max_inflight_bytes = max_inflight_bytes
+        self._max_page = max_page
+        self._should_stop = should_stop or (lambda: False)
+
+        self._cond = threading.Condition()
+        self._pages = collections.deque()
+        self._inflight_bytes = 0
+        self._closed = False
+        self.peak_inflight_bytes = 0
+        self._thread = threading.Thread(target=self._run, name="prefetch",
+                                        daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _put(self, item, size=0):
+        with self._cond:
+            self._pages.append(item)
+            self._inflight_bytes += size
+            self.peak_inflight_bytes = max(self.peak_inflight_bytes,
+                                           self._inflight_bytes)
+            self._cond.notify_all()
+
+    def _wait_for_budget(self):
+        """Block while the budget is used up. Returns False once closed."""
+        with self._cond:
+            while (not self._closed and self._inflight_bytes > 0 and
+                   self._inflight_bytes >= self._max_inflight_bytes):
+                self._cond.wait()
+            return not self._closed
+
+    def _run(self):
+        params = collections.ChainMap({}, self._params)
+        page_number = params.get("current_page", 0)
+        offset_number = params.get("current_offset", 0)
+        pages_fetched = 0
+        try:
+            while self._wait_for_budget() and not self._should_stop():
+                params.update({
+                    "current_page": page_number,
+                    "current_page_one_base": page_number + 1,
+                    "current_offset": offset_number,
+                })
+                response_sizes.last = None
+                rows = self._fetch_page(params)
+                size = response_sizes.last or len(codec.dumps(rows))
+                pages_fetched += 1
+                self._put(("page", rows, size), size)
+                if (len(rows) < self._items_per_page or
+                        (self._max_page and pages_fetched >= self._max_page)):
+                    break
+                page_number += 1
+                offset_number += len(rows)
+        except Exception as e:
+            self._put(("error", e, 0))
+            return
+        self._put(("end", None, 0))
+
+    def get(self):
+        """Returns (rows, size) of the next page, or (None, 0) when the thread
+        stopped before the end of the query. Re-raises a fetch error."""
+        with self._cond:
+            while not self._pages:
+                self._cond.wait()
+            kind, value, size = self._pages.popleft()
+        if kind == "error":
+            raise value
+        if kind == "end":
+            return None, 0
+        return value, size
+
+    def release(self, size):
+        """The caller is done with a page of size bytes"""
+        with self._cond:
+            self._inflight_bytes -= size
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        LOGGER.debug("Prefetch peak: %d bytes in flight" % self.peak_inflight_bytes)
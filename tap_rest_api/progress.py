@@ -0,0 +1,170 @@
+"""Periodic progress of a stream: records/s, requests/s, bytes/s, the share of
+the [start, end) range covered and the ETA, as Singer metrics and optionally
+a compact status line. Also the request statistics of the fetch_only mode."""
+import datetime
+import threading
+import time
+
+import singer
+import singer.metrics as metrics
+
+from .helper import get_float_timestamp, parse_datetime_tz
+
+
+LOGGER = singer.get_logger()
+
+
+def get_position(bookmark_type, value):
+    """The bookmark value as a number (epoch seconds for datetime and
+    timestamp), or None when it is not numeric"""
+    if value is None:
+        return None
+    try:
+        if bookmark_type == "datetime":
+            return parse_datetime_tz(str(value)).timestamp()
+        if bookmark_type == "timestamp":
+            return get_float_timestamp(value)
+        return float(value)
+    except (ValueError, TypeError, OverflowError):
+        return None
+
+
+class ProgressReporter(object):
+    """Progress of one stream.
+
+    The counts are added from the fetching threads (add_request) and the
+    writing thread (add_records, set_position); report() is called at page
+    boundaries and reports at most every interval seconds.
+    """
+    def __init__(self, tap_stream_id, bookmark_type, start, end, interval,
+                 status_line=False, clock=time.monotonic):
+        self.tap_stream_id = tap_stream_id
+        self.bookmark_type = bookmark_type
+        self.start = get_position(bookmark_type, start)
+        self.end = get_position(bookmark_type, end)
+        self.interval = interval
+        self.status_line = status_line
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.started_at = clock()
+        self._last_report_at = self.started_at
+        self.records = 0
+        self.requests = 0
+        self.bytes = 0
+        self.position = self.start
+
+    def add_request(self, size):
+        with self._lock:
+            self.requests += 1
+            self.bytes += size or 0
+
+    def add_records(self, count):
+        with self._lock:
+            self.records += count
+
+    def set_position(self, value):
+        position = get_position(self.bookmark_type, value)
+        if position is not None:
+            self.position = position
+
+    def get_progress(self):
+        """The rates since the start, the fraction of the range covered and the
+        ETA in seconds (None when the range is unknown)"""
+        elapsed = max(self._clock() - self.started_at, 1e-9)
+        with self._lock:
+            progress = {
+                "records_per_second": self.records / elapsed,
+                "requests_per_second": self.requests / elapsed,
+                "bytes_per_second": self.bytes / elapsed,
+                "fraction": None,
+                "eta_seconds": None,
+            }
+        if (self.start is not None and self.end is not None and
+                self.position is not None and self.end > self.start):
+            fraction = min(max((self.position - self.start) /
+                               (self.end - self.start), 0.0), 1.0)
+            progress["fraction"] = fraction
+            if fraction > 0:
+                progress["eta_seconds"] = elapsed * (1 - fraction) / fraction
+        return progress
+
+    def report(self, force=False):
+        now = self._clock()
+        if not force and now - self._last_report_at < self.interval:
+            return None
+        self._last_report_at = now
+        progress = self.get_progress()
+        tags = {"endpoint": self.tap_stream_id}
+        for name in ("records_per_second", "requests_per_second", "bytes_per_second"):
+            metrics.log(LOGGER, metrics.Point("gauge", name, round(progress[name], 3), tags))
+        if progress["fraction"] is not None:
+            metrics.log(LOGGER, metrics.Point(
+                "gauge", "range_covered", round(progress["fraction"], 4), tags))
+        if progress["eta_seconds"] is not None:
+            metrics.log(LOGGER, metrics.Point(
+                "gauge", "eta_seconds", round(progress["eta_seconds"]), tags))
+        if self.status_line:
+            LOGGER.info(self.format_status(progress))
+        return progress
+
+    def format_status(self, progress):
+        covered = eta = "?"
+        if progress["fraction"] is not None:
+            covered = "%.1f%%" % (100 * progress["fraction"])
+        if progress["eta_seconds"] is not None:
+            eta = str(datetime.timedelta(seconds=round(progress["eta_seconds"])))
+        return ("PROGRESS %s: %s covered, %.1f rec/s, %.2f req/s, %.1f KB/s, "
+                "ETA %s" % (self.tap_stream_id, covered,
+                            progress["records_per_second"],
+                            progress["requests_per_second"],
+                            progress["bytes_per_second"] / 1024, eta))
+
+
+class FetchStats(object):
+    """Request latencies and page sizes of a stream in fetch_only mode"""
+    PERCENTILES = (50, 90, 95, 99)
+
+    def __init__(self, tap_stream_id, window=100000, clock=time.monotonic):
+        from .hedge import LatencyTracker
+        self.tap_stream_id = tap_stream_id
+        self._latencies = LatencyTracker(window=window)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.started_at = clock()
+        self.requests = 0
+        self.latency_total = 0.0
+        self.rows_total = 0
+        self.rows_max = 0
+        self.bytes_total = 0
+        self.bytes_max = 0
+
+    def add(self, latency, rows, size):
+        self._latencies.add(latency)
+        with self._lock:
+            self.requests += 1
+            self.latency_total += latency
+            self.rows_total += rows
+            self.rows_max = max(self.rows_max, rows)
+            self.bytes_total += size or 0
+            self.bytes_max = max(self.bytes_max, size or 0)
+
+    def get_summary(self):
+        elapsed = max(self._clock() - self.started_at, 1e-9)
+        requests = max(self.requests, 1)
+        summary = {
+            "stream": self.tap_stream_id,
+            "requests": self.requests,
+            "seconds": round(elapsed, 3),
+            "requests_per_second": round(self.requests / elapsed, 3),
+            # What one connection could sustain without the tap's own overhead
+            "requests_per_second_per_connection": (
+                round(requests / self.latency_total, 3) if self.latency_total else None),
+            "page_rows_mean": round(self.rows_total / requests, 1),
+            "page_rows_max": self.rows_max,
+            "page_bytes_mean": round(self.bytes_total / requests),
+            "page_bytes_max": self.bytes_max,
+        }
+        for q in self.PERCENTILES:
+            latency = self._latencies.percentile(q)
+            summary["latency_p%d" % q] = None if latency is None else round(latency, 4)
+        return summary
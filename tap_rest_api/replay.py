@@ -0,0 +1,87 @@
+"""Record the responses of the API to a directory, and replay them instead of
+requesting the API, for repeatable benchmarks and profiling of the whole tap
+(sync and infer_schema) without network.
+
+The responses are keyed by the endpoint URL, plus the method and the body of
+the requests other than GETs (the file name is the SHA-1 of the key), so
+the replayed run must render the same URLs: fix end_datetime/end_timestamp
+rather than letting the end default to now. The response bodies are stored
+as sent by the API and decoded on replay like a response.
+"""
+import hashlib
+import os
+import threading
+import time
+
+import singer
+
+
+LOGGER = singer.get_logger()
+
+
+class ReplayMissing(Exception):
+    """No response was recorded for the URL"""
+
+
+class Replayer(object):
+    """mode: record or replay
+    directory: Where the responses are stored
+    latency: Seconds to sleep per replayed response, to simulate the API
+    """
+    MODES = ("record", "replay")
+
+    def __init__(self, mode, directory, latency=None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown replay_mode: {mode}. Must be one of "
+                             f"{', '.join(self.MODES)}")
+        self.mode = mode
+        self.directory = directory
+        self.latency = latency
+        self._lock = threading.Lock()
+        if mode == "record":
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url):
+        return os.path.join(self.directory,
+                            hashlib.sha1(url.encode("utf-8")).hexdigest() + ".response")
+
+    def record(self, url, content):
+        path = self._path(url)
+        tmp_path = "%s.%d.tmp" % (path, threading.get_ident())
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        with self._lock:
+            with open(os.path.join(self.directory, "index.tsv"), "a") as f:
+                f.write("%s\t%s\n" % (os.path.basename(path), url))
+
+    def replay(self, url):
+        """The recorded response body of url"""
+        path = self._path(url)
+        if not os.path.exists(path):
+            raise ReplayMissing(f"No recorded response for {url} in {self.directory}")
+        if self.latency:
+            time.sleep(self.latency)
+        with open(path, "rb") as f:
+            return f.read()
+
+
+_replayer = None
+
+
+def configure(config):
+    """Record or replay the responses when the config sets replay_mode"""
+    global _replayer
+    mode = config.get("replay_mode")
+    if not mode:
+        _replayer = None
+        return None
+    if not config.get("replay_dir"):
+        raise KeyError("replay_dir is required with replay_mode")
+    _replayer = Replayer(mode, config["replay_dir"], config.get("replay_latency"))
+    LOGGER.info(f"{mode.capitalize()}ing the responses in {config['replay_dir']}")
+    return _replayer
+
+
+def get_replayer():
+    return _replayer
@@ -0,0 +1,72 @@
+"""Read the sample files of infer_schema (sample_dir) as a stream of rows.
+
+- <stream>.json: A raw response of the API (a single JSON document). The rows
+  are extracted with record_list_level.
+- <stream>.jsonl / <stream>.ndjson: One row per line, read line by line (from a
+  memory map when the file is not compressed), so the file does not have to
+  fit in memory.
+- Any of them gzip'd, with a .gz suffix.
+"""
+import mmap
+import os
+
+import singer
+
+from . import codec
+from .helper import get_record_list
+
+
+LOGGER = singer.get_logger()
+
+EXTENSIONS = (".jsonl", ".ndjson", ".json")
+
+
+def find_sample_file(sample_dir, stream_id):
+    """The path of the stream's sample file, or None"""
+    for extension in EXTENSIONS:
+        for suffix in ("", ".gz"):
+            path = os.path.join(sample_dir, stream_id + extension + suffix)
+            if os.path.isfile(path):
+                return path
+    return None
+
+
+def _open(path):
+    if path.endswith(".gz"):
+        import gzip
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def _iter_lines(path):
+    if path.endswith(".gz"):
+        with _open(path) as f:
+            yield from f
+        return
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from iter(mm.readline, b"")
+
+
+def iter_sample_rows(path, record_list_level=None):
+    """Yield the rows of a sample file"""
+    name = path[:-3] if path.endswith(".gz") else path
+    if name.endswith(".json"):
+        with _open(path) as f:
+            data = codec.loads(f.read())
+        rows = get_record_list(data, record_list_level)
+        if not isinstance(rows, list):
+            rows = [rows]
+        yield from rows
+        return
+
+    for line_number, line in enumerate(_iter_lines(path), 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield codec.loads(line)
+        except ValueError as e:
+            raise ValueError(f"{path}:{line_number}: invalid JSON: {e}")
@@ -0,0 +1,94 @@
+"""Deadline-aware scheduling of the streams (stream_scheduling: deadline).
+
+The streams run by staleness, most stale first: the age of the newer of the
+bookmark and the end of the last complete sync (never synced streams first).
+With global_timeout, each stream gets a time slice of the remaining budget
+before it starts. The slice is the stream's weighted share
+(stream_budget_weights), plus whatever the other remaining streams are not
+expected to need according to their duration estimates. So the time a fast
+stream does not use goes to the next ones. A stream stops at the end of its
+slice like at global_timeout, with a clean state, and continues from there in
+the next run.
+
+The duration estimate and the end of the last complete sync are kept in the
+stream's bookmark under "schedule".
+"""
+import datetime
+import math
+
+import simplejson as json
+
+from .helper import get_bookmark_type_and_key
+from .progress import get_position
+
+
+SCHEDULE_KEY = "schedule"
+# Weight of the last duration in the duration estimate
+DURATION_ALPHA = 0.5
+
+
+def get_schedule_stats(state, tap_stream_id):
+    return state.get("bookmarks", {}).get(tap_stream_id, {}).get(SCHEDULE_KEY) or {}
+
+
+def get_staleness(config, state, tap_stream_id, now):
+    """Seconds since the stream's data is known to be up to date, or inf"""
+    bookmark = state.get("bookmarks", {}).get(tap_stream_id, {})
+    fresh_at = None
+    bookmark_type, _ = get_bookmark_type_and_key(config, tap_stream_id)
+    if bookmark_type in ("datetime", "timestamp"):
+        fresh_at = get_position(bookmark_type, bookmark.get("last_update"))
+    synced_at = get_position(
+        "datetime", get_schedule_stats(state, tap_stream_id).get("synced_at"))
+    if synced_at is not None and (fresh_at is None or synced_at > fresh_at):
+        fresh_at = synced_at
+    if fresh_at is None:
+        return math.inf
+    return max(now - fresh_at, 0.0)
+
+
+def order_streams(config, state, tap_stream_ids, now):
+    """The streams by staleness (most stale first), the config order breaking
+    ties"""
+    staleness = {s: get_staleness(config, state, s, now) for s in tap_stream_ids}
+    return sorted(tap_stream_ids, key=lambda s: -staleness[s])
+
+
+def get_time_slice(config, state, tap_stream_id, remaining_ids, remaining_seconds):
+    """Seconds of the remaining budget given to tap_stream_id.
+
+    remaining_ids: The streams still to run, including tap_stream_id.
+    """
+    weights = config.get("stream_budget_weights") or {}
+    if isinstance(weights, str):
+        weights = json.loads(weights)
+    total_weight = sum(weights.get(s, 1) for s in remaining_ids)
+    if remaining_seconds <= 0 or total_weight <= 0:
+        return max(remaining_seconds, 0)
+    reserved = 0.0
+    for other in remaining_ids:
+        if other == tap_stream_id:
+            continue
+        share = remaining_seconds * weights.get(other, 1) / total_weight
+        estimate = get_schedule_stats(state, other).get("duration_seconds")
+        reserved += share if estimate is None else min(estimate, share)
+    return remaining_seconds - reserved
+
+
+def update_schedule_stats(stats, elapsed, finished, now):
+    """The stream's schedule stats after a run of elapsed seconds.
+
+    finished: False when the run was cut short (time slice, global_timeout or
+    a signal). Then elapsed is only a lower bound of the duration.
+    """
+    stats = dict(stats or {})
+    estimate = stats.get("duration_seconds")
+    if not finished:
+        stats["duration_seconds"] = round(max(estimate or 0, elapsed), 3)
+        return stats
+    if estimate is not None:
+        elapsed = DURATION_ALPHA * elapsed + (1 - DURATION_ALPHA) * estimate
+    stats["duration_seconds"] = round(elapsed, 3)
+    stats["synced_at"] = datetime.datetime.fromtimestamp(
+        now, datetime.timezone.utc).isoformat()
+    return stats
@@ -1,6 +1,7 @@
 import dateutil
 import os
 import sys
+import threading
 import simplejson as json
 import singer
 
@@ -8,16 +9,97 @@ from singer import utils
 
 from .helper import (
     get_streams, generate_request, get_endpoint, get_init_endpoint_params,
-    get_record, get_record_list, get_http_headers, unnest,
+    get_record, get_record_list, get_http_headers, get_request_timeout, unnest,
+    get_bookmark_type_and_key, get_http_method, get_request_body, render_body,
     EXTRACT_TIMESTAMP, BATCH_TIMESTAMP,
 )
 
-import getschema
 import jsonschema
 
 LOGGER = singer.get_logger()
 
 
+class SchemaRegistry(object):
+    """Loads each schema file once per process and keeps the artifacts derived
+    from it: the parsed schema and its compiled validator.
+
+    An entry is reloaded when the file's mtime or size changes (e.g. after
+    infer_schema rewrote it). The returned schemas are shared: do not mutate them.
+    """
+    MAX_VALIDATORS = 1024
+
+    def __init__(self):
+        self._schemas = {}
+        # id(schema) -> (schema, validator); the schema is kept to pin the id
+        self._validators = {}
+        self._lock = threading.Lock()
+
+    def load(self, path):
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._schemas.get(path)
+            if cached and cached[0] == key:
+                return cached[1]
+        schema = utils.load_json(path)
+        with self._lock:
+            self._schemas[path] = (key, schema)
+        return schema
+
+    def get_validator(self, schema):
+        cached = self._validators.get(id(schema))
+        if cached and cached[0] is schema:
+            return cached[1]
+        cls = jsonschema.validators.validator_for(schema)
+        cls.check_schema(schema)
+        validator = cls(schema)
+        with self._lock:
+            if len(self._validators) >= self.MAX_VALIDATORS:
+                # Schemas built on the fly (not loaded here) must not pile up
+                self._validators.clear()
+            self._validators[id(schema)] = (schema, validator)
+        return validator
+
+    def clear(self):
+        with self._lock:
+            self._schemas.clear()
+            self._validators.clear()
+
+
+REGISTRY = SchemaRegistry()
+
+
+class SchemaInferrer(object):
+    """Infer a schema from records added one at a time, with the same result
+    as getschema.infer_schema on the list of them, without keeping the records.
+
+    It builds on getschema's internal helpers (infer_schema's loop body), hence
+    the upper bound on getschema in pyproject.toml.
+    """
+    def __init__(self, record_level=None):
+        from getschema import impl
+        self._impl = impl
+        self.record_level = record_level
+        self.count = 0
+        self._schema = None
+
+    def add(self, record):
+        if type(record) is not dict:
+            raise ValueError("Input must be a dict object.")
+        # The most conservative type assumption of the schema so far and the record
+        self._schema = self._impl._infer_from_two(
+            self._schema, self._impl._do_infer_schema(record, self.record_level))
+        self.count += 1
+
+    def get_schema(self):
+        if self._schema is None:
+            return None
+        schema = dict(self._schema, type="object")
+        schema = self._impl._replace_null_type(schema)
+        LOGGER.info(f"Inference completed from {self.count} records")
+        return schema
+
+
 class Schema(object):
     config = None
 
@@ -27,7 +109,7 @@ class Schema(object):
     @staticmethod
     def validate(record, schema):
         try:
-            jsonschema.validate(record, schema)
+            REGISTRY.get_validator(schema).validate(record)
         except jsonschema.exceptions.ValidationError as e:
             return False, str(e)
         return True, None
@@ -41,6 +123,7 @@ class Schema(object):
         """
         Parse the result into types
         """
+        import getschema
         try:
             cleaned = getschema.fix_type(
                 row,
@@ -148,18 +231,16 @@ class Schema(object):
         return safe_schema
 
     def load_schema(self, stream_id):
+        '''Returns the schema for the specified source (shared, do not mutate)'''
         schema_dir = self.config["schema_dir"]
-        '''Returns the schema for the specified source'''
-        schema = utils.load_json(os.path.join(schema_dir, stream_id + ".json"))
-        return schema
+        return REGISTRY.load(os.path.join(schema_dir, stream_id + ".json"))
 
     def load_discovered_schema(self, stream):
         '''Attach inclusion automatic to each schema'''
-        schema_dir = self.config["schema_dir"]
         schema = self.load_schema(stream.tap_stream_id)
-        for k in schema['properties']:
-            schema['properties'][k]['inclusion'] = 'automatic'
-        return schema
+        properties = {k: dict(v, inclusion='automatic')
+                      for k, v in schema['properties'].items()}
+        return dict(schema, properties=properties)
 
     def discover_schemas(self, streams):
         '''Iterate through streams, push to an array and return'''
@@ -168,90 +249,127 @@ class Schema(object):
         for key in streams.keys():
             stream = streams[key]
             LOGGER.info('Loading schema for %s', stream.tap_stream_id)
+            schema = self.load_discovered_schema(stream)
             result['streams'].append({'stream': stream.tap_stream_id,
                                     'tap_stream_id': stream.tap_stream_id,
-                                    'schema': self.load_discovered_schema(stream)})
+                                    'schema': schema,
+                                    'metadata': get_stream_metadata(
+                                        self.config, stream.tap_stream_id, schema)})
         return result
 
     def infer_schema(self, stream_id):
+        """Infer the schema of the stream from the API responses or, with
+        sample_dir, from the stream's sample file (see sample.py). The records
+        are fed to the inference one at a time; sample_limit caps their number.
+        """
         max_page = self.config.get("max_page")
         sample_dir = self.config.get("sample_dir")
+        sample_limit = self.config.get("sample_limit")
 
         params = get_init_endpoint_params(self.config, {}, stream_id)
 
         url = self.config.get("urls", {}).get(stream_id, self.config["url"])
+        method = get_http_method(self.config, stream_id)
+        body = get_request_body(self.config, stream_id)
         auth_method = self.config.get("auth_method", "basic")
         headers = get_http_headers(self.config)
 
-        records = []
-        page_number = params.get("page_start", 0)
-        offset_number = params.get("offset_start", 0)
-        while True:
-            params.update({"current_page": page_number})
-            params.update({"current_page_one_base": page_number + 1})
-            params.update({"current_offset": offset_number})
-
-            if sample_dir:
-                LOGGER.info("Reading the data from file")
-                with open(os.path.join(sample_dir, stream_id + ".json"), 'r') as file:
-                    data = json.load(file)
-            else:
+        # In case the record is not at the root level
+        record_list_level = self.config.get("record_list_level")
+        if isinstance(record_list_level, dict):
+            record_list_level = record_list_level.get(stream_id)
+        record_level = self.config.get("record_level")
+        if isinstance(record_level, dict):
+            record_level = record_level.get(stream_id)
+
+        unnest_config = self.config.get("unnest", {})
+        # Why self.config.get("unnest", {}) is returning NoneType instead of {}???
+        if unnest_config is None:
+            unnest_config = {}
+        unnest_cols = unnest_config.get(stream_id, [])
+        for u in unnest_cols:
+            LOGGER.info(f"Unnesting {u['path']} to {u['target']}")
+
+        inferrer = SchemaInferrer(record_level)
+
+        def add_rows(rows):
+            """Returns False once sample_limit records were added"""
+            for row in rows:
+                if sample_limit and inferrer.count >= sample_limit:
+                    LOGGER.info(f"Sample limit {sample_limit} reached.")
+                    return False
+                for u in unnest_cols:
+                    row = unnest(row, u["path"], u["target"])
+                inferrer.add(row)
+            return True
+
+        if sample_dir:
+            from .sample import find_sample_file, iter_sample_rows
+            path = find_sample_file(sample_dir, stream_id)
+            if path is None:
+                raise FileNotFoundError(
+                    f"No sample file for {stream_id} in {sample_dir}")
+            LOGGER.info(f"Reading the data from {path}")
+            add_rows(iter_sample_rows(path, record_list_level))
+        else:
+            page_number = params.get("page_start", 0)
+            offset_number = params.get("offset_start", 0)
+            while True:
+                params.update({"current_page": page_number})
+                params.update({"current_page_one_base": page_number + 1})
+                params.update({"current_offset": offset_number})
+
                 endpoint = get_endpoint(url, stream_id, params)
-                LOGGER.info("GET %s", endpoint)
+                LOGGER.info("%s %s", method, endpoint)
                 data = generate_request(stream_id, endpoint, auth_method,
                                         headers,
                                         self.config.get("username"),
-                                        self.config.get("password"))
-
-            # In case the record is not at the root level
-            record_list_level = self.config.get("record_list_level")
-            if isinstance(record_list_level, dict):
-                record_list_level = record_list_level.get(stream_id)
-            record_level = self.config.get("record_level")
-            if isinstance(record_level, dict):
-                record_level = record_level.get(stream_id)
-            data = get_record_list(data, record_list_level)
-
-            unnest_config = self.config.get("unnest", {})
-            # Why self.config.get("unnest", {}) is returning NoneType instead of {}???
-            if unnest_config is None:
-                unnest_config = {}
-            unnest_cols = unnest_config.get(stream_id, [])
-
-            if unnest_cols:
-                for i in range(0, len(data)):
-                    for u in unnest_cols:
-                        LOGGER.info(f"Unnesting {u['path']} to {u['target']}")
-                        data[i] = unnest(data[i], u["path"], u["target"])
-
-            records += data
-
-            # Exit conditions
-            if sample_dir:
-                break
-            if len(data) < self.config["items_per_page"]:
-                LOGGER.info(
-                    f"Response is less than set item per page ({len(data)}/{self.config['items_per_page']}). Finishing the extraction"
-                )
-                break
-            if max_page and page_number + 1 >= max_page:
-                LOGGER.info("Max page %d reached. Finishing the extraction." % max_page)
-                break
-
-            page_number +=1
-            offset_number += len(data)
-
-
-        if False:
-            with open("./records.json", "w") as f:
-                json.dump(records, f, indent=2)
-
-        if not records:
+                                        self.config.get("password"),
+                                        timeout=get_request_timeout(self.config),
+                                        method=method,
+                                        body=None if body is None else
+                                        render_body(body, stream_id, params))
+                data = get_record_list(data, record_list_level)
+
+                # Exit conditions
+                if not add_rows(data):
+                    break
+                if len(data) < self.config["items_per_page"]:
+                    LOGGER.info(
+                        f"Response is less than set item per page ({len(data)}/{self.config['items_per_page']}). Finishing the extraction"
+                    )
+                    break
+                if max_page and page_number + 1 >= max_page:
+                    LOGGER.info("Max page %d reached. Finishing the extraction." % max_page)
+                    break
+
+                page_number +=1
+                offset_number += len(data)
+
+        if not inferrer.count:
             LOGGER.warning(f"No records found for {stream_id}")
             return None
 
-        schema = getschema.infer_schema(records, record_level)
-        return schema
+        return inferrer.get_schema()
+
+
+def get_stream_metadata(config, tap_stream_id, schema):
+    """Singer metadata with a breadcrumb per top-level property, selected by
+    default. Deselect a property ("selected": false) to leave it out of the
+    records and, with {selected_fields} in the URL, out of the API response.
+    The bookmark key and the _sdc_ columns are automatic."""
+    _, bookmark_key = get_bookmark_type_and_key(config, tap_stream_id)
+    automatic = {bookmark_key, EXTRACT_TIMESTAMP, BATCH_TIMESTAMP}
+    mdata = [{"breadcrumb": [], "metadata": {"inclusion": "available"}}]
+    for name in schema.get("properties", {}):
+        mdata.append({
+            "breadcrumb": ["properties", name],
+            "metadata": {
+                "inclusion": "automatic" if name in automatic else "available",
+                "selected-by-default": True,
+            },
+        })
+    return mdata
 
 
 def discover(config):
@@ -277,6 +395,9 @@ def infer_schema(
 
     - safe_update: When schema_dir contains existing schema and safe_update = True, it will only modify the exiting schema with append manner.
     """
+    from . import oauth, replay
+    oauth.configure(config)
+    replay.configure(config)
     streams = get_streams(config)
     schema_service = Schema(config)
     schemas = {}
@@ -337,6 +458,7 @@ def infer_schema(
             "stream": tap_stream_id,
             "tap_stream_id": tap_stream_id,
             "schema": schema,
+            "metadata": get_stream_metadata(config, tap_stream_id, schema),
         })
 
     if not os.path.exists(config["catalog_dir"]):
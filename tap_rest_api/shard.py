@@ -0,0 +1,131 @@
+"""Range sharding for backfills: cut the [start, end) range of the config into
+shard configs that run as independent processes (each with its own state
+file), then merge the shard states into one state once every shard completed.
+"""
+import copy
+import datetime
+import math
+
+import singer
+
+from .helper import (
+    format_datetime,
+    get_bookmark_type_and_key,
+    get_float_timestamp,
+    get_streams,
+    iter_window_bounds,
+    parse_datetime_tz,
+)
+
+
+LOGGER = singer.get_logger()
+
+
+def _to_epoch(value, bookmark_type):
+    if bookmark_type == "timestamp" and not isinstance(value, str):
+        return get_float_timestamp(value)
+    return parse_datetime_tz(str(value)).timestamp()
+
+
+def _format_epoch(config, epoch):
+    """The epoch as a datetime param, formatted as configured (see
+    format_datetime)"""
+    return format_datetime(config, datetime.datetime.fromtimestamp(
+        epoch, datetime.timezone.utc))
+
+
+def plan_shards(config, count):
+    """Returns count (or fewer, for a short range) shard configs covering the
+    config's [start, end) range in contiguous, half-open ranges.
+
+    The streams must have a datetime or timestamp bookmark. Each shard config
+    is a copy of config with its own start/end, formatted like the other
+    datetime params, and a "shard" entry ({"index", "count", "start", "end"})
+    that the sync writes in the state.
+    An open end (no end_datetime/end_timestamp) is planned as now.
+    """
+    if count < 1:
+        raise ValueError("The number of shards must be at least 1")
+    bookmark_types = set()
+    for stream in get_streams(config):
+        bookmark_type, _ = get_bookmark_type_and_key(config, stream)
+        if bookmark_type not in ("datetime", "timestamp"):
+            raise ValueError(f"Stream {stream} has a {bookmark_type} bookmark. "
+                             "Only datetime and timestamp ranges can be sharded.")
+        bookmark_types.add(bookmark_type)
+    bookmark_type = "timestamp" if bookmark_types == {"timestamp"} else "datetime"
+
+    start = config.get("start_timestamp") if bookmark_type == "timestamp" else None
+    if start is None:
+        start = config.get("start_datetime")
+    if start is None:
+        raise KeyError("start_datetime (or start_timestamp) is required to plan shards")
+    end = config.get("end_timestamp") if bookmark_type == "timestamp" else None
+    if end is None:
+        end = config.get("end_datetime")
+    start_epoch = _to_epoch(start, bookmark_type)
+    if end is None:
+        end_epoch = datetime.datetime.now(datetime.timezone.utc).timestamp()
+        LOGGER.info("No end is set. Planning the shards up to now: %s"
+                    % _format_epoch(config, end_epoch))
+    else:
+        end_epoch = _to_epoch(end, bookmark_type)
+
+    shard_seconds = math.ceil((end_epoch - start_epoch) / count)
+    bounds = list(iter_window_bounds(start_epoch, end_epoch, max(shard_seconds, 1)))
+    shards = []
+    for index, (s_start, s_end) in enumerate(bounds):
+        shard = copy.deepcopy(config)
+        shard.update({
+            "start_datetime": _format_epoch(config, s_start),
+            "end_datetime": _format_epoch(config, s_end),
+        })
+        for key, value in (("start_timestamp", s_start), ("end_timestamp", s_end)):
+            if config.get(key) is not None:
+                shard[key] = value
+        shard["shard"] = {
+            "index": index,
+            "count": len(bounds),
+            "start": shard["start_datetime"],
+            "end": shard["end_datetime"],
+        }
+        shards.append(shard)
+    return shards
+
+
+def merge_states(states):
+    """Merge the states of the shards of a plan into one state.
+
+    For each stream, every shard of the plan must have completed (the sync
+    writes a "shard" bookmark with completed: true). The merged bookmark is
+    the one of the shard that got furthest, without the shard and pagination
+    entries. Raises ValueError listing the missing or incomplete shards.
+    """
+    shards_per_stream = {}
+    for state in states:
+        for stream, bookmark in state.get("bookmarks", {}).items():
+            if "shard" in bookmark:
+                shards_per_stream.setdefault(stream, {})[
+                    bookmark["shard"]["index"]] = bookmark
+
+    merged = {"bookmarks": {}}
+    incomplete = []
+    for stream, shards in sorted(shards_per_stream.items()):
+        count = max(b["shard"]["count"] for b in shards.values())
+        for index in range(count):
+            if index not in shards:
+                incomplete.append(f"{stream} shard {index} (no state)")
+            elif not shards[index]["shard"].get("completed"):
+                incomplete.append(f"{stream} shard {index}")
+        furthest = max(shards.values(),
+                       key=lambda b: _to_epoch(b["last_update"], "timestamp"))
+        bookmark = {k: v for k, v in furthest.items()
+                    if k not in ("shard", "pagination")}
+        merged["bookmarks"][stream] = bookmark
+
+    if not shards_per_stream:
+        raise ValueError("None of the states is a shard state")
+    if incomplete:
+        raise ValueError("Not merging: these shards did not complete: " +
+                         ", ".join(incomplete))
+    return merged
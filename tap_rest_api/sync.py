@@ -1,4 +1,6 @@
+import collections
 import datetime
+import signal
 import simplejson as json
 import sys
 import time
@@ -14,6 +16,7 @@ from .helper import (
     get_endpoint,
     get_init_endpoint_params,
     get_last_update,
+    get_record_bookmark,
     get_float_timestamp,
     get_record,
     get_record_list,
@@ -25,13 +28,30 @@ from .helper import (
     get_digest_from_record,
     unnest,
     EXTRACT_TIMESTAMP,
+    BATCH_TIMESTAMP,
     format_datetime,
     parse_datetime_tz,
     get_windowed_endpoint_params,
     iter_window_bounds,
     get_window_seconds,
+    get_pagination_bounds,
+    get_query_fields,
+    get_request_body,
+    get_http_method,
+    render_body,
+    get_request_timeout,
+    DeadlineExceeded,
+    response_sizes,
+    PAGINATION_PARAMS,
+    is_open_ended,
+    get_parent_stream,
+    get_parent_params,
+    get_selected_properties,
+    split_rows_by_key,
+    SortednessTracker,
 )
 from .schema import Schema
+from . import codec, hedge, oauth, replay
 
 
 LOGGER = singer.get_logger()
@@ -46,6 +66,60 @@ class Sync(object):
         self.state = state
         self.catalog = catalog
         self.streams = get_streams(config)
+        hedge.configure(config)
+        oauth.configure(config)
+        replay.configure(config)
+        self.batch_writers = {}
+        # JSON schema of each stream (projected), for the batch writers
+        self.schemas = {}
+        # Selected top-level properties of each stream, None when all are
+        self.projections = {}
+        # Stream-level URL params, e.g. selected_fields
+        self.stream_params = {}
+        # Digests of the records written per stream (see dedup_window), and the
+        # number of duplicate rows dropped
+        self.digest_indexes = {}
+        self.duplicates = collections.Counter()
+        # (ChangeIndex, key properties) of the streams with change detection
+        self.change_indexes = {}
+        # Streams whose extraction of the [start, end) range completed
+        self.completed_streams = set()
+        # ProgressReporter of the streams being synced (progress_interval)
+        self.progress = {}
+        # fetch_only: FetchStats of the streams being fetched
+        self.fetch_stats = {}
+        # last_record_extracted as read from the state file
+        self._state_prev_record = None
+        # Set by SIGTERM/SIGINT: finish the current page, checkpoint and stop
+        self.stop_requested = False
+        # stream_scheduling deadline: time.time() at which the time slice of the
+        # stream being synced ends
+        self.stream_deadline = None
+
+    def _write_record(self, tap_stream_id, record, raw_output):
+        if self.config.get("fetch_only"):
+            return
+        if raw_output:
+            sys.stdout.write(codec.dumps(record) + "\n")
+        elif self.config.get("batch_format"):
+            writer = self.batch_writers.get(tap_stream_id)
+            if writer is None:
+                from .batch import BatchWriter
+                writer = BatchWriter(self.config, tap_stream_id,
+                                     self.schemas.get(tap_stream_id))
+                self.batch_writers[tap_stream_id] = writer
+            writer.write(record)
+        else:
+            singer.write_record(tap_stream_id, record)
+
+    def _write_state(self, state):
+        if self.config.get("fetch_only"):
+            return
+        # The files holding the records covered by this state must be closed
+        # (and announced with BATCH messages) before the state goes out.
+        for writer in self.batch_writers.values():
+            writer.flush()
+        singer.write_state(state)
 
     def sync_rows(self, current_state, tap_stream_id, key_properties=[], raw_output=False):
         """
@@ -60,10 +134,22 @@ class Sync(object):
         auth_method = self.config.get("auth_method", "basic")
         assume_sorted = self.config.get("assume_sorted", True)
         filter_by_schema = self.config.get("filter_by_schema", True)
-
-        schema_service = Schema(self.config)
-        schema = schema_service.load_schema(tap_stream_id)
+        fetch_only = self.config.get("fetch_only", False)
+
+        # fetch_only neither validates nor writes the records: the schema is
+        # only needed when the query asks for the selected fields
+        schema = None
+        if (not fetch_only or
+                "selected_fields" in get_query_fields(self.config, tap_stream_id)):
+            schema_service = Schema(self.config)
+            schema = self._project_schema(tap_stream_id,
+                                          schema_service.load_schema(tap_stream_id))
+            self.schemas[tap_stream_id] = schema
+        if self.config.get("dedup_window"):
+            from .dedup import get_digest_index
+            self.digest_indexes[tap_stream_id] = get_digest_index(self.config)
         params = get_init_endpoint_params(self.config, current_state, tap_stream_id)
+        params.update(self.stream_params.get(tap_stream_id, {}))
 
         dt_keys = self.config.get("datetime_keys")
         if isinstance(dt_keys, str):
@@ -86,6 +172,13 @@ class Sync(object):
             LOGGER.warning("None of timestamp_key, datetime_key, and index_key" +
                         " are set in conifg. Bookmarking is not available.")
 
+        if self.config.get("progress_interval"):
+            from .progress import ProgressReporter
+            self.progress[tap_stream_id] = ProgressReporter(
+                tap_stream_id, bookmark_type, start, end,
+                self.config["progress_interval"],
+                status_line=self.config.get("progress_status_line", False))
+
         start_str = human_readable(bookmark_type, start)
         end_str = human_readable(bookmark_type, end)
         # Log the conditions
@@ -125,192 +218,882 @@ class Sync(object):
                                                     "last_record_extracted")
         if last_record_extracted:
             prev_written_record = json.loads(last_record_extracted)
+            self._state_prev_record = prev_written_record
+
+        change_keys = None
+        if fetch_only:
+            from .progress import FetchStats
+            self.fetch_stats[tap_stream_id] = FetchStats(tap_stream_id)
+
+        if self.config.get("change_detection_dir") and not fetch_only:
+            from .changes import get_change_detection_keys, get_change_index, DELETED_AT
+            change_index = get_change_index(self.config, tap_stream_id)
+            if change_index is not None:
+                change_keys = get_change_detection_keys(self.config, tap_stream_id)
+                self.change_indexes[tap_stream_id] = (change_index, change_keys)
+                key_properties = key_properties or change_keys
+                if self.config.get("emit_deletes"):
+                    schema = dict(schema, properties=dict(
+                        schema["properties"],
+                        **{DELETED_AT: {"type": ["null", "string"],
+                                        "format": "date-time"}}))
+                    # For the batch writers too
+                    self.schemas[tap_stream_id] = schema
 
         # First write out the schema
-        if raw_output is False:
+        if raw_output is False and not fetch_only:
             singer.write_schema(tap_stream_id, schema, key_properties)
 
         window_seconds = get_window_seconds(self.config, tap_stream_id)
 
+        parent = get_parent_stream(self.config, tap_stream_id)
+
+        # Only set by a plain (not windowed, not child) extraction
+        completed = False
+
         # Fetch and iterate over to write the records
         with metrics.record_counter(tap_stream_id) as counter:
-            if (window_seconds and bookmark_type in ("datetime", "timestamp")
+            if parent:
+                current_state = self._sync_children(
+                    current_state, tap_stream_id, parent, schema, params, end,
+                    bookmark_type, last_update, prev_written_record, counter,
+                    raw_output)
+            elif (window_seconds and bookmark_type in ("datetime", "timestamp")
                     and start is not None and end is not None):
                 current_state = self._sync_windowed(
                     current_state, tap_stream_id, schema, start, end, bookmark_type,
                     window_seconds, prev_written_record, counter, raw_output)
             else:
+                resumed = self._resume_pagination(current_state, tap_stream_id, params)
+                if not resumed and assume_sorted and self.config.get("seek_start"):
+                    self._seek_start(tap_stream_id, params, last_update)
+                checkpoint = None
+                if raw_output is False and assume_sorted:
+                    # With sorted data, every page boundary is a safe point: all the
+                    # records up to last_update have been written.
+                    def checkpoint(last_update, prev_written_record):
+                        self._write_bookmark(current_state, tap_stream_id, bookmark_type,
+                                             last_update, prev_written_record)
+                        self._write_state(current_state)
+
                 completed, last_update, prev_written_record = self._drain_pages(
                     tap_stream_id, params, schema, end, last_update,
-                    prev_written_record, counter, raw_output)
-                # Not windowing: advance the bookmark to the max value seen (legacy behavior).
-                if bookmark_type == "timestamp" and len(str(int(last_update))) == 10:
-                    last_update = int(last_update * 1000)
-                current_state = singer.write_bookmark(
-                    current_state, tap_stream_id, "last_update", last_update)
-                if prev_written_record:
-                    current_state = singer.write_bookmark(
-                        current_state, tap_stream_id, "last_record_extracted",
-                        json.dumps(prev_written_record))
+                    prev_written_record, counter, raw_output, checkpoint=checkpoint)
+                if completed:
+                    self.completed_streams.add(tap_stream_id)
+                if completed or assume_sorted:
+                    # Not windowing: advance the bookmark to the max value seen
+                    # (legacy behavior).
+                    current_state = self._write_bookmark(
+                        current_state, tap_stream_id, bookmark_type, last_update,
+                        prev_written_record)
+                else:
+                    # Unsorted records on the pages never fetched may be older than
+                    # the max seen: keep the incoming bookmark and only save the
+                    # pagination position.
+                    LOGGER.info("Extraction of unsorted records stopped early. "
+                                "Keeping the bookmark of stream %s." % tap_stream_id)
+                    if (start is not None and singer.get_bookmark(
+                            current_state, tap_stream_id, "last_update") is None):
+                        # First run: nothing before the start was extracted
+                        current_state = self._write_bookmark(
+                            current_state, tap_stream_id, bookmark_type, start, None)
+                current_state = self._save_pagination(
+                    current_state, tap_stream_id, params, completed)
                 if raw_output is False:
-                    singer.write_state(current_state)
+                    self._write_state(current_state)
+
+        if change_keys is not None:
+            self._finish_change_detection(tap_stream_id, completed, raw_output)
+
+        reporter = self.progress.pop(tap_stream_id, None)
+        if reporter:
+            reporter.report(force=True)
+
+        stats = self.fetch_stats.pop(tap_stream_id, None)
+        if stats:
+            summary = stats.get_summary()
+            LOGGER.info("Fetch-only stats: %s" % json.dumps(summary))
+            sys.stdout.write(json.dumps(dict(summary, type="FETCH_STATS")) + "\n")
 
+        if self.duplicates[tap_stream_id]:
+            LOGGER.info("Dropped %d duplicate rows of stream %s" %
+                        (self.duplicates[tap_stream_id], tap_stream_id))
         return current_state
 
+    def _finish_change_detection(self, tap_stream_id, completed, raw_output):
+        """Write the deletion markers (emit_deletes) once the stream's extraction
+        completed, flush the records, then commit the change index."""
+        from .changes import DELETED_AT
+
+        change_index, keys = self.change_indexes.pop(tap_stream_id)
+        emit_deletes = self.config.get("emit_deletes") and completed
+        deleted = 0
+        if emit_deletes:
+            deleted_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+            for key in change_index.missing_keys():
+                record = dict(zip(keys, key))
+                record[DELETED_AT] = deleted_at
+                self._write_record(tap_stream_id, record, raw_output)
+                deleted += 1
+        for writer in self.batch_writers.values():
+            writer.flush()
+        sys.stdout.flush()
+        change_index.commit(remove_missing=emit_deletes)
+        change_index.close()
+        LOGGER.info("Change detection of stream %s: %d new, %d changed, %d unchanged"
+                    ", %d deleted records" % (tap_stream_id, change_index.new,
+                                              change_index.changed,
+                                              change_index.unchanged, deleted))
+
+    def _project_schema(self, tap_stream_id, schema):
+        """Narrow the schema to the properties selected in the catalog metadata
+        and set the stream's selected_fields URL param.
+
+        The selected_fields param lists the selected properties (all of them
+        when there is no property selection) except the _sdc_ columns, joined
+        by selected_fields_separator, e.g. ...?fields={selected_fields}
+        """
+        _, bookmark_key = get_bookmark_type_and_key(self.config, tap_stream_id)
+        selected = get_selected_properties(self.catalog, tap_stream_id, schema,
+                                           always=(bookmark_key,))
+        self.projections[tap_stream_id] = None if selected is None else frozenset(selected)
+        if selected is not None:
+            LOGGER.info("%s: %d of %d properties selected" %
+                        (tap_stream_id, len(selected), len(schema["properties"])))
+            schema = dict(schema, properties={name: schema["properties"][name]
+                                              for name in selected})
+        separator = self.config.get("selected_fields_separator") or ","
+        self.stream_params[tap_stream_id] = {
+            "selected_fields": separator.join(
+                name for name in schema.get("properties", {})
+                if name not in (EXTRACT_TIMESTAMP, BATCH_TIMESTAMP)),
+        }
+        return schema
+
+    def _write_bookmark(self, current_state, tap_stream_id, bookmark_type,
+                        last_update, prev_written_record):
+        if bookmark_type == "timestamp" and len(str(int(last_update))) == 10:
+            last_update = int(last_update * 1000)
+        current_state = singer.write_bookmark(
+            current_state, tap_stream_id, "last_update", last_update)
+        if prev_written_record:
+            current_state = singer.write_bookmark(
+                current_state, tap_stream_id, "last_record_extracted",
+                json.dumps(prev_written_record))
+        return current_state
+
+    def _resume_pagination(self, current_state, tap_stream_id, params):
+        """Continue a query interrupted by global_timeout, max_page or a signal
+        from the page/offset it stopped at, when the query bounds still match.
+        Returns True when resumed."""
+        if not self.config.get("resume_pagination", True):
+            return False
+        pagination = singer.get_bookmark(current_state, tap_stream_id, "pagination")
+        if not pagination:
+            return False
+        url = self.config.get("urls", {}).get(tap_stream_id, self.config["url"])
+        bounds = get_pagination_bounds(url, params, is_open_ended(self.config),
+                                       get_request_body(self.config, tap_stream_id))
+        if bounds is None or bounds != pagination.get("bounds"):
+            LOGGER.info("The saved pagination position does not match the query. "
+                        "Starting from the first page.")
+            return False
+        LOGGER.info("Resuming from page %d (offset %d)" %
+                    (pagination["current_page"], pagination["current_offset"]))
+        params.update({
+            "current_page": pagination["current_page"],
+            "current_offset": pagination["current_offset"],
+        })
+        return True
+
+    def _seek_start(self, tap_stream_id, params, start):
+        """Move the offset of a sorted, offset-paginated query without a
+        server-side filter to the first record at or past start (the bookmark),
+        instead of paging through the records replicated by the previous runs.
+
+        The offset is found by an exponential then a binary search, probing one
+        record per request when the URL references {items_per_page}: about
+        2 log2(N) requests for N records before the bookmark. A probe past the
+        last record (an empty page) counts as past start.
+        """
+        fields = get_query_fields(self.config, tap_stream_id)
+        if "current_offset" not in fields or start is None:
+            LOGGER.info("seek_start needs {current_offset} in the URL and a bookmark."
+                        " Not seeking.")
+            return
+
+        bookmark_type, _ = get_bookmark_type_and_key(self.config, tap_stream_id)
+        if bookmark_type == "datetime":
+            start = format_datetime(self.config, parse_datetime_tz(start))
+        elif bookmark_type == "timestamp":
+            start = get_float_timestamp(start)
+
+        record_level = self.config.get("record_level")
+        if isinstance(record_level, dict):
+            record_level = record_level.get(tap_stream_id)
+
+        probe_params = collections.ChainMap({}, params)
+        if "items_per_page" in fields:
+            probe_params["items_per_page"] = 1
+        probes = [0]
+
+        def past_start(offset):
+            probes[0] += 1
+            probe_params.update({
+                "current_offset": offset,
+                "current_page": offset // self.config["items_per_page"],
+                "current_page_one_base": offset // self.config["items_per_page"] + 1,
+            })
+            rows = self._fetch_page(tap_stream_id, probe_params)
+            if not rows:
+                return True
+            value = get_record_bookmark(self.config, tap_stream_id,
+                                        get_record(rows[0], record_level))
+            if value is None:
+                raise KeyError("The bookmark key is missing in the record at offset %d"
+                               % offset)
+            return value >= start
+
+        low = params.get("current_offset", 0)
+        try:
+            if past_start(low):
+                return
+            # past_start(low) is False. Find a high with past_start(high) True.
+            step = self.config["items_per_page"]
+            high = low + step
+            while not past_start(high):
+                low = high
+                step *= 2
+                high = low + step
+            while high - low > 1:
+                middle = (low + high) // 2
+                if past_start(middle):
+                    high = middle
+                else:
+                    low = middle
+        except (DeadlineExceeded, KeyError) as e:
+            LOGGER.warning(f"Seeking the start failed: {str(e)}. Not seeking.")
+            return
+
+        LOGGER.info("Seek: the records past %s start at offset %d (%d probes)"
+                    % (start, high, probes[0]))
+        params.update({
+            "current_offset": high,
+            "current_page": high // self.config["items_per_page"],
+        })
+
+    def _save_pagination(self, current_state, tap_stream_id, params, completed):
+        """Persist the position to resume an incomplete query from, along with the
+        bounds of the query it belongs to. A completed query clears it."""
+        url = self.config.get("urls", {}).get(tap_stream_id, self.config["url"])
+        bounds = get_pagination_bounds(url, params, is_open_ended(self.config),
+                                       get_request_body(self.config, tap_stream_id))
+        if (completed or bounds is None or
+                not self.config.get("resume_pagination", True)):
+            current_state.get("bookmarks", {}).get(tap_stream_id, {}).pop(
+                "pagination", None)
+            return current_state
+        return singer.write_bookmark(
+            current_state, tap_stream_id, "pagination", {
+                "current_page": params["current_page"],
+                "current_offset": params["current_offset"],
+                "bounds": bounds,
+            })
+
     def _drain_pages(self, tap_stream_id, params, schema, end, last_update,
-                     prev_written_record, counter, raw_output):
+                     prev_written_record, counter, raw_output, checkpoint=None):
         """Paginate a single query (one window, or the whole range when not windowing)
         to exhaustion, writing every record fetched.
 
         Returns (completed, last_update, prev_written_record). ``completed`` is True
         only when the API signalled the natural end of data (a short/last page), or,
         with assume_sorted, when the sort passed ``end``. It is False when the run was
-        cut short by global_timeout or max_page -- in which case the caller must NOT
-        advance the bookmark past records that were never fetched.
+        cut short by global_timeout, max_page or a stop signal -- in which case the
+        caller must NOT advance the bookmark past records that were never fetched.
+
+        checkpoint: Called as checkpoint(last_update, prev_written_record) at a page
+        boundary once checkpoint_every_records records were written or
+        checkpoint_every_seconds passed since the last checkpoint. The caller only
+        passes it when a page boundary is a safe point to persist.
+
+        With max_inflight_bytes set, the next pages are fetched by a
+        PagePrefetcher thread while this one writes, within that memory budget.
+
+        Without assume_sorted, the bookmark values of every page are tracked:
+        the query stops (as completed) after stop_after_pages_past_end
+        consecutive pages lying entirely past ``end``, and how sorted the
+        records looked is logged.
         """
         max_page = self.config.get("max_page")
-        global_timeout = self.config.get("global_timeout")
-        auth_method = self.config.get("auth_method", "basic")
         assume_sorted = self.config.get("assume_sorted", True)
-        filter_by_schema = self.config.get("filter_by_schema", True)
-        on_invalid_property = self.config.get("on_invalid_property", "force")
-        drop_unknown_properties = self.config.get("drop_unknown_properties", False)
-        headers = get_http_headers(self.config)
+        stop_after_pages_past_end = self.config.get("stop_after_pages_past_end")
+        tracker = None
+        if not assume_sorted and end is not None:
+            tracker = SortednessTracker(end)
 
         page_number = params.get("current_page", 0)
         offset_number = params.get("current_offset", 0)
         next_last_update = None
         completed = False
+        # max_page counts the pages of this run, not the (resumed) page index
+        pages_fetched = 0
 
-        while True:
-            if (self.started_at and global_timeout and
-                datetime.datetime.now() - self.started_at >= datetime.timedelta(seconds=global_timeout)):
-                LOGGER.warning(f"Timeout {global_timeout} reached. Not doing further sync.")
-                break
+        checkpoint_every_records = self.config.get("checkpoint_every_records")
+        checkpoint_every_seconds = self.config.get("checkpoint_every_seconds")
+        records_since_checkpoint = 0
+        last_checkpoint_at = time.monotonic()
 
-            params.update({"current_page": page_number})
-            params.update({"current_page_one_base": page_number + 1})
-            params.update({"current_offset": offset_number})
-            params.update({"last_update": last_update})
+        prefetcher = self._get_prefetcher(tap_stream_id, params)
+        try:
+            while True:
+                # The next page to fetch, i.e. where an interrupted query resumes
+                params.update({"current_page": page_number})
+                params.update({"current_offset": offset_number})
 
-            url = self.config.get("urls", {}).get(tap_stream_id, self.config["url"])
-            endpoint = get_endpoint(url, tap_stream_id, params)
-            LOGGER.info("GET %s", endpoint)
+                if self._should_stop():
+                    break
 
-            rows = []
-            try:
-                rows = generate_request(tap_stream_id, endpoint, auth_method,
-                                        headers,
-                                        self.config.get("username"),
-                                        self.config.get("password"))
-            except Exception as e:
-                if page_number == self.config.get("page_start", 0):
-                    raise
-                LOGGER.error(f"Endpoint responded with an error: {str(e)}")
-
-            # In case the record is not at the root level
-            record_list_level = self.config.get("record_list_level")
-            if isinstance(record_list_level, dict):
-                record_list_level = record_list_level.get(tap_stream_id)
+                params.update({"current_page_one_base": page_number + 1})
+                params.update({"last_update": last_update})
+
+                page_bytes = 0
+                try:
+                    if prefetcher:
+                        rows, page_bytes = prefetcher.get()
+                    else:
+                        rows = self._fetch_page(tap_stream_id, params)
+                except DeadlineExceeded as e:
+                    LOGGER.warning(f"{str(e)}. Not doing further sync.")
+                    break
+                if rows is None:
+                    # The prefetcher stopped on a stop signal
+                    break
+                pages_fetched += 1
+
+                LOGGER.info("Current page %d" % page_number)
+                LOGGER.info("Current offset %d" % offset_number)
+
+                LOGGER.debug("    Row process started.")
+                row_process_started_at = datetime.datetime.now()
+                last_update, page_last_update, prev_written_record, written = self._process_rows(
+                    tap_stream_id, rows, schema, end, last_update, prev_written_record,
+                    counter, raw_output, tracker)
+                if page_last_update is not None:
+                    next_last_update = page_last_update
+                records_since_checkpoint += written
+                row_process_sec = datetime.datetime.now() - row_process_started_at
+                LOGGER.debug(f"    row process completed in {row_process_sec} seconds.")
+                if prefetcher:
+                    prefetcher.release(page_bytes)
+                if tracker is not None:
+                    pages_past_end = tracker.end_page()
+
+                if checkpoint and records_since_checkpoint and (
+                        (checkpoint_every_records and
+                         records_since_checkpoint >= checkpoint_every_records) or
+                        (checkpoint_every_seconds and
+                         time.monotonic() - last_checkpoint_at >= checkpoint_every_seconds)):
+                    checkpoint(last_update, prev_written_record)
+                    LOGGER.info("Checkpoint: bookmark advanced to %s" % last_update)
+                    records_since_checkpoint = 0
+                    last_checkpoint_at = time.monotonic()
+
+                # Exit conditions
+                if len(rows) < self.config["items_per_page"]:
+                    LOGGER.info(("Response is less than set item per page (%d)." +
+                                "Finishing the extraction") %
+                                self.config["items_per_page"])
+                    completed = True
+                    break
+                if max_page and pages_fetched >= max_page:
+                    LOGGER.info("Max page %d reached. Finishing the extraction." % max_page)
+                    params.update({"current_page": page_number + 1})
+                    params.update({"current_offset": offset_number + len(rows)})
+                    break
+                if assume_sorted and end and (next_last_update and next_last_update >= end):
+                    LOGGER.info(("Record greater than %s and assume_sorted is" +
+                                " set. Finishing the extraction.") % end)
+                    completed = True
+                    break
+                if (tracker is not None and stop_after_pages_past_end and
+                        pages_past_end >= stop_after_pages_past_end):
+                    LOGGER.info(("%d consecutive pages had only records past %s." +
+                                 " Finishing the extraction.") % (pages_past_end, end))
+                    completed = True
+                    break
+
+                page_number += 1
+                offset_number += len(rows)
+        finally:
+            if prefetcher:
+                prefetcher.close()
+
+        if tracker is not None and tracker.pages:
+            LOGGER.info("Stream %s sortedness: %s" % (tap_stream_id, tracker.summary()))
+
+        return completed, last_update, prev_written_record
+
+    def _get_prefetcher(self, tap_stream_id, params):
+        """A started PagePrefetcher for the query when max_inflight_bytes is set,
+        or None. The URL must not depend on the records written so far
+        ({last_update} changes with every page)."""
+        max_inflight_bytes = self.config.get("max_inflight_bytes")
+        if (not max_inflight_bytes or
+                "last_update" in get_query_fields(self.config, tap_stream_id)):
+            return None
+        from .pipeline import PagePrefetcher
+        return PagePrefetcher(
+            lambda page_params: self._fetch_page(tap_stream_id, page_params),
+            params, self.config["items_per_page"], max_inflight_bytes,
+            max_page=self.config.get("max_page"),
+            should_stop=self._should_stop).start()
+
+    def _fetch_all_pages(self, tap_stream_id, params):
+        """Paginate a query to exhaustion and return all its rows. Used for the
+        child queries, which run in worker threads."""
+        params = collections.ChainMap({}, params)
+        max_page = self.config.get("max_page")
+        page_number = self.config.get("page_start", 0)
+        offset_number = self.config.get("offset_start", 0)
+        # Without a page/offset in the URL, one request is the whole query
+        paginated = bool(get_query_fields(self.config, tap_stream_id) &
+                         set(PAGINATION_PARAMS))
+        rows = []
+        pages_fetched = 0
+        while not self._should_stop():
+            params.update({
+                "current_page": page_number,
+                "current_page_one_base": page_number + 1,
+                "current_offset": offset_number,
+            })
+            page = self._fetch_page(tap_stream_id, params)
+            pages_fetched += 1
+            rows += page
+            if not paginated or not page or len(page) < self.config["items_per_page"]:
+                break
+            if max_page and pages_fetched >= max_page:
+                break
+            page_number += 1
+            offset_number += len(page)
+        return rows
+
+    def _sync_children(self, current_state, tap_stream_id, parent, schema, params,
+                       end, bookmark_type, last_update, prev_written_record,
+                       counter, raw_output):
+        """Replicate a child stream: for every record of the parent stream, fetch
+        the child query with the params extracted from the parent record.
+
+        The child queries run on a pool of child_concurrency threads sharing the
+        HTTP connection pool and the rate limit. Their records are written from
+        this thread in the parent records' order, with at most
+        2 x child_concurrency child queries in flight.
+
+        With batch_size set, the parent keys (the single param) are coalesced:
+        up to batch_size keys, joined with separator, go in one child query as
+        long as its URL stays within max_url_length. The rows are split back per
+        key (key: jsonpath of the parent key in a child record) and written in
+        the parent order.
+
+        With keys set instead of parent, the parent records are that static
+        list rather than the pages of a parent stream.
+
+        The child state stays compact: besides last_update, only
+        parent_last_update, the parent's bookmark value up to which the children
+        were replicated, is kept (not a bookmark per parent). It is advanced to the
+        last parent whose children were written when the parent is sorted
+        (assume_sorted), or to the max value seen once the parent is drained.
+        """
+        static_keys = parent.get("keys")
+        parent_id = parent.get("parent")
+        param_paths = parent.get("params", {})
+        concurrency = self.config.get("child_concurrency") or 1
+        assume_sorted = self.config.get("assume_sorted", True)
+        max_page = self.config.get("max_page")
+
+        parent_params = {"current_page": 0, "current_offset": 0, "last_update": None}
+        parent_last_update = None
+        record_level = None
+        if static_keys is None:
+            parent_state = {}
+            parent_last_update = singer.get_bookmark(current_state, tap_stream_id,
+                                                     "parent_last_update")
+            if parent_last_update is not None:
+                parent_state = singer.write_bookmark(
+                    {}, parent_id, "last_update", parent_last_update)
+            parent_params = get_init_endpoint_params(self.config, parent_state,
+                                                     parent_id)
             record_level = self.config.get("record_level")
             if isinstance(record_level, dict):
-                record_level = record_level.get(tap_stream_id)
-
-            rows = get_record_list(rows, record_list_level)
-            if not isinstance(rows, list):
-                rows = [rows]
-
-            LOGGER.info("Current page %d" % page_number)
-            LOGGER.info("Current offset %d" % offset_number)
-
-            LOGGER.debug("    Row process started.")
-            row_process_started_at = datetime.datetime.now()
-            for row in rows:
-                record = get_record(row, record_level)
-
-                unnest_config = self.config.get("unnest", {})
-                if unnest_config is None:
-                    unnest_config = {}
-                unnest_cols = unnest_config.get(tap_stream_id, [])
-                for u in unnest_cols:
-                    record = unnest(record, u["path"], u["target"])
-
-                if filter_by_schema:
-                    record = Schema.filter_record(
-                            record,
-                            schema,
-                            on_invalid_property=on_invalid_property,
-                            drop_unknown_properties=drop_unknown_properties,
-                            )
-
-                valid, reason = Schema.validate(record, schema)
-                if not valid:
-                    LOGGER.warning(f"Skipping the schema invalidated (Reason: {reason}) row:\n  {json.dumps(record)}\n\n")
-                    continue
+                record_level = record_level.get(parent_id)
+        parent_max = parent_params["last_update"]
+        parent_done = parent_last_update
+
+        LOGGER.info("Fetching %s for each %s record with %d threads" %
+                    (tap_stream_id, parent_id or "static key", concurrency))
+
+        batch_size = parent.get("batch_size") or 1
+        batch_param = key_path = child_record_level = None
+        if batch_size > 1:
+            if len(param_paths) != 1:
+                raise ValueError(f"parent_streams.{tap_stream_id}: batch_size needs "
+                                 "exactly one param")
+            batch_param = next(iter(param_paths))
+            separator = parent.get("separator", ",")
+            max_url_length = parent.get("max_url_length") or 2000
+            key_path = parent.get("key")
+            child_record_level = self.config.get("record_level")
+            if isinstance(child_record_level, dict):
+                child_record_level = child_record_level.get(tap_stream_id)
+            child_url = self.config.get("urls", {}).get(tap_stream_id,
+                                                        self.config["url"])
+            LOGGER.info("Coalescing up to %d %s keys per %s request" %
+                        (batch_size, parent_id or "static", tap_stream_id))
+        batch_keys = []
+        batch_parent_max = None
+
+        in_flight = collections.deque()
+
+        def write_children(max_in_flight):
+            nonlocal last_update, prev_written_record, parent_done
+            while len(in_flight) > max_in_flight:
+                future, keys, parent_value = in_flight.popleft()
+                rows = future.result()
+                if keys and key_path:
+                    groups, unmatched = split_rows_by_key(rows, keys, key_path,
+                                                          child_record_level)
+                    if unmatched:
+                        LOGGER.warning("%d %s records did not match the requested "
+                                       "keys" % (len(unmatched), tap_stream_id))
+                    rows = [row for _, group in groups for row in group] + unmatched
+                last_update, _, prev_written_record, _ = self._process_rows(
+                    tap_stream_id, rows, schema, end, last_update,
+                    prev_written_record, counter, raw_output)
+                parent_done = parent_value
 
-                # It's important to compare the record before adding EXTRACT_TIMESTAMP
-                digest = get_digest_from_record(record)
-                digest_dict = {"digest": digest}
-                if (prev_written_record == record or
-                        prev_written_record == digest_dict):
-                    LOGGER.info(
-                        "Skipping the duplicated row with "
-                        f"digest {digest}"
-                    )
-                    continue
+        def submit(child_params, keys, parent_value):
+            in_flight.append((
+                executor.submit(self._fetch_all_pages, tap_stream_id, child_params),
+                keys, parent_value))
+            write_children(2 * concurrency)
 
-                if EXTRACT_TIMESTAMP in schema["properties"].keys():
-                    extract_tstamp = datetime.datetime.utcnow()
-                    extract_tstamp = extract_tstamp.replace(
-                        tzinfo=datetime.timezone.utc)
-                    record[EXTRACT_TIMESTAMP] = extract_tstamp.isoformat()
+        def batch_params(keys):
+            child_params = collections.ChainMap({}, params)
+            child_params[batch_param] = separator.join(str(key) for key in keys)
+            return child_params
 
-                try:
-                    next_last_update = get_last_update(self.config, tap_stream_id, record, last_update)
-                except Exception as e:
-                    LOGGER.error(f"Error with the record:\n    {row}\n    message: {e}")
-                    raise
+        def submit_batch():
+            nonlocal batch_keys
+            if batch_keys:
+                submit(batch_params(batch_keys), batch_keys, batch_parent_max)
+                batch_keys = []
 
-                if not end or next_last_update < end:
-                    if raw_output:
-                        sys.stdout.write(json.dumps(record) + "\n")
+        completed = False
+        page_number = parent_params["current_page"]
+        offset_number = parent_params["current_offset"]
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            try:
+                while not self._should_stop():
+                    if static_keys is not None:
+                        rows = static_keys
                     else:
-                        singer.write_record(tap_stream_id, record)
+                        parent_params.update({
+                            "current_page": page_number,
+                            "current_page_one_base": page_number + 1,
+                            "current_offset": offset_number,
+                            "last_update": parent_max,
+                        })
+                        rows = self._fetch_page(parent_id, parent_params)
+                    for row in rows:
+                        parent_record = get_record(row, record_level)
+                        values = get_parent_params(parent_record, param_paths)
+                        if static_keys is None:
+                            parent_max = get_last_update(self.config, parent_id,
+                                                         parent_record, parent_max)
+                        if batch_param is None:
+                            child_params = collections.ChainMap(values, params)
+                            submit(child_params, None, parent_max)
+                            continue
+                        key = values[batch_param]
+                        if key is None:
+                            continue
+                        if batch_keys and (
+                                len(batch_keys) >= batch_size or
+                                len(get_endpoint(child_url, tap_stream_id,
+                                                 batch_params(batch_keys + [key])))
+                                > max_url_length):
+                            submit_batch()
+                        batch_keys.append(key)
+                        batch_parent_max = parent_max
+
+                    if (static_keys is not None or
+                            len(rows) < self.config["items_per_page"]):
+                        completed = True
+                        break
+                    if max_page and page_number + 1 >= max_page:
+                        break
+                    page_number += 1
+                    offset_number += len(rows)
+                if not self._should_stop():
+                    submit_batch()
+                write_children(0)
+            except DeadlineExceeded as e:
+                LOGGER.warning(f"{str(e)}. Not doing further sync.")
+            finally:
+                for future, _, _ in in_flight:
+                    future.cancel()
+
+        if completed:
+            parent_done = parent_max
+        elif not assume_sorted:
+            parent_done = parent_last_update
+
+        current_state = self._write_bookmark(
+            current_state, tap_stream_id, bookmark_type, last_update,
+            prev_written_record)
+        if parent_done is not None:
+            current_state = singer.write_bookmark(
+                current_state, tap_stream_id, "parent_last_update", parent_done)
+        if raw_output is False:
+            self._write_state(current_state)
+        return current_state
+
+    def _should_stop(self):
+        """True once global_timeout passed or a stop signal was received."""
+        global_timeout = self.config.get("global_timeout")
+        if (self.started_at and global_timeout and
+            datetime.datetime.now() - self.started_at >= datetime.timedelta(seconds=global_timeout)):
+            LOGGER.warning(f"Timeout {global_timeout} reached. Not doing further sync.")
+            return True
+        if self.stream_deadline is not None and time.time() >= self.stream_deadline:
+            LOGGER.warning("Time slice of the stream is over. Not doing further sync.")
+            return True
+        if self.stop_requested:
+            LOGGER.warning("Stop requested. Not doing further sync.")
+            return True
+        return False
+
+    def _get_deadline(self):
+        """The time.time() at which global_timeout (or the stream's time slice)
+        passes, or None"""
+        global_timeout = self.config.get("global_timeout")
+        if not (self.started_at and global_timeout):
+            return None
+        elapsed = (datetime.datetime.now() - self.started_at).total_seconds()
+        deadline = time.time() + global_timeout - elapsed
+        if self.stream_deadline is not None:
+            deadline = min(deadline, self.stream_deadline)
+        return deadline
+
+    def _start_time_slice(self, tap_stream_id, remaining_ids):
+        """stream_scheduling deadline: give the stream its share of the
+        remaining global_timeout budget"""
+        from .schedule import get_time_slice
+        self.stream_deadline = None
+        deadline = self._get_deadline()
+        if deadline is None:
+            return
+        seconds = get_time_slice(self.config, self.state, tap_stream_id,
+                                 remaining_ids, deadline - time.time())
+        self.stream_deadline = time.time() + seconds
+        LOGGER.info("%s Time slice: %.1f seconds of the remaining %.1f" %
+                    (tap_stream_id, seconds, deadline - time.time()))
+
+    def _end_time_slice(self, current_state, tap_stream_id, elapsed):
+        """Record the stream's duration and, when it was not cut short, the
+        time it was synced up to, for the scheduling of the next runs"""
+        from .schedule import SCHEDULE_KEY, get_schedule_stats, update_schedule_stats
+        now = time.time()
+        deadline = self._get_deadline()
+        finished = not self.stop_requested and (deadline is None or now < deadline)
+        self.stream_deadline = None
+        stats = update_schedule_stats(
+            get_schedule_stats(current_state, tap_stream_id), elapsed, finished, now)
+        return singer.write_bookmark(current_state, tap_stream_id, SCHEDULE_KEY, stats)
+
+    def _fetch_page(self, tap_stream_id, params):
+        """GET one page of the query and return its list of rows.
+
+        Raises DeadlineExceeded when global_timeout passes before the page is
+        fetched, so the caller stops without treating the page as the last one.
+        """
+        auth_method = self.config.get("auth_method", "basic")
+        headers = get_http_headers(self.config)
+
+        url = self.config.get("urls", {}).get(tap_stream_id, self.config["url"])
+        endpoint = get_endpoint(url, tap_stream_id, params)
+        method = get_http_method(self.config, tap_stream_id)
+        body = get_request_body(self.config, tap_stream_id)
+        if body is not None:
+            body = render_body(body, tap_stream_id, params)
+            LOGGER.info("%s %s %s", method, endpoint, json.dumps(body))
+        else:
+            LOGGER.info("%s %s", method, endpoint)
+
+        rows = []
+        deadline = self._get_deadline()
+        response_sizes.last = None
+        requested_at = time.monotonic()
+        try:
+            rows = generate_request(tap_stream_id, endpoint, auth_method,
+                                    headers,
+                                    self.config.get("username"),
+                                    self.config.get("password"),
+                                    timeout=get_request_timeout(self.config),
+                                    deadline=deadline, method=method, body=body)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            if deadline is not None and time.time() >= deadline:
+                raise DeadlineExceeded(
+                    f"Timeout {self.config['global_timeout']} reached during "
+                    f"the request: {str(e)}")
+            if params.get("current_page") == self.config.get("page_start", 0):
+                raise
+            LOGGER.error(f"Endpoint responded with an error: {str(e)}")
+
+        reporter = self.progress.get(tap_stream_id)
+        if reporter:
+            reporter.add_request(response_sizes.last)
+
+        # In case the record is not at the root level
+        record_list_level = self.config.get("record_list_level")
+        if isinstance(record_list_level, dict):
+            record_list_level = record_list_level.get(tap_stream_id)
+
+        rows = get_record_list(rows, record_list_level)
+        if not isinstance(rows, list):
+            rows = [rows]
+
+        stats = self.fetch_stats.get(tap_stream_id)
+        if stats:
+            stats.add(time.monotonic() - requested_at, len(rows), response_sizes.last)
+        return rows
+
+    def _process_rows(self, tap_stream_id, rows, schema, end, last_update,
+                      prev_written_record, counter, raw_output, tracker=None):
+        """Clean up, validate, dedup and write a page of rows.
+
+        Returns (last_update, next_last_update, prev_written_record, written) where
+        next_last_update is the bookmark value of the last row, written or not.
+        tracker: A SortednessTracker that gets the bookmark values of the valid,
+        non-duplicate rows
+        """
+        filter_by_schema = self.config.get("filter_by_schema", True)
+        on_invalid_property = self.config.get("on_invalid_property", "force")
+        drop_unknown_properties = self.config.get("drop_unknown_properties", False)
+
+        record_level = self.config.get("record_level")
+        if isinstance(record_level, dict):
+            record_level = record_level.get(tap_stream_id)
+
+        projection = self.projections.get(tap_stream_id)
+        digest_index = self.digest_indexes.get(tap_stream_id)
+        fetch_only = self.config.get("fetch_only", False)
+        change_index, change_keys = self.change_indexes.get(tap_stream_id, (None, None))
+
+        next_last_update = None
+        written = 0
+        for row in rows:
+            record = get_record(row, record_level)
+
+            unnest_config = self.config.get("unnest", {})
+            if unnest_config is None:
+                unnest_config = {}
+            unnest_cols = unnest_config.get(tap_stream_id, [])
+            for u in unnest_cols:
+                record = unnest(record, u["path"], u["target"])
+
+            if fetch_only:
+                # Only the bookmark value, which the pagination may depend on
+                next_last_update = get_last_update(self.config, tap_stream_id,
+                                                   record, last_update)
+                if not end or next_last_update < end:
+                    last_update = next_last_update
+                    written += 1
+                continue
+
+            if projection is not None:
+                record = {k: v for k, v in record.items() if k in projection}
+
+            if filter_by_schema:
+                record = Schema.filter_record(
+                        record,
+                        schema,
+                        on_invalid_property=on_invalid_property,
+                        drop_unknown_properties=drop_unknown_properties,
+                        )
+
+            valid, reason = Schema.validate(record, schema)
+            if not valid:
+                LOGGER.warning(f"Skipping the schema invalidated (Reason: {reason}) row:\n  {json.dumps(record)}\n\n")
+                continue
+
+            # It's important to compare the record before adding EXTRACT_TIMESTAMP
+            digest = get_digest_from_record(record)
+            digest_dict = {"digest": digest}
+            if (prev_written_record == record or
+                    prev_written_record == digest_dict or
+                    # The state may hold a digest from before the codec change
+                    (prev_written_record is not None and
+                     prev_written_record is self._state_prev_record and
+                     prev_written_record == {
+                         "digest": get_digest_from_record(record, legacy=True)})):
+                LOGGER.info(
+                    "Skipping the duplicated row with "
+                    f"digest {digest}"
+                )
+                self.duplicates[tap_stream_id] += 1
+                continue
+            if digest_index is not None and digest in digest_index:
+                LOGGER.debug(f"Skipping the duplicated row with digest {digest}")
+                self.duplicates[tap_stream_id] += 1
+                continue
+
+            if EXTRACT_TIMESTAMP in schema["properties"].keys():
+                extract_tstamp = datetime.datetime.utcnow()
+                extract_tstamp = extract_tstamp.replace(
+                    tzinfo=datetime.timezone.utc)
+                record[EXTRACT_TIMESTAMP] = extract_tstamp.isoformat()
 
-                    counter.increment()  # Increment only when we write
+            try:
+                next_last_update = get_last_update(self.config, tap_stream_id, record, last_update)
+            except Exception as e:
+                LOGGER.error(f"Error with the record:\n    {row}\n    message: {e}")
+                raise
+            if tracker is not None:
+                tracker.add(get_record_bookmark(self.config, tap_stream_id, record))
+
+            if not end or next_last_update < end:
+                if change_index is not None and not change_index.update(
+                        [record.get(k) for k in change_keys], digest):
+                    # Unchanged since the last run
                     last_update = next_last_update
+                    continue
+                self._write_record(tap_stream_id, record, raw_output)
 
-                    # prev_written_record may be persisted for the next run.
-                    # EXTRACT_TIMESTAMP will be different. So popping it out before storing.
-                    # It is only added when the schema declares it, so pop with a
-                    # default to avoid KeyError when the schema omits it.
-                    record.pop(EXTRACT_TIMESTAMP, None)
-                    digest = get_digest_from_record(record)
-                    prev_written_record = {"digest": digest}
-
-            row_process_sec = datetime.datetime.now() - row_process_started_at
-            LOGGER.debug(f"    row process completed in {row_process_sec} seconds.")
-
-            # Exit conditions
-            if len(rows) < self.config["items_per_page"]:
-                LOGGER.info(("Response is less than set item per page (%d)." +
-                            "Finishing the extraction") %
-                            self.config["items_per_page"])
-                completed = True
-                break
-            if max_page and page_number + 1 >= max_page:
-                LOGGER.info("Max page %d reached. Finishing the extraction." % max_page)
-                break
-            if assume_sorted and end and (next_last_update and next_last_update >= end):
-                LOGGER.info(("Record greater than %s and assume_sorted is" +
-                            " set. Finishing the extraction.") % end)
-                completed = True
-                break
+                counter.increment()  # Increment only when we write
+                written += 1
+                last_update = next_last_update
 
-            page_number += 1
-            offset_number += len(rows)
+                # prev_written_record may be persisted for the next run.
+                # EXTRACT_TIMESTAMP will be different. So popping it out before storing.
+                # It is only added when the schema declares it, so pop with a
+                # default to avoid KeyError when the schema omits it.
+                record.pop(EXTRACT_TIMESTAMP, None)
+                digest = get_digest_from_record(record)
+                prev_written_record = {"digest": digest}
+                if digest_index is not None:
+                    digest_index.add(digest)
 
-        return completed, last_update, prev_written_record
+        reporter = self.progress.get(tap_stream_id)
+        if reporter:
+            reporter.add_records(written)
+            reporter.set_position(last_update)
+            reporter.report()
+
+        return last_update, next_last_update, prev_written_record, written
 
     def _sync_windowed(self, current_state, tap_stream_id, schema, start, end,
                        bookmark_type, window_seconds, prev_written_record,
@@ -333,6 +1116,7 @@ class Sync(object):
 
         for w_start, w_end in iter_window_bounds(start_epoch, end_epoch, window_seconds):
             params = get_windowed_endpoint_params(self.config, tap_stream_id, w_start, w_end)
+            params.update(self.stream_params.get(tap_stream_id, {}))
             # Exclusive upper bound in the bookmark's native format, used both as the
             # checkpoint value and as the per-record write-gate (keeps windows half-open
             # even if the URL uses an inclusive __lte).
@@ -346,9 +1130,14 @@ class Sync(object):
             LOGGER.info("Window %s [%s, %s)" %
                         (tap_stream_id, params["start_datetime"], params["end_datetime"]))
 
+            if tap_stream_id in self.progress:
+                self.progress[tap_stream_id].set_position(params["last_update"])
+            self._resume_pagination(current_state, tap_stream_id, params)
             completed, _last_update, prev_written_record = self._drain_pages(
                 tap_stream_id, params, schema, gate_end, params["last_update"],
                 prev_written_record, counter, raw_output)
+            current_state = self._save_pagination(
+                current_state, tap_stream_id, params, completed)
 
             if not completed:
                 LOGGER.warning(
@@ -366,12 +1155,36 @@ class Sync(object):
                     current_state, tap_stream_id, "last_record_extracted",
                     json.dumps(prev_written_record))
             if raw_output is False:
-                singer.write_state(current_state)
+                self._write_state(current_state)
             LOGGER.info("Checkpoint: window drained; bookmark advanced to %s" % checkpoint)
+        else:
+            self.completed_streams.add(tap_stream_id)
 
         return current_state
 
 
+    def _request_stop(self, signum, frame):
+        if self.stop_requested:
+            # Second signal: the operator does not want to wait for the page
+            raise KeyboardInterrupt()
+        LOGGER.warning(f"Received signal {signum}. Finishing the current page and "
+                       "writing the last safe state before exiting.")
+        self.stop_requested = True
+
+    def _install_signal_handlers(self):
+        previous = {}
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            try:
+                previous[signum] = signal.signal(signum, self._request_stop)
+            except ValueError:
+                # Not in the main thread
+                pass
+        return previous
+
+    def _restore_signal_handlers(self, previous):
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+
     def sync(self, raw=False):
         """
         Sync the streams that were selected
@@ -397,47 +1210,86 @@ class Sync(object):
 
         self.started_at = datetime.datetime.now()
         remaining_streams = get_streams_to_sync(self.streams, self.state)
-        selected_streams = get_selected_streams(remaining_streams, self.catalog)
+        if self.catalog is None and self.config.get("fetch_only"):
+            selected_streams = list(remaining_streams.values())
+        else:
+            selected_streams = get_selected_streams(remaining_streams, self.catalog)
 
         if len(selected_streams) < 1:
             raise Exception("No Streams selected, please check that you have a " +
                             "schema selected in your catalog")
 
+        scheduling = self.config.get("stream_scheduling") or "config"
+        if scheduling == "deadline":
+            from .schedule import order_streams
+            by_id = {stream.tap_stream_id: stream for stream in selected_streams}
+            selected_streams = [by_id[s] for s in order_streams(
+                self.config, self.state, list(by_id), time.time())]
+        elif scheduling != "config":
+            raise ValueError(f"Unknown stream_scheduling: {scheduling}. "
+                             "Must be config or deadline")
+
         LOGGER.info("Starting sync. Will sync these streams: %s" %
                     [stream.tap_stream_id for stream in selected_streams])
 
         if not self.state.get("bookmarks"):
             self.state["bookmarks"] = {}
-        for stream in selected_streams:
-            LOGGER.info("%s Start sync" % stream.tap_stream_id)
-
-            current_state = dict(self.state)
-            singer.set_currently_syncing(current_state, stream.tap_stream_id)
-            if raw is False:
-                singer.write_state(current_state)
+        previous_handlers = self._install_signal_handlers()
+        try:
+            for index, stream in enumerate(selected_streams):
+                LOGGER.info("%s Start sync" % stream.tap_stream_id)
+                if scheduling == "deadline":
+                    self._start_time_slice(
+                        stream.tap_stream_id,
+                        [s.tap_stream_id for s in selected_streams[index:]])
+                stream_started_at = time.time()
+
+                current_state = dict(self.state)
+                singer.set_currently_syncing(current_state, stream.tap_stream_id)
+                if raw is False:
+                    self._write_state(current_state)
 
-            try:
-                self.sync_rows(current_state, stream.tap_stream_id, raw_output=raw)
-            except Exception as e:
-                LOGGER.critical(e)
-                raise e
+                try:
+                    self.sync_rows(current_state, stream.tap_stream_id, raw_output=raw)
+                except Exception as e:
+                    LOGGER.critical(e)
+                    raise e
 
-            if not self.state["bookmarks"].get(stream.tap_stream_id):
-                self.state["bookmarks"][stream.tap_stream_id] = current_state["bookmarks"][stream.tap_stream_id]
-            else:
-                self.state["bookmarks"][stream.tap_stream_id].update(
-                    current_state["bookmarks"][stream.tap_stream_id])
-            if raw is False:
-                singer.write_state(self.state)
+                if scheduling == "deadline":
+                    current_state = self._end_time_slice(
+                        current_state, stream.tap_stream_id,
+                        time.time() - stream_started_at)
 
-            bookmark_type, _ = get_bookmark_type_and_key(self.config, stream.tap_stream_id)
-            last_update = self.state["bookmarks"][stream.tap_stream_id]["last_update"]
-            if bookmark_type == "timestamp":
-                last_update = str(last_update) + " (" + str(
-                    datetime.datetime.fromtimestamp(get_float_timestamp(last_update))) + ")"
-            LOGGER.info("%s End sync" % stream.tap_stream_id)
-            LOGGER.info("%s Last record's %s: %s" %
-                        (stream.tap_stream_id, bookmark_type, last_update))
+                shard = self.config.get("shard")
+                if shard:
+                    # For merge_states: whether this shard's range was completed
+                    current_state = singer.write_bookmark(
+                        current_state, stream.tap_stream_id, "shard",
+                        dict(shard, completed=stream.tap_stream_id in self.completed_streams))
+
+                stream_bookmark = current_state["bookmarks"].get(stream.tap_stream_id, {})
+                if not self.state["bookmarks"].get(stream.tap_stream_id):
+                    self.state["bookmarks"][stream.tap_stream_id] = stream_bookmark
+                else:
+                    self.state["bookmarks"][stream.tap_stream_id].update(stream_bookmark)
+                if raw is False:
+                    self._write_state(self.state)
+
+                bookmark_type, _ = get_bookmark_type_and_key(self.config, stream.tap_stream_id)
+                last_update = self.state["bookmarks"][stream.tap_stream_id].get("last_update")
+                if bookmark_type == "timestamp" and last_update is not None:
+                    last_update = str(last_update) + " (" + str(
+                        datetime.datetime.fromtimestamp(get_float_timestamp(last_update))) + ")"
+                LOGGER.info("%s End sync" % stream.tap_stream_id)
+                LOGGER.info("%s Last record's %s: %s" %
+                            (stream.tap_stream_id, bookmark_type, last_update))
+
+                if self.stop_requested:
+                    LOGGER.warning("Stopped by a signal. Skipping the remaining streams.")
+                    break
+        finally:
+            self._restore_signal_handlers(previous_handlers)
+            sys.stdout.flush()
 
         ended_at = datetime.datetime.now()
         LOGGER.info("Completed sync at %s" % str(ended_at))
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+
+class SyncStubs(object):
+    """Stubs of the API, the schema files and the Singer output of a sync.
+
+    respond() sets what generate_request returns. The records, schemas and
+    states written are collected, the states as deep copies, and messages
+    lists the message types in the order they were written.
+    """
+    def __init__(self, monkeypatch):
+        import tap_rest_api.sync as S
+        import tap_rest_api.schema as SC
+
+        self.monkeypatch = monkeypatch
+        self.reset()
+        self._validate = SC.Schema.__dict__["validate"]
+        monkeypatch.setattr(SC.Schema, "validate",
+                            staticmethod(lambda rec, sch: (True, None)))
+        monkeypatch.setattr(SC.Schema, "load_schema",
+                            lambda self, stream: {"type": "object", "properties": {}})
+        monkeypatch.setattr(S.singer, "write_schema", self._write_schema)
+        monkeypatch.setattr(S.singer, "write_record", self._write_record)
+        monkeypatch.setattr(S.singer, "write_state", self._write_state)
+
+    def reset(self):
+        """Forget what was written, e.g. between two runs of a test"""
+        self.streams = []
+        self.records = []
+        self.schemas = []
+        self.states = []
+        self.messages = []
+
+    def validate(self):
+        """Validate the records against the schema, as a sync does"""
+        import tap_rest_api.schema as SC
+
+        self.monkeypatch.setattr(SC.Schema, "validate", self._validate)
+
+    def respond(self, response):
+        """response: A function with the arguments of generate_request, or the
+        list of rows every request returns"""
+        import tap_rest_api.sync as S
+
+        if not callable(response):
+            rows = response
+            response = lambda *a, **k: list(rows)
+        self.monkeypatch.setattr(S, "generate_request", response)
+
+    def _write_schema(self, stream, schema, key_properties, *a, **k):
+        self.schemas.append((stream, schema, key_properties))
+        self.messages.append("SCHEMA")
+
+    def _write_record(self, stream, record, *a, **k):
+        self.streams.append(stream)
+        self.records.append(record)
+        self.messages.append("RECORD")
+
+    def _write_state(self, state):
+        self.states.append(json.loads(json.dumps(state)))
+        self.messages.append("STATE")
+
+    @property
+    def ids(self):
+        return [record["id"] for record in self.records]
+
+
+@pytest.fixture
+def sync_stubs(monkeypatch):
+    return SyncStubs(monkeypatch)
@@ -0,0 +1,136 @@
+import datetime
+import gzip
+import json
+import os
+
+import pytest
+
+
+def _read_jsonl_gz(url):
+    assert url.startswith("file://")
+    with gzip.open(url[len("file://"):], "rt") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_batch_writer_rolls_by_record_count(monkeypatch, tmp_path):
+    import tap_rest_api.batch as B
+
+    messages = []
+    monkeypatch.setattr(B.singer, "write_message", lambda m: messages.append(m.asdict()))
+
+    writer = B.BatchWriter({"batch_format": "jsonl", "batch_dir": str(tmp_path),
+                            "batch_max_records": 2}, "orders")
+    for i in range(5):
+        writer.write({"id": i})
+    writer.flush()
+
+    assert [m["type"] for m in messages] == ["BATCH"] * 3
+    assert all(m["stream"] == "orders" for m in messages)
+    assert messages[0]["encoding"] == {"format": "jsonl", "compression": "gzip"}
+    records = []
+    for m in messages:
+        assert len(m["manifest"]) == 1
+        records += _read_jsonl_gz(m["manifest"][0])
+    assert records == [{"id": i} for i in range(5)]
+    # no temporary files are left behind
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".tmp")]
+
+
+def test_batch_writer_rolls_by_bytes(monkeypatch, tmp_path):
+    import tap_rest_api.batch as B
+
+    messages = []
+    monkeypatch.setattr(B.singer, "write_message", lambda m: messages.append(m.asdict()))
+    writer = B.BatchWriter({"batch_format": "jsonl", "batch_dir": str(tmp_path),
+                            "batch_max_bytes": 30}, "orders")
+    writer.write({"id": 1, "name": "a" * 20})
+    writer.write({"id": 2})
+    assert len(messages) == 1
+    writer.flush()
+    writer.flush()  # nothing open: no empty file, no message
+    assert len(messages) == 2
+
+
+def test_batch_writer_rejects_unknown_format(tmp_path):
+    import tap_rest_api.batch as B
+    with pytest.raises(ValueError):
+        B.BatchWriter({"batch_format": "csv", "batch_dir": str(tmp_path)}, "orders")
+
+
+def test_state_follows_batch_files(monkeypatch, tmp_path, sync_stubs):
+    """In batch mode no RECORD is written, and the STATE comes after the BATCH
+    message of the file that holds the records it covers."""
+    import tap_rest_api.sync as S
+    import tap_rest_api.batch as B
+
+    def fake_request(stream, endpoint, *a, **k):
+        return [{"id": 1, "modified": "2026-01-01T00:00:00.000000"}] \
+            if "page=1" in endpoint else []
+
+    sync_stubs.respond(fake_request)
+    monkeypatch.setattr(B.singer, "write_message",
+                        lambda m: sync_stubs.messages.append(m.asdict()["type"]))
+
+    cfg = {
+        "streams": "orders",
+        "url": "http://x/orders?page={current_page_one_base}",
+        "datetime_keys": {"orders": "modified"},
+        "url_param_datetime_format": "%Y-%m-%dT%H:%M:%S.%f",
+        "items_per_page": 100,
+        "assume_sorted": False,
+        "filter_by_schema": False,
+        "auth_method": "no_auth",
+        "batch_format": "jsonl",
+        "batch_dir": str(tmp_path),
+    }
+    s = S.Sync(cfg, {}, None)
+    s.started_at = datetime.datetime.now()
+    params = dict(cfg, current_page=0, current_offset=0,
+                  last_update="2026-01-01T00:00:00.000000")
+    with S.metrics.record_counter("orders") as counter:
+        s._drain_pages("orders", params, {"type": "object", "properties": {}}, None,
+                       "2026-01-01T00:00:00.000000", None, counter, raw_output=False)
+    s._write_state({})
+
+    assert sync_stubs.messages == ["BATCH", "STATE"]
+
+
+def test_parquet_files_share_the_schema_of_the_stream(monkeypatch, tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+    import tap_rest_api.batch as B
+
+    messages = []
+    monkeypatch.setattr(B.singer, "write_message", lambda m: messages.append(m.asdict()))
+    schema = {
+        "type": "object",
+        "properties": {
+            "id": {"type": ["null", "integer"]},
+            "price": {"type": ["null", "number"]},
+            "name": {"type": ["null", "string"]},
+            "tags": {"type": ["null", "array"], "items": {"type": "string"}},
+            "address": {"type": ["null", "object"],
+                        "properties": {"city": {"type": ["null", "string"]}}},
+            "extra": {},
+        },
+    }
+    writer = B.BatchWriter({"batch_format": "parquet", "batch_dir": str(tmp_path),
+                            "batch_max_records": 1}, "orders", schema)
+    writer.write({"id": 1, "price": 2, "name": "a", "tags": ["x"],
+                  "address": {"city": "Tokyo", "zip": "100"}, "extra": {"k": 1},
+                  "unknown": True})
+    # a file of nulls only still gets the same column types
+    writer.write({"id": None})
+    writer.flush()
+
+    assert [m["encoding"]["format"] for m in messages] == ["parquet"] * 2
+    tables = [pq.read_table(m["manifest"][0][len("file://"):]) for m in messages]
+    assert tables[0].schema == tables[1].schema
+    assert tables[0].schema.field("price").type == pa.float64()
+    assert tables[1].schema.field("id").type == pa.int64()
+    assert tables[0].to_pylist() == [{
+        "id": 1, "price": 2.0, "name": "a", "tags": ["x"],
+        "address": {"city": "Tokyo"}, "extra": '{"k":1}'}]
+    assert tables[1].to_pylist() == [{
+        "id": None, "price": None, "name": None, "tags": None,
+        "address": None, "extra": None}]
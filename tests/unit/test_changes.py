@@ -0,0 +1,107 @@
+import datetime
+
+import pytest
+
+from tap_rest_api.changes import ChangeIndex
+
+
+def test_change_index(tmp_path):
+    path = str(tmp_path / "customers.sqlite")
+    index = ChangeIndex(path)
+    assert index.update([1], "a")
+    assert index.update([2], "b")
+    index.commit()
+    index.close()
+
+    index = ChangeIndex(path)
+    assert index.run == 2
+    assert not index.update([1], "a")
+    assert index.update([3], "c")
+    assert list(index.missing_keys()) == [[2]]
+    index.close()  # not committed: the run is replayed
+
+    index = ChangeIndex(path)
+    assert index.run == 2
+    assert not index.update([1], "a")
+    assert list(index.missing_keys()) == [[2]]
+    index.commit(remove_missing=True)
+    index.close()
+
+    index = ChangeIndex(path)
+    assert list(index.missing_keys()) == [[1]]
+    index.close()
+
+
+def _run(sync_stubs, tmp_path, records, **cfg):
+    import tap_rest_api.sync as S
+
+    sync_stubs.reset()
+    sync_stubs.respond(records)
+    cfg = dict({
+        "streams": "customers",
+        "url": "http://x/customers",
+        "index_keys": {"customers": "id"},
+        "start_index": 0,
+        "items_per_page": 100,
+        "filter_by_schema": False,
+        "auth_method": "no_auth",
+        "change_detection_dir": str(tmp_path),
+        "change_detection_keys": {"customers": ["id"]},
+    }, **cfg)
+    s = S.Sync(cfg, {}, None)
+    s.started_at = datetime.datetime.now()
+    s.sync_rows({}, "customers")
+    return sync_stubs.records, [(schema, keys) for _, schema, keys in sync_stubs.schemas]
+
+
+def test_change_detection(sync_stubs, tmp_path):
+    records = [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}, {"id": 3, "name": "c"}]
+    written, schemas = _run(sync_stubs, tmp_path, records, emit_deletes=True)
+    assert written == records
+    assert schemas[0][1] == ["id"]
+    assert "_sdc_deleted_at" in schemas[0][0]["properties"]
+
+    records = [{"id": 1, "name": "a"}, {"id": 3, "name": "c2"}, {"id": 4, "name": "d"}]
+    written, _ = _run(sync_stubs, tmp_path, records, emit_deletes=True)
+    assert written[:2] == records[1:]
+    assert len(written) == 3
+    assert written[2]["id"] == 2
+    assert written[2]["_sdc_deleted_at"]
+
+    # Nothing changed, and the deleted key is gone
+    written, _ = _run(sync_stubs, tmp_path, records, emit_deletes=True)
+    assert written == []
+
+
+def test_change_detection_keys_as_a_string(sync_stubs, tmp_path):
+    records = [{"id": 1, "name": "a"}]
+    keys = '{"customers": ["id"]}'
+    written, schemas = _run(sync_stubs, tmp_path, records, change_detection_keys=keys)
+    assert written == records
+    assert schemas[0][1] == ["id"]
+    written, _ = _run(sync_stubs, tmp_path, records, change_detection_keys=keys)
+    assert written == []
+
+
+def test_deletes_in_parquet_batches(monkeypatch, sync_stubs, tmp_path):
+    pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+    import tap_rest_api.batch as B
+    import tap_rest_api.schema as SC
+
+    monkeypatch.setattr(SC.Schema, "load_schema", lambda self, stream: {
+        "type": "object", "properties": {"id": {"type": ["null", "integer"]},
+                                         "name": {"type": ["null", "string"]}}})
+    messages = []
+    monkeypatch.setattr(B.singer, "write_message", lambda m: messages.append(m.asdict()))
+    batch = {"batch_format": "parquet", "batch_dir": str(tmp_path / "batches"),
+             "emit_deletes": True}
+    _run(sync_stubs, tmp_path, [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}], **batch)
+    del messages[:]
+    _run(sync_stubs, tmp_path, [{"id": 1, "name": "a"}], **batch)
+
+    rows = [row for m in messages
+            for row in pq.read_table(m["manifest"][0][len("file://"):]).to_pylist()]
+    assert len(rows) == 1
+    assert rows[0]["id"] == 2
+    assert rows[0]["_sdc_deleted_at"]
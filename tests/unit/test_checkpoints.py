@@ -0,0 +1,124 @@
+import datetime
+import json
+import signal
+import urllib.parse as urlparse
+
+
+def _config(**kwargs):
+    cfg = {
+        "streams": "orders",
+        "url": "http://x/orders?page={current_page_one_base}",
+        "datetime_keys": {"orders": "modified"},
+        "url_param_datetime_format": "%Y-%m-%dT%H:%M:%S.%f",
+        "start_datetime": "2026-01-01T00:00:00.000000",
+        "end_datetime": "2026-02-01T00:00:00.000000",
+        "items_per_page": 2,
+        "assume_sorted": True,
+        "filter_by_schema": False,
+        "auth_method": "no_auth",
+        "page_start": 0,
+        "offset_start": 0,
+    }
+    cfg.update(kwargs)
+    return cfg
+
+
+def _setup(sync_stubs, pages=3, on_request=None):
+    """Fake API: ``pages`` full pages of 2 sorted records, then an empty page."""
+    import tap_rest_api.sync as S
+
+    def fake_request(stream, endpoint, *a, **k):
+        page = int(urlparse.parse_qs(urlparse.urlparse(endpoint).query)["page"][0])
+        if on_request:
+            on_request(page)
+        if page > pages:
+            return []
+        return [{"id": 2 * page + i,
+                 "modified": "2026-01-%02dT00:00:00.000000" % (2 * page + i)}
+                for i in range(2)]
+
+    sync_stubs.respond(fake_request)
+    return S, sync_stubs.states
+
+
+def _last_update(state):
+    return state["bookmarks"]["orders"]["last_update"]
+
+
+def test_checkpoint_every_records(sync_stubs):
+    S, states = _setup(sync_stubs)
+    s = S.Sync(_config(checkpoint_every_records=3), {}, None)
+    s.started_at = datetime.datetime.now()
+    s.sync_rows({}, "orders")
+    # 6 records: a checkpoint at the first page boundary past 3 records (page 2),
+    # then the final state after the last page
+    assert [_last_update(st) for st in states] == [
+        "2026-01-05T00:00:00.000000", "2026-01-07T00:00:00.000000"]
+
+
+def test_no_checkpoint_without_assume_sorted(sync_stubs):
+    S, states = _setup(sync_stubs)
+    s = S.Sync(_config(checkpoint_every_records=1, assume_sorted=False), {}, None)
+    s.started_at = datetime.datetime.now()
+    s.sync_rows({}, "orders")
+    assert len(states) == 1
+
+
+def test_signal_finishes_the_page_and_writes_the_last_safe_state(sync_stubs):
+    holder = {}
+
+    def on_request(page):
+        if page == 2:
+            holder["sync"]._request_stop(signal.SIGTERM, None)
+
+    S, states = _setup(sync_stubs, on_request=on_request)
+    s = S.Sync(_config(), {}, None)
+    holder["sync"] = s
+    s.started_at = datetime.datetime.now()
+    s.sync_rows({}, "orders")
+
+    assert s.stop_requested
+    # page 2 was finished, page 3 never requested
+    assert [_last_update(st) for st in states] == ["2026-01-05T00:00:00.000000"]
+
+
+def test_signal_on_unsorted_data_keeps_the_bookmark(sync_stubs):
+    holder = {}
+
+    def on_request(page):
+        if page == 2:
+            holder["sync"]._request_stop(signal.SIGTERM, None)
+
+    S, states = _setup(sync_stubs, on_request=on_request)
+    s = S.Sync(_config(assume_sorted=False), {}, None)
+    holder["sync"] = s
+    s.started_at = datetime.datetime.now()
+    incoming = {"bookmarks": {"orders": {"last_update": "2026-01-01T00:00:00.000000"}}}
+    s.sync_rows(json.loads(json.dumps(incoming)), "orders")
+
+    assert s.stop_requested
+    assert len(states) == 1
+    bookmark = states[0]["bookmarks"]["orders"]
+    # the records of page 3 may be older than those seen on pages 1 and 2
+    assert bookmark["last_update"] == "2026-01-01T00:00:00.000000"
+    assert "last_record_extracted" not in bookmark
+    # only the pagination position advanced
+    assert bookmark["pagination"]["current_page"] == 2
+
+
+def test_deadline_during_a_request_stops_with_a_resumable_state(sync_stubs):
+    from tap_rest_api.helper import DeadlineExceeded
+
+    def on_request(page):
+        if page == 2:
+            raise DeadlineExceeded("Timeout 60 reached during the request")
+
+    S, states = _setup(sync_stubs, on_request=on_request)
+    s = S.Sync(_config(global_timeout=60), {}, None)
+    s.started_at = datetime.datetime.now()
+    state = s.sync_rows({}, "orders")
+
+    bookmark = state["bookmarks"]["orders"]
+    # page 1 was written; the page cut short is fetched again on the next run
+    assert bookmark["last_update"] == "2026-01-03T00:00:00.000000"
+    assert bookmark["pagination"]["current_page"] == 1
@@ -0,0 +1,188 @@
+import datetime
+import threading
+import time
+import urllib.parse as urlparse
+
+import pytest
+
+from tap_rest_api.helper import get_parent_params, get_parent_stream, split_rows_by_key
+
+
+def test_parent_stream_config():
+    cfg = {"parent_streams": {"items": {"parent": "orders",
+                                        "params": {"order_id": "$.id"}}}}
+    assert get_parent_stream(cfg, "items")["parent"] == "orders"
+    assert get_parent_stream(cfg, "orders") is None
+    assert get_parent_stream({}, "items") is None
+    assert get_parent_stream({"parent_streams": {"items": {"keys": "[1, 2]"}}},
+                             "items")["keys"] == [1, 2]
+    with pytest.raises(KeyError):
+        get_parent_stream({"parent_streams": {"items": {"params": {}}}}, "items")
+    assert get_parent_params({"id": 5, "x": {"y": "z"}},
+                             {"order_id": "$.id", "y": "x.y", "none": "$.nope"}) == \
+        {"order_id": 5, "y": "z", "none": None}
+
+
+def test_children_fetched_per_parent_and_written_in_order(sync_stubs):
+    import tap_rest_api.sync as S
+
+    threads = set()
+
+    def fake_request(stream, endpoint, *a, **k):
+        url = urlparse.urlparse(endpoint)
+        q = urlparse.parse_qs(url.query)
+        if stream == "orders":
+            page = int(q["page"][0])
+            ids = {1: [1, 2], 2: [3]}.get(page, [])
+            return [{"id": i, "modified": "2026-01-%02dT00:00:00" % i} for i in ids]
+        order_id = int(url.path.split("/")[2])
+        if q["page"][0] != "1":
+            return []
+        threads.add(threading.current_thread().name)
+        # the first parent's children are the slowest: order must still hold
+        time.sleep(0.05 if order_id == 1 else 0)
+        return [{"id": order_id * 10 + i, "order_id": order_id,
+                 "modified": "2026-01-%02dT00:00:00" % order_id} for i in range(2)]
+
+    sync_stubs.respond(fake_request)
+
+    cfg = {
+        "streams": "items",
+        "url": "http://x/orders?page={current_page_one_base}",
+        "urls": {"items": "http://x/orders/{order_id}/items?page={current_page_one_base}"},
+        "parent_streams": {"items": {"parent": "orders", "params": {"order_id": "$.id"}}},
+        "child_concurrency": 3,
+        "datetime_key": "modified",
+        "url_param_datetime_format": "%Y-%m-%dT%H:%M:%S",
+        "start_datetime": "2026-01-01T00:00:00",
+        "end_datetime": "2026-02-01T00:00:00",
+        "items_per_page": 2,
+        "filter_by_schema": False,
+        "auth_method": "no_auth",
+    }
+    s = S.Sync(cfg, {}, None)
+    s.started_at = datetime.datetime.now()
+    state = s.sync_rows({}, "items")
+
+    assert sync_stubs.ids == [10, 11, 20, 21, 30, 31]
+    assert len(threads) > 1
+    bookmark = state["bookmarks"]["items"]
+    assert set(bookmark) == {"last_update", "last_record_extracted", "parent_last_update"}
+    assert bookmark["parent_last_update"] == "2026-01-03T00:00:00"
+
+
+def test_child_pagination_stops_on_timeout(monkeypatch):
+    import tap_rest_api.sync as S
+
+    calls = []
+    monkeypatch.setattr(S, "generate_request",
+                        lambda *a, **k: calls.append(1) or [{"id": 1}, {"id": 2}])
+    cfg = {"streams": "items", "url": "http://x/items?page={current_page}",
+           "items_per_page": 2, "global_timeout": 60}
+    s = S.Sync(cfg, {}, None)
+    s.started_at = datetime.datetime.now() - datetime.timedelta(seconds=61)
+    assert s._fetch_all_pages("items", {}) == []
+    assert calls == []
+
+
+def test_split_rows_by_key():
+    rows = [{"r": {"order_id": 2, "id": 20}}, {"r": {"order_id": 1, "id": 10}},
+            {"r": {"order_id": 9, "id": 90}}]
+    groups, unmatched = split_rows_by_key(rows, [1, 2, 3], "$.order_id", "$.r")
+    assert [(k, [r["r"]["id"] for r in g]) for k, g in groups] == \
+        [("1", [10]), ("2", [20]), ("3", [])]
+    assert unmatched == [{"r": {"order_id": 9, "id": 90}}]
+
+
+def test_child_keys_are_coalesced(sync_stubs):
+    import tap_rest_api.sync as S
+
+    child_requests = []
+
+    def fake_request(stream, endpoint, *a, **k):
+        q = urlparse.parse_qs(urlparse.urlparse(endpoint).query)
+        if stream == "orders":
+            page = int(q["page"][0])
+            ids = list(range(2 * page - 1, 2 * page + 1)) if page <= 3 else []
+            return [{"id": i, "modified": "2026-01-%02dT00:00:00" % i} for i in ids]
+        ids = [int(i) for i in q["ids"][0].split(",")]
+        child_requests.append(ids)
+        # the API answers in its own order
+        return [{"id": i * 10, "order_id": i,
+                 "modified": "2026-01-%02dT00:00:00" % i} for i in reversed(ids)]
+
+    sync_stubs.respond(fake_request)
+
+    cfg = {
+        "streams": "items",
+        "url": "http://x/orders?page={current_page_one_base}",
+        "urls": {"items": "http://x/items?ids={order_ids}"},
+        "parent_streams": {"items": {"parent": "orders",
+                                     "params": {"order_ids": "$.id"},
+                                     "batch_size": 4, "key": "$.order_id"}},
+        "child_concurrency": 2,
+        "datetime_key": "modified",
+        "url_param_datetime_format": "%Y-%m-%dT%H:%M:%S",
+        "start_datetime": "2026-01-01T00:00:00",
+        "end_datetime": "2026-02-01T00:00:00",
+        "items_per_page": 2,
+        "filter_by_schema": False,
+        "auth_method": "no_auth",
+    }
+    s = S.Sync(cfg, {}, None)
+    s.started_at = datetime.datetime.now()
+    state = s.sync_rows({}, "items")
+
+    # 6 parent keys in 2 requests instead of 6, split back in the parent order
+    assert sorted(child_requests) == [[1, 2, 3, 4], [5, 6]]
+    assert [r["order_id"] for r in sync_stubs.records] == [1, 2, 3, 4, 5, 6]
+    assert state["bookmarks"]["items"]["parent_last_update"] == "2026-01-06T00:00:00"
+
+    # the URL length caps the batch too
+    del child_requests[:]
+    cfg["parent_streams"]["items"]["max_url_length"] = len("http://x/items?ids=1%2C2")
+    s = S.Sync(cfg, {}, None)
+    s.started_at = datetime.datetime.now()
+    s.sync_rows({}, "items")
+    assert sorted(child_requests) == [[1, 2], [3, 4], [5, 6]]
+
+
+def test_static_child_keys_are_coalesced(sync_stubs):
+    import tap_rest_api.sync as S
+
+    child_requests = []
+
+    def fake_request(stream, endpoint, *a, **k):
+        assert stream == "items"
+        q = urlparse.parse_qs(urlparse.urlparse(endpoint).query)
+        ids = [int(i) for i in q["ids"][0].split(",")]
+        child_requests.append(ids)
+        return [{"id": i * 10, "order_id": i,
+                 "modified": "2026-01-%02dT00:00:00" % i} for i in reversed(ids)]
+
+    sync_stubs.respond(fake_request)
+
+    cfg = {
+        "streams": "items",
+        "url": "http://x/items?ids={order_ids}",
+        "parent_streams": '{"items": {"keys": [1, 2, 3, 4, 5], '
+                          '"params": {"order_ids": "$"}, '
+                          '"batch_size": 2, "key": "$.order_id"}}',
+        "child_concurrency": 2,
+        "datetime_key": "modified",
+        "url_param_datetime_format": "%Y-%m-%dT%H:%M:%S",
+        "start_datetime": "2026-01-01T00:00:00",
+        "end_datetime": "2026-02-01T00:00:00",
+        "items_per_page": 2,
+        "filter_by_schema": False,
+        "auth_method": "no_auth",
+    }
+    s = S.Sync(cfg, {}, None)
+    s.started_at = datetime.datetime.now()
+    state = s.sync_rows({}, "items")
+
+    assert sorted(child_requests) == [[1, 2], [3, 4], [5]]
+    assert [r["order_id"] for r in sync_stubs.records] == [1, 2, 3, 4, 5]
+    bookmark = state["bookmarks"]["items"]
+    assert bookmark["last_update"] == "2026-01-05T00:00:00"
+    assert "parent_last_update" not in bookmark
@@ -0,0 +1,76 @@
+import datetime
+import hashlib
+import urllib.parse as urlparse
+
+import pytest
+
+from tap_rest_api.dedup import BloomDigestIndex, DigestIndex, get_digest_index
+
+
+def _digest(i):
+    return hashlib.md5(str(i).encode()).hexdigest()
+
+
+def test_digest_index_keeps_the_last_digests():
+    index = DigestIndex(3)
+    for i in range(5):
+        index.add(_digest(i))
+    assert _digest(0) not in index
+    assert _digest(1) not in index
+    assert all(_digest(i) in index for i in (2, 3, 4))
+
+
+def test_bloom_digest_index():
+    index = BloomDigestIndex(1000, 0.01)
+    for i in range(3000):
+        index.add(_digest(i))
+    # the last 1000 (up to 2000) digests are always covered
+    assert all(_digest(i) in index for i in range(2000, 3000))
+    false_positives = sum(_digest(i) in index for i in range(10000, 20000))
+    assert false_positives < 10000 * 0.01 * 2 * 2
+
+
+def test_get_digest_index():
+    assert get_digest_index({}) is None
+    assert isinstance(get_digest_index({"dedup_window": 10}), DigestIndex)
+    assert isinstance(get_digest_index({"dedup_window": 10, "dedup_method": "bloom"}),
+                      BloomDigestIndex)
+    with pytest.raises(ValueError):
+        get_digest_index({"dedup_window": 10, "dedup_method": "x"})
+
+
+def _run(sync_stubs, **cfg):
+    import tap_rest_api.sync as S
+
+    # Pages overlapping by two records, as with rows inserted during pagination
+    pages = [[1, 2, 3], [2, 3, 4], [4, 5]]
+
+    def fake_request(stream, endpoint, *a, **k):
+        page = int(urlparse.parse_qs(urlparse.urlparse(endpoint).query)["page"][0])
+        return [{"id": i, "modified": "2026-01-%02dT00:00:00.000000" % i}
+                for i in pages[page]]
+
+    sync_stubs.reset()
+    sync_stubs.respond(fake_request)
+    cfg = dict({
+        "streams": "orders",
+        "url": "http://x/orders?page={current_page}",
+        "datetime_keys": {"orders": "modified"},
+        "url_param_datetime_format": "%Y-%m-%dT%H:%M:%S.%f",
+        "start_datetime": "2026-01-01T00:00:00.000000",
+        "end_datetime": "2026-02-01T00:00:00.000000",
+        "items_per_page": 3,
+        "filter_by_schema": False,
+        "auth_method": "no_auth",
+    }, **cfg)
+    s = S.Sync(cfg, {}, None)
+    s.started_at = datetime.datetime.now()
+    s.sync_rows({}, "orders")
+    return sync_stubs.ids, s.duplicates["orders"]
+
+
+def test_overlapping_pages(sync_stubs):
+    # Only the record right before is compared by default
+    assert _run(sync_stubs) == ([1, 2, 3, 2, 3, 4, 5], 1)
+    assert _run(sync_stubs, dedup_window=100) == ([1, 2, 3, 4, 5], 3)
+    assert _run(sync_stubs, dedup_window=100, dedup_method="bloom") == ([1, 2, 3, 4, 5], 3)
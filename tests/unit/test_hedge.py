@@ -0,0 +1,81 @@
+import threading
+import time
+
+from tap_rest_api.hedge import Hedger, LatencyTracker
+
+
+class Response(object):
+    def __init__(self, name):
+        self.name = name
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def _warm_up(hedger, latency=0.0, n=20):
+    for _ in range(n):
+        hedger._trackers["orders"].add(latency)
+    hedger.requests += n
+
+
+def test_latency_percentile():
+    tracker = LatencyTracker(window=100)
+    assert tracker.percentile(95) is None
+    for i in range(100):
+        tracker.add(i / 100)
+    assert tracker.percentile(95) == 0.95
+    assert tracker.percentile(95, min_samples=101) is None
+
+
+def test_slow_request_is_hedged_and_the_loser_closed():
+    hedger = Hedger({"hedge_max_rate": 1, "hedge_min_samples": 5})
+    _warm_up(hedger, latency=0.01)
+    calls = []
+    responses = []
+    lock = threading.Lock()
+
+    def send():
+        with lock:
+            calls.append(1)
+            first = len(calls) == 1
+        resp = Response("slow" if first else "fast")
+        responses.append(resp)
+        time.sleep(0.5 if first else 0)
+        return resp
+
+    started_at = time.monotonic()
+    assert hedger.get("orders", send).name == "fast"
+    assert time.monotonic() - started_at < 0.4
+    assert len(calls) == 2
+    assert hedger.hedges == 1
+    time.sleep(0.6)
+    assert [r.closed for r in responses] == [True, False]
+    hedger.shutdown()
+
+
+def test_hedge_rate_is_capped():
+    hedger = Hedger({"hedge_max_rate": 0.05})
+    # every request is slower than the (fixed) p95
+    hedger._trackers["orders"].percentile = lambda q, min_samples: 0.001
+    calls = []
+
+    def send():
+        calls.append(1)
+        time.sleep(0.02)
+        return Response("r")
+
+    for _ in range(20):
+        hedger.get("orders", send)
+    # 20 requests at 5%: one duplicate
+    assert hedger.hedges == 1
+    assert len(calls) == 21
+    hedger.shutdown()
+
+
+def test_no_hedge_before_enough_samples():
+    hedger = Hedger({"hedge_max_rate": 1})
+    calls = []
+    hedger.get("orders", lambda: calls.append(1) or time.sleep(0.01) or Response("r"))
+    assert len(calls) == 1 and hedger.hedges == 0
+    hedger.shutdown()
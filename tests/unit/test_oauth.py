@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import tap_rest_api.helper as H
+from tap_rest_api import oauth
+
+
+class Response(object):
+    def __init__(self, body, status_code=200):
+        self.status_code = status_code
+        self.content = json.dumps(body).encode("utf-8")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class Session(object):
+    """Token endpoint issuing token-1, token-2, ... and an API accepting only the
+    latest token"""
+    def __init__(self, expires_in=3600, delay=0):
+        self.expires_in = expires_in
+        self.delay = delay
+        self.token_requests = []
+        self.authorizations = []
+        self.issued = 0
+
+    def post(self, url, data=None, **kwargs):
+        self.token_requests.append(dict(data))
+        time.sleep(self.delay)
+        self.issued += 1
+        return Response({"access_token": "token-%d" % self.issued,
+                         "refresh_token": "refresh-%d" % self.issued,
+                         "expires_in": self.expires_in})
+
+    def get(self, url, headers=None, **kwargs):
+        self.authorizations.append(headers["Authorization"])
+        if headers["Authorization"] != "Bearer token-%d" % self.issued:
+            return Response({}, status_code=401)
+        return Response([{"id": 1}])
+
+
+def _config(tmp_path, **kwargs):
+    config = {
+        "auth_method": "oauth2",
+        "oauth2_token_url": "http://auth/token",
+        "oauth2_client_id": "client",
+        "oauth2_client_secret": "secret",
+        "oauth2_token_cache": str(tmp_path / "token.json"),
+    }
+    config.update(kwargs)
+    return config
+
+
+def test_client_credentials_cached_across_runs(monkeypatch, tmp_path):
+    session = Session()
+    monkeypatch.setattr(H, "get_session", lambda: session)
+    config = _config(tmp_path, oauth2_scope="read")
+
+    assert oauth.TokenManager(config).get_token() == "token-1"
+    assert session.token_requests == [{
+        "grant_type": "client_credentials", "client_id": "client",
+        "client_secret": "secret", "scope": "read"}]
+    assert os.stat(config["oauth2_token_cache"]).st_mode & 0o777 == 0o600
+
+    # The next run reuses the cached token
+    assert oauth.TokenManager(config).get_token() == "token-1"
+    assert len(session.token_requests) == 1
+
+    # A cache of another client is ignored
+    other = _config(tmp_path, oauth2_client_id="other")
+    assert oauth.TokenManager(other).get_token() == "token-2"
+
+
+def test_refresh_token_rotation(monkeypatch, tmp_path):
+    session = Session(expires_in=30)
+    monkeypatch.setattr(H, "get_session", lambda: session)
+    config = _config(tmp_path, oauth2_refresh_token="refresh-0")
+
+    manager = oauth.TokenManager(config)
+    assert manager.get_token() == "token-1"
+    # Within the refresh margin (60s) of the expiry: refreshed with the rotated
+    # refresh token
+    assert manager.get_token() == "token-2"
+    assert [r["refresh_token"] for r in session.token_requests] == [
+        "refresh-0", "refresh-1"]
+    assert all(r["grant_type"] == "refresh_token" for r in session.token_requests)
+
+    # The latest refresh token is used by the next run
+    oauth.TokenManager(config).get_token()
+    assert session.token_requests[-1]["refresh_token"] == "refresh-2"
+
+
+def test_refresh_does_not_stall_other_threads(monkeypatch, tmp_path):
+    session = Session(delay=0.5)
+    monkeypatch.setattr(H, "get_session", lambda: session)
+    manager = oauth.TokenManager(_config(tmp_path, oauth2_refresh_margin=10))
+    manager.access_token = "token-0"
+    manager.expires_at = time.time() + 5
+
+    refresher = threading.Thread(target=manager.get_token)
+    refresher.start()
+    time.sleep(0.1)
+    started = time.time()
+    # The token is still valid: used while the other thread refreshes it
+    assert manager.get_token() == "token-0"
+    assert time.time() - started < 0.2
+    refresher.join()
+    assert manager.get_token() == "token-1"
+    assert len(session.token_requests) == 1
+
+
+def test_expired_token_is_refreshed_once(monkeypatch, tmp_path):
+    session = Session(delay=0.1)
+    monkeypatch.setattr(H, "get_session", lambda: session)
+    manager = oauth.TokenManager(_config(tmp_path, oauth2_token_cache=None))
+
+    tokens = []
+    threads = [threading.Thread(target=lambda: tokens.append(manager.get_token()))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert tokens == ["token-1"] * 8
+    assert len(session.token_requests) == 1
+
+
+def test_request_with_bearer_token_and_retry_on_401(monkeypatch, tmp_path):
+    session = Session()
+    monkeypatch.setattr(H, "get_session", lambda: session)
+    config = _config(tmp_path)
+    manager = oauth.configure(config)
+    try:
+        assert H.generate_request("orders", "http://x/orders",
+                                  auth_method="oauth2") == [{"id": 1}]
+        assert session.authorizations == ["Bearer token-1"]
+
+        # The token is revoked by the server before its expiry
+        session.issued += 1
+        assert H.generate_request("orders", "http://x/orders",
+                                  auth_method="oauth2") == [{"id": 1}]
+        assert session.authorizations[1:] == ["Bearer token-1", "Bearer token-3"]
+        assert manager.get_token() == "token-3"
+    finally:
+        oauth.configure({})
+
+
+def test_configure_requires_token_url():
+    with pytest.raises(KeyError):
+        oauth.configure({"auth_method": "oauth2"})
+    assert oauth.configure({"auth_method": "basic"}) is None
+    with pytest.raises(KeyError):
+        oauth.get_token_manager()
@@ -0,0 +1,97 @@
+import datetime
+import time
+import urllib.parse as urlparse
+
+from tap_rest_api.pipeline import PagePrefetcher
+
+
+def test_prefetch_blocks_on_the_budget():
+    fetched = []
+
+    def fetch(params):
+        fetched.append(params["current_offset"])
+        return [{"id": params["current_offset"] + i} for i in range(10)]
+
+    # Each page is about 100 bytes: a 150 bytes budget holds 2 pages
+    prefetcher = PagePrefetcher(fetch, {}, 10, 150, max_page=6).start()
+    pages = []
+    ahead = []
+    for _ in range(6):
+        rows, size = prefetcher.get()
+        time.sleep(0.05)  # a slow target
+        ahead.append(len(fetched) - len(pages))
+        pages.append(rows[0]["id"])
+        prefetcher.release(size)
+    assert prefetcher.get() == (None, 0)
+    prefetcher.close()
+
+    assert pages == [0, 10, 20, 30, 40, 50]
+    assert fetched == pages
+    assert max(ahead) <= 3
+    assert prefetcher.peak_inflight_bytes < 300
+
+
+def test_prefetch_close_stops_the_fetching():
+    def fetch(params):
+        return [{"id": 1}] * 10
+
+    prefetcher = PagePrefetcher(fetch, {}, 10, 1).start()
+    rows, size = prefetcher.get()
+    prefetcher.close()
+    assert not prefetcher._thread.is_alive()
+
+
+def test_prefetch_reraises_fetch_errors():
+    def fetch(params):
+        raise ValueError("boom")
+
+    prefetcher = PagePrefetcher(fetch, {}, 10, 1000).start()
+    try:
+        prefetcher.get()
+        assert False
+    except ValueError:
+        pass
+    prefetcher.close()
+
+
+def _run(sync_stubs, cfg):
+    import tap_rest_api.sync as S
+
+    requested = []
+
+    def fake_request(stream, endpoint, *a, **k):
+        offset = int(urlparse.parse_qs(urlparse.urlparse(endpoint).query)["offset"][0])
+        requested.append(offset)
+        if offset >= 8:
+            return []
+        return [{"id": offset + i,
+                 "modified": "2026-01-%02dT00:00:00.000000" % (offset + i + 1)}
+                for i in range(2)]
+
+    sync_stubs.reset()
+    sync_stubs.respond(fake_request)
+    cfg = dict({
+        "streams": "orders",
+        "url": "http://x/orders?offset={current_offset}&limit={items_per_page}",
+        "datetime_keys": {"orders": "modified"},
+        "url_param_datetime_format": "%Y-%m-%dT%H:%M:%S.%f",
+        "start_datetime": "2026-01-01T00:00:00.000000",
+        "end_datetime": "2026-02-01T00:00:00.000000",
+        "items_per_page": 2,
+        "filter_by_schema": False,
+        "auth_method": "no_auth",
+    }, **cfg)
+    s = S.Sync(cfg, {}, None)
+    s.started_at = datetime.datetime.now()
+    state = s.sync_rows({}, "orders")
+    return requested, sync_stubs.ids, state
+
+
+def test_sync_with_prefetch_matches_sync_without(sync_stubs):
+    expected = _run(sync_stubs, {})
+    assert _run(sync_stubs, {"max_inflight_bytes": 100}) == expected
+
+    # The resume position is the consumer's, not the prefetcher's
+    expected = _run(sync_stubs, {"max_page": 2})
+    assert _run(sync_stubs, {"max_page": 2, "max_inflight_bytes": 100}) == expected
+    assert expected[2]["bookmarks"]["orders"]["pagination"]["current_offset"] == 4
@@ -0,0 +1,138 @@
+import datetime
+import json
+
+import pytest
+
+from tap_rest_api.progress import ProgressReporter, get_position
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_progress():
+    clock = Clock()
+    reporter = ProgressReporter(
+        "orders", "datetime", "2026-01-01T00:00:00+00:00", "2026-01-11T00:00:00+00:00",
+        interval=60, clock=clock)
+    clock.now = 30.0
+    reporter.add_request(3000)
+    reporter.add_request(3000)
+    reporter.add_records(150)
+    reporter.set_position("2026-01-03T12:00:00+00:00")
+    # not yet due
+    assert reporter.report() is None
+
+    clock.now = 60.0
+    progress = reporter.report()
+    assert progress["records_per_second"] == 2.5
+    assert progress["requests_per_second"] == 2 / 60
+    assert progress["bytes_per_second"] == 100
+    assert progress["fraction"] == 0.25
+    assert progress["eta_seconds"] == 180
+    assert reporter.format_status(progress) == (
+        "PROGRESS orders: 25.0% covered, 2.5 rec/s, 0.03 req/s, 0.1 KB/s, ETA 0:03:00")
+
+
+def test_position():
+    assert get_position("timestamp", 1767225600000) == 1767225600.0
+    assert get_position("index", "42") == 42.0
+    assert get_position("index", "abc") is None
+
+
+def test_sync_reports_progress(monkeypatch, sync_stubs):
+    import tap_rest_api.sync as S
+    import tap_rest_api.progress as P
+
+    sync_stubs.respond([{"id": 1, "modified": "2026-01-06T00:00:00.000000"}])
+    points = []
+    monkeypatch.setattr(P.metrics, "log", lambda logger, point: points.append(point))
+
+    cfg = {
+        "streams": "orders",
+        "url": "http://x/orders",
+        "datetime_keys": {"orders": "modified"},
+        "url_param_datetime_format": "%Y-%m-%dT%H:%M:%S.%f",
+        "start_datetime": "2026-01-01T00:00:00.000000",
+        "end_datetime": "2026-01-11T00:00:00.000000",
+        "items_per_page": 100,
+        "filter_by_schema": False,
+        "auth_method": "no_auth",
+        "progress_interval": 3600,
+    }
+    s = S.Sync(cfg, {}, None)
+    s.started_at = datetime.datetime.now()
+    s.sync_rows({}, "orders")
+    reported = {p.metric: p.value for p in points}
+    # the final report
+    assert reported["range_covered"] == 0.5
+    assert reported["requests_per_second"] > 0
+    assert set(p.tags["endpoint"] for p in points) == {"orders"}
+    assert not s.progress
+
+
+def test_fetch_only(monkeypatch, capsys, sync_stubs):
+    import tap_rest_api.sync as S
+    import tap_rest_api.schema as SC
+
+    pages = {0: 100, 1: 100, 2: 30}
+
+    def fake_request(stream, endpoint, *a, **k):
+        page = int(endpoint.rsplit("=", 1)[1])
+        return [{"id": page * 100 + i,
+                 "modified": "2026-01-%02dT00:00:00.000000" % (page + 1)}
+                for i in range(pages[page])]
+
+    def fail(*a, **k):
+        raise AssertionError("fetch_only must not load the schema or validate")
+
+    sync_stubs.respond(fake_request)
+    monkeypatch.setattr(SC.Schema, "validate", staticmethod(fail))
+    monkeypatch.setattr(SC.Schema, "load_schema", fail)
+
+    cfg = {
+        "streams": "orders",
+        "url": "http://x/orders?page={current_page}",
+        "datetime_keys": {"orders": "modified"},
+        "url_param_datetime_format": "%Y-%m-%dT%H:%M:%S.%f",
+        "start_datetime": "2026-01-01T00:00:00.000000",
+        "end_datetime": "2026-02-01T00:00:00.000000",
+        "items_per_page": 100,
+        "auth_method": "no_auth",
+        "fetch_only": True,
+    }
+    S.Sync(cfg, {}, None).sync()
+    assert sync_stubs.messages == []
+    stats = json.loads(capsys.readouterr().out)
+    assert stats["type"] == "FETCH_STATS"
+    assert stats["stream"] == "orders"
+    assert stats["requests"] == 3
+    assert stats["page_rows_mean"] == 76.7
+    assert stats["page_rows_max"] == 100
+    assert stats["latency_p50"] is not None
+
+
+def test_fetch_only_without_schema_dir(monkeypatch):
+    import tap_rest_api.sync as S
+
+    requests = []
+    monkeypatch.setattr(S, "generate_request",
+                        lambda stream, endpoint, *a, **k: requests.append(endpoint)
+                        or [{"id": 1}])
+    cfg = {"streams": "orders", "url": "http://x/orders", "index_key": "id",
+           "start_index": 0, "items_per_page": 100, "auth_method": "no_auth",
+           "fetch_only": True}
+    s = S.Sync(cfg, {}, None)
+    s.started_at = datetime.datetime.now()
+    s.sync_rows({}, "orders")
+    assert requests == ["http://x/orders"]
+    assert s.schemas == {}
+
+    # Unless the query asks for the selected fields
+    cfg["url"] = "http://x/orders?fields={selected_fields}"
+    with pytest.raises(KeyError, match="schema_dir"):
+        S.Sync(cfg, {}, None).sync_rows({}, "orders")
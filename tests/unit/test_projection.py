@@ -0,0 +1,100 @@
+import datetime
+import urllib.parse as urlparse
+
+from singer.catalog import Catalog
+
+from tap_rest_api.helper import get_selected_properties
+from tap_rest_api.schema import get_stream_metadata
+
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "id": {"type": ["null", "integer"]},
+        "name": {"type": ["null", "string"]},
+        "notes": {"type": ["null", "string"]},
+        "modified": {"type": ["null", "string"], "format": "date-time"},
+        "_sdc_extracted_at": {"type": ["null", "string"], "format": "date-time"},
+    },
+}
+
+
+def _catalog(deselected=()):
+    mdata = get_stream_metadata({"datetime_key": "modified"}, "orders", SCHEMA)
+    for entry in mdata:
+        if entry["breadcrumb"][1:] and entry["breadcrumb"][1] in deselected:
+            entry["metadata"]["selected"] = False
+    return Catalog.from_dict({"streams": [{
+        "tap_stream_id": "orders", "stream": "orders",
+        "schema": dict(SCHEMA, selected=True), "metadata": mdata}]})
+
+
+def test_stream_metadata():
+    mdata = {tuple(m["breadcrumb"]): m["metadata"]
+             for m in get_stream_metadata({"datetime_key": "modified"}, "orders", SCHEMA)}
+    assert mdata[("properties", "modified")]["inclusion"] == "automatic"
+    assert mdata[("properties", "_sdc_extracted_at")]["inclusion"] == "automatic"
+    assert mdata[("properties", "notes")] == {"inclusion": "available",
+                                              "selected-by-default": True}
+
+
+def test_selected_properties():
+    assert get_selected_properties(None, "orders", SCHEMA) is None
+    # everything selected: no projection
+    assert get_selected_properties(_catalog(), "orders", SCHEMA) is None
+    assert get_selected_properties(_catalog({"notes"}), "orders", SCHEMA) == \
+        ["id", "name", "modified", "_sdc_extracted_at"]
+    # automatic properties and the always set cannot be deselected
+    assert get_selected_properties(_catalog({"notes", "modified", "id"}), "orders",
+                                   SCHEMA, always=("id",)) == \
+        ["id", "name", "modified", "_sdc_extracted_at"]
+
+
+def test_projection_is_pushed_down_to_the_url_and_records(monkeypatch, sync_stubs):
+    import tap_rest_api.sync as S
+    import tap_rest_api.schema as SC
+
+    requested = []
+
+    def fake_request(stream, endpoint, *a, **k):
+        q = urlparse.parse_qs(urlparse.urlparse(endpoint).query)
+        requested.append(q["fields"][0])
+        if q["page"][0] != "1":
+            return []
+        # the API ignores the projection
+        return [{"id": 1, "name": "a", "notes": "long text", "other": 1,
+                 "modified": "2026-01-02T00:00:00.000000"}]
+
+    sync_stubs.respond(fake_request)
+    sync_stubs.validate()
+    monkeypatch.setattr(SC.Schema, "load_schema", lambda self, stream: SCHEMA)
+
+    cfg = {
+        "streams": "orders",
+        "url": "http://x/orders?page={current_page_one_base}&fields={selected_fields}",
+        "datetime_key": "modified",
+        "url_param_datetime_format": "%Y-%m-%dT%H:%M:%S.%f",
+        "start_datetime": "2026-01-01T00:00:00.000000",
+        "end_datetime": "2026-02-01T00:00:00.000000",
+        "items_per_page": 2,
+        "auth_method": "no_auth",
+    }
+    s = S.Sync(cfg, {}, _catalog({"notes"}))
+    s.started_at = datetime.datetime.now()
+    s.sync_rows({}, "orders")
+
+    assert requested[0] == "id,name,modified"
+    assert list(sync_stubs.schemas[0][1]["properties"]) == ["id", "name", "modified", "_sdc_extracted_at"]
+    # the shared schema is not narrowed
+    assert "notes" in SCHEMA["properties"]
+    assert [{k: v for k, v in r.items() if k != "_sdc_extracted_at"} for r in sync_stubs.records] == \
+        [{"id": 1, "name": "a", "modified": "2026-01-02T00:00:00.000000"}]
+
+    # without property selection, every property is requested and kept
+    del requested[:]
+    sync_stubs.reset()
+    s = S.Sync(cfg, {}, None)
+    s.started_at = datetime.datetime.now()
+    s.sync_rows({}, "orders")
+    assert requested[0] == "id,name,notes,modified"
+    assert sync_stubs.records[0]["notes"] == "long text"
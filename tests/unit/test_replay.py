@@ -0,0 +1,75 @@
+import datetime
+import json
+import urllib.parse as urlparse
+
+import pytest
+
+import tap_rest_api.helper as H
+from tap_rest_api import replay
+
+
+class Response(object):
+    status_code = 200
+
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+class Session(object):
+    def __init__(self):
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        offset = int(urlparse.parse_qs(urlparse.urlparse(url).query)["offset"][0])
+        rows = [{"id": i, "modified": "2026-01-%02dT00:00:00.000000" % (i + 1)}
+                for i in range(offset, min(offset + 2, 5))]
+        return Response(json.dumps(rows).encode("utf-8"))
+
+
+def _sync(sync_stubs, tmp_path, mode):
+    import tap_rest_api.sync as S
+
+    sync_stubs.reset()
+    cfg = {
+        "streams": "orders",
+        "url": "http://x/orders?offset={current_offset}&since={start_datetime}",
+        "datetime_keys": {"orders": "modified"},
+        "url_param_datetime_format": "%Y-%m-%dT%H:%M:%S.%f",
+        "start_datetime": "2026-01-01T00:00:00.000000",
+        "end_datetime": "2026-02-01T00:00:00.000000",
+        "items_per_page": 2,
+        "filter_by_schema": False,
+        "auth_method": "no_auth",
+        "replay_mode": mode,
+        "replay_dir": str(tmp_path / "responses"),
+    }
+    s = S.Sync(cfg, {}, None)
+    s.started_at = datetime.datetime.now()
+    s.sync_rows({}, "orders")
+    return sync_stubs.ids
+
+
+def test_record_and_replay(monkeypatch, tmp_path, sync_stubs):
+    session = Session()
+    monkeypatch.setattr(H, "get_session", lambda: session)
+    try:
+        assert _sync(sync_stubs, tmp_path, "record") == [0, 1, 2, 3, 4]
+        assert len(session.urls) == 3
+        index = (tmp_path / "responses" / "index.tsv").read_text().splitlines()
+        assert [line.split("\t")[1] for line in index] == session.urls
+
+        # No request at all on replay
+        monkeypatch.setattr(H, "get_session", lambda: None)
+        assert _sync(sync_stubs, tmp_path, "replay") == [0, 1, 2, 3, 4]
+
+        replay.configure({"replay_mode": "replay",
+                          "replay_dir": str(tmp_path / "responses")})
+        with pytest.raises(replay.ReplayMissing):
+            H.generate_request("orders", "http://x/orders?offset=100")
+    finally:
+        replay.configure({})
+    assert replay.get_replayer() is None
@@ -0,0 +1,142 @@
+import datetime
+import json
+
+import pytest
+
+import tap_rest_api.helper as H
+from tap_rest_api import replay
+from tap_rest_api.helper import (
+    get_http_method,
+    get_pagination_bounds,
+    get_query_fields,
+    get_request_body,
+    render_body,
+)
+
+
+BODY = {
+    "filter": {"updated_at": {"gte": "{start_datetime}"}},
+    "sort": [{"updated_at": "asc"}],
+    "index": "{stream}-v2",
+    "from": "{current_offset}",
+    "size": "{items_per_page}",
+}
+
+
+def test_render_body():
+    params = {"start_datetime": "2026-01-01T00:00:00", "stream": "orders",
+              "current_offset": 200, "items_per_page": 100}
+    assert render_body(BODY, "orders", params) == {
+        "filter": {"updated_at": {"gte": "2026-01-01T00:00:00"}},
+        "sort": [{"updated_at": "asc"}],
+        "index": "orders-v2",
+        "from": 200,
+        "size": 100,
+    }
+    assert render_body({"q": "{{literal}}", "n": None}, "orders", {}) == {
+        "q": "{literal}", "n": None}
+
+
+def test_method_and_body_per_stream():
+    config = {"url": "http://x/{stream}/search", "request_bodies": {"orders": BODY},
+              "http_methods": {"users": "put"}}
+    assert get_request_body(config, "orders") == BODY
+    assert get_http_method(config, "orders") == "POST"
+    assert get_http_method(config, "users") == "PUT"
+    assert get_http_method(config, "events") == "GET"
+    assert get_request_body(dict(config, request_body=json.dumps(BODY)),
+                            "events") == BODY
+    assert get_query_fields(config, "orders") == {
+        "stream", "start_datetime", "current_offset", "items_per_page"}
+
+    params = {"start_datetime": "2026-01-01", "stream": "orders",
+              "current_offset": 200, "items_per_page": 100}
+    assert get_pagination_bounds("http://x/{stream}/search", params, body=BODY) == {
+        "items_per_page": "100", "start_datetime": "2026-01-01", "stream": "orders"}
+    assert get_pagination_bounds(
+        "http://x/search", params, body={"after": "{last_update}"}) is None
+
+
+class Response(object):
+    status_code = 200
+
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+class Session(object):
+    def __init__(self):
+        self.requests = []
+
+    def request(self, method, url, json=None, **kwargs):
+        self.requests.append((method, url, json))
+        offset = json["from"]
+        rows = [{"id": i, "modified": "2026-01-%02dT00:00:00.000000" % (i + 1)}
+                for i in range(offset, min(offset + 2, 5))]
+        return Response(H.codec.dumps(rows).encode("utf-8"))
+
+
+def test_sync_with_post_requests(monkeypatch, tmp_path, sync_stubs):
+    import tap_rest_api.sync as S
+
+    session = Session()
+    monkeypatch.setattr(H, "get_session", lambda: session)
+    config = {
+        "streams": "orders",
+        "url": "http://x/{stream}/search",
+        "request_body": {"since": "{start_datetime}", "from": "{current_offset}",
+                         "size": "{items_per_page}"},
+        "datetime_keys": {"orders": "modified"},
+        "url_param_datetime_format": "%Y-%m-%dT%H:%M:%S.%f",
+        "start_datetime": "2026-01-01T00:00:00.000000",
+        "end_datetime": "2026-02-01T00:00:00.000000",
+        "items_per_page": 2,
+        "filter_by_schema": False,
+        "auth_method": "no_auth",
+        "replay_mode": "record",
+        "replay_dir": str(tmp_path / "responses"),
+    }
+    s = S.Sync(config, {}, None)
+    s.started_at = datetime.datetime.now()
+    s.sync_rows({}, "orders")
+
+    assert sync_stubs.ids == [0, 1, 2, 3, 4]
+    assert [(method, url) for method, url, _ in session.requests] == [
+        ("POST", "http://x/orders/search")] * 3
+    assert [body["from"] for _, _, body in session.requests] == [0, 2, 4]
+    assert session.requests[0][2] == {"since": "2026-01-01T00:00:00.000000",
+                                      "from": 0, "size": 2}
+
+    # Same URL, different bodies: replayed by body
+    monkeypatch.setattr(H, "get_session", lambda: None)
+    sync_stubs.reset()
+    try:
+        s = S.Sync(dict(config, replay_mode="replay"), {}, None)
+        s.started_at = datetime.datetime.now()
+        s.sync_rows({}, "orders")
+        assert sync_stubs.ids == [0, 1, 2, 3, 4]
+    finally:
+        replay.configure({})
+
+
+def test_post_is_not_hedged(monkeypatch):
+    from tap_rest_api import hedge
+
+    session = Session()
+    monkeypatch.setattr(H, "get_session", lambda: session)
+    hedger = hedge.configure({"hedge_requests": True, "hedge_max_rate": 1,
+                              "hedge_min_samples": 1})
+    # Any request is past the p95: a GET would be hedged right away
+    hedger._trackers["orders"].percentile = lambda q, min_samples: 0.0
+    hedger.get = lambda *a, **k: pytest.fail("POST request hedged")
+    try:
+        assert H.generate_request("orders", "http://x/orders/search",
+                                  method="POST", body={"from": 3}) == [
+            {"id": 3, "modified": "2026-01-04T00:00:00.000000"},
+            {"id": 4, "modified": "2026-01-05T00:00:00.000000"}]
+        assert session.requests == [("POST", "http://x/orders/search", {"from": 3})]
+    finally:
+        hedge.configure({})
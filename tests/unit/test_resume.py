@@ -0,0 +1,206 @@
+import datetime
+import json
+import urllib.parse as urlparse
+
+from tap_rest_api.helper import get_pagination_bounds, get_url_fields
+
+
+def test_url_fields():
+    url = ("https://{{ subdomain }}.x.com/{stream}?page={current_page_one_base}"
+           "&since={start_datetime}&f={filters[a]}")
+    assert get_url_fields(url) == {"stream", "current_page_one_base",
+                                   "start_datetime", "filters"}
+
+
+def test_pagination_bounds_exclude_the_position():
+    url = "http://x/orders?offset={current_offset}&since={start_datetime}"
+    params = {"current_offset": 10, "start_datetime": "2026-01-01", "other": 1}
+    assert get_pagination_bounds(url, params) == {"start_datetime": "2026-01-01"}
+    # pages relative to last_update cannot be resumed
+    assert get_pagination_bounds(url + "&after={last_update}", params) is None
+
+
+def _setup(sync_stubs, url):
+    import tap_rest_api.sync as S
+
+    requested = []
+
+    def fake_request(stream, endpoint, *a, **k):
+        offset = int(urlparse.parse_qs(urlparse.urlparse(endpoint).query)["offset"][0])
+        requested.append(offset)
+        if offset >= 8:
+            return []
+        return [{"id": offset + i,
+                 "modified": "2026-01-%02dT00:00:00.000000" % (offset + i + 1)}
+                for i in range(2)]
+
+    sync_stubs.respond(fake_request)
+    cfg = {
+        "streams": "orders",
+        "url": url,
+        "datetime_keys": {"orders": "modified"},
+        "url_param_datetime_format": "%Y-%m-%dT%H:%M:%S.%f",
+        "start_datetime": "2026-01-01T00:00:00.000000",
+        "end_datetime": "2026-02-01T00:00:00.000000",
+        "items_per_page": 2,
+        "filter_by_schema": False,
+        "auth_method": "no_auth",
+    }
+    return S, cfg, requested, sync_stubs.states
+
+
+def _run(S, cfg, state):
+    s = S.Sync(cfg, state, None)
+    s.started_at = datetime.datetime.now()
+    return s.sync_rows(json.loads(json.dumps(state)), "orders")
+
+
+def test_resume_after_max_page(sync_stubs):
+    S, cfg, requested, states = _setup(
+        sync_stubs, "http://x/orders?offset={current_offset}&limit={items_per_page}")
+    state = _run(S, dict(cfg, max_page=2), {})
+    assert requested == [0, 2]
+    pagination = state["bookmarks"]["orders"]["pagination"]
+    assert pagination["current_page"] == 2
+    assert pagination["current_offset"] == 4
+    assert pagination["bounds"] == {"items_per_page": "2"}
+
+    del requested[:]
+    state = _run(S, cfg, state)
+    # continued at offset 4 instead of refetching 0 and 2
+    assert requested == [4, 6, 8]
+    # the completed query clears the position
+    assert "pagination" not in state["bookmarks"]["orders"]
+
+
+def test_no_resume_when_the_bounds_changed(sync_stubs):
+    S, cfg, requested, states = _setup(
+        sync_stubs,
+        "http://x/orders?offset={current_offset}&limit={items_per_page}"
+        "&since={start_datetime}")
+    state = _run(S, dict(cfg, max_page=1), {})
+    assert state["bookmarks"]["orders"]["pagination"]["current_offset"] == 2
+
+    del requested[:]
+    _run(S, dict(cfg, items_per_page=3), state)
+    assert requested[0] == 0
+
+
+def test_resume_with_an_open_ended_range(sync_stubs):
+    """Without a configured end, end_datetime is now and changes between runs;
+    the query still counts as the same one."""
+    S, cfg, requested, states = _setup(
+        sync_stubs,
+        "http://x/orders?offset={current_offset}&limit={items_per_page}"
+        "&until={end_datetime}")
+    del cfg["end_datetime"]
+    state = _run(S, dict(cfg, max_page=2), {})
+    pagination = state["bookmarks"]["orders"]["pagination"]
+    assert pagination["current_offset"] == 4
+    assert pagination["bounds"] == {"items_per_page": "2"}
+
+    del requested[:]
+    _run(S, cfg, state)
+    assert requested == [4, 6, 8]
+
+
+def test_max_page_counts_the_pages_of_the_run(sync_stubs):
+    S, cfg, requested, states = _setup(
+        sync_stubs, "http://x/orders?offset={current_offset}&limit={items_per_page}")
+    state = _run(S, dict(cfg, max_page=1), {})
+    assert requested == [0]
+
+    del requested[:]
+    state = _run(S, dict(cfg, max_page=1), state)
+    # one more page, not none because the resumed page index is already 1
+    assert requested == [2]
+    assert state["bookmarks"]["orders"]["pagination"]["current_offset"] == 4
+
+
+def test_unsorted_stop_after_pages_past_end(sync_stubs):
+    S, cfg, requested, states = _setup(
+        sync_stubs, "http://x/orders?offset={current_offset}&limit={items_per_page}")
+    cfg = dict(cfg, assume_sorted=False, end_datetime="2026-01-03T00:00:00.000000")
+    _run(S, cfg, {})
+    # pages past the end are read to the last one
+    assert requested == [0, 2, 4, 6, 8]
+
+    del requested[:]
+    state = _run(S, dict(cfg, stop_after_pages_past_end=2), {})
+    # offsets 2 and 4 hold only records at or past Jan 3
+    assert requested == [0, 2, 4]
+    # completed: the bookmark advances to the records written
+    assert state["bookmarks"]["orders"]["last_update"] == "2026-01-02T00:00:00.000000"
+
+
+def test_sortedness_tracker():
+    from tap_rest_api.helper import SortednessTracker
+
+    tracker = SortednessTracker(end=10)
+    for value in (1, 5, 3):
+        tracker.add(value)
+    assert tracker.end_page() == 0
+    for value in (12, 10):
+        tracker.add(value)
+    assert tracker.end_page() == 1
+    tracker.add(11)
+    tracker.add(None)
+    assert tracker.end_page() == 2
+    tracker.add(9)
+    assert tracker.end_page() == 0
+    # 3, 10, 11 and 9 are older than an earlier row
+    assert tracker.rows_out_of_order == 4
+    assert tracker.summary().startswith("3 of 7 rows (42.9%) on 4 pages")
+
+
+def test_seek_start(sync_stubs):
+    import tap_rest_api.sync as S
+
+    requested = []
+
+    def fake_request(stream, endpoint, *a, **k):
+        query = urlparse.parse_qs(urlparse.urlparse(endpoint).query)
+        offset, limit = int(query["offset"][0]), int(query["limit"][0])
+        requested.append((offset, limit))
+        # 1000 records sorted by index, no filter on the API side
+        return [{"id": i} for i in range(offset, min(offset + limit, 1000))]
+
+    sync_stubs.respond(fake_request)
+    cfg = {
+        "streams": "items",
+        "url": "http://x/items?offset={current_offset}&limit={items_per_page}",
+        "index_keys": {"items": "id"},
+        "start_index": 0,
+        "items_per_page": 100,
+        "filter_by_schema": False,
+        "auth_method": "no_auth",
+        "seek_start": True,
+    }
+    state = {"bookmarks": {"items": {"last_update": 537}}}
+    s = S.Sync(cfg, state, None)
+    s.started_at = datetime.datetime.now()
+    state = s.sync_rows(json.loads(json.dumps(state)), "items")
+
+    probes = [r for r in requested if r[1] == 1]
+    assert len(probes) <= 2 * 10 + 1
+    pages = [r[0] for r in requested if r[1] == 100]
+    assert pages == [537, 637, 737, 837, 937]
+    assert sync_stubs.ids == list(range(537, 1000))
+    assert state["bookmarks"]["items"]["last_update"] == 999
+
+
+def test_unsorted_first_run_stopped_early(sync_stubs):
+    from singer.catalog import Catalog
+
+    catalog = Catalog.from_dict({"streams": [{
+        "tap_stream_id": "orders", "stream": "orders", "schema": {"selected": True},
+        "metadata": [{"breadcrumb": [], "metadata": {"selected": True}}]}]})
+    for url in ("http://x/orders?offset={current_offset}&limit={items_per_page}",
+                # No resumable position
+                "http://x/orders?offset={current_offset}&after={last_update}"):
+        S, cfg, requested, states = _setup(sync_stubs, url)
+        s = S.Sync(dict(cfg, assume_sorted=False, max_page=1), {}, catalog)
+        s.sync()
+        # The bookmark stays at the start: the pages never fetched may hold
+        # older records
+        assert s.state["bookmarks"]["orders"]["last_update"] == cfg["start_datetime"]
@@ -0,0 +1,72 @@
+import gzip
+import json
+
+import getschema
+import pytest
+
+from tap_rest_api.sample import find_sample_file, iter_sample_rows
+from tap_rest_api.schema import Schema, SchemaInferrer
+
+
+ROWS = [
+    {"id": 1, "name": "a", "tags": [], "updated": "2026-01-01T00:00:00Z"},
+    {"id": 2, "name": None, "tags": ["x"], "score": 1.5},
+    {"id": "3", "nested": {"a": 1}},
+]
+
+
+def test_inferrer_matches_getschema():
+    inferrer = SchemaInferrer()
+    for row in json.loads(json.dumps(ROWS)):
+        inferrer.add(row)
+    assert inferrer.get_schema() == getschema.infer_schema(json.loads(json.dumps(ROWS)))
+    assert SchemaInferrer().get_schema() is None
+
+
+def test_inferrer_matches_getschema_with_record_level():
+    rows = [
+        {"r": {"id": 1, "price": 1, "at": "2026-01-01", "none": None,
+               "lines": [{"sku": "a", "qty": 1}], "meta": {"x": True}}},
+        {"r": {"id": 2, "price": 2.5, "at": "not a date", "none": None,
+               "lines": [{"sku": "b", "qty": "2"}, {"note": None}],
+               "meta": {"x": None}}},
+        {"r": {"id": 3, "lines": [], "extra": [1, 2]}},
+    ]
+    inferrer = SchemaInferrer(record_level="r")
+    for row in json.loads(json.dumps(rows)):
+        inferrer.add(row)
+    assert inferrer.count == 3
+    assert inferrer.get_schema() == getschema.infer_schema(
+        json.loads(json.dumps(rows)), record_level="r")
+
+
+@pytest.mark.parametrize("name", ["orders.json", "orders.json.gz", "orders.jsonl",
+                                  "orders.jsonl.gz", "orders.ndjson"])
+def test_sample_formats(tmp_path, name):
+    path = tmp_path / name
+    if ".json." in name or name.endswith(".json"):
+        content = json.dumps({"data": ROWS}).encode()
+    else:
+        content = b"\n".join(json.dumps(r).encode() for r in ROWS) + b"\n\n"
+    if name.endswith(".gz"):
+        content = gzip.compress(content)
+    path.write_bytes(content)
+
+    assert find_sample_file(str(tmp_path), "orders") == str(path)
+    assert list(iter_sample_rows(str(path), "data[*]")) == ROWS
+
+
+def test_infer_from_sample_with_limit(tmp_path):
+    with gzip.open(tmp_path / "orders.jsonl.gz", "wt") as f:
+        for i in range(1000):
+            f.write(json.dumps({"id": i, "late": "x"} if i == 999 else {"id": i}) + "\n")
+    config = {"url": "http://x", "sample_dir": str(tmp_path), "items_per_page": 100,
+              "index_key": "id", "start_index": 0}
+    schema = Schema(config).infer_schema("orders")
+    assert set(schema["properties"]) == {"id", "late"}
+
+    schema = Schema(dict(config, sample_limit=10)).infer_schema("orders")
+    assert set(schema["properties"]) == {"id"}
+
+    with pytest.raises(FileNotFoundError):
+        Schema(config).infer_schema("customers")
@@ -0,0 +1,125 @@
+import itertools
+import math
+import time
+
+import pytest
+
+from tap_rest_api.schedule import (
+    get_staleness,
+    get_time_slice,
+    order_streams,
+    update_schedule_stats,
+)
+
+
+CONFIG = {
+    "streams": "orders,users,events",
+    "datetime_keys": {"orders": "modified", "users": "modified"},
+    "index_keys": {"events": "id"},
+}
+NOW = 1767225600.0  # 2026-01-01T00:00:00+00:00
+
+
+def _state():
+    return {"bookmarks": {
+        "orders": {"last_update": "2025-12-31T23:00:00+00:00"},
+        # The bookmark is old but the stream was fully synced recently
+        "users": {"last_update": "2025-12-01T00:00:00+00:00",
+                  "schedule": {"synced_at": "2025-12-31T23:30:00+00:00",
+                               "duration_seconds": 50}},
+    }}
+
+
+def test_order_streams_by_staleness():
+    state = _state()
+    assert get_staleness(CONFIG, state, "orders", NOW) == 3600
+    assert get_staleness(CONFIG, state, "users", NOW) == 1800
+    assert get_staleness(CONFIG, state, "events", NOW) == math.inf
+    assert order_streams(CONFIG, state, ["orders", "users", "events"], NOW) == [
+        "events", "orders", "users"]
+
+
+def test_time_slice():
+    state = _state()
+    # users is expected to need 50s of its 100s share: orders gets the rest
+    assert get_time_slice(CONFIG, state, "orders", ["orders", "users"], 200) == 150
+    # No estimate for orders: its share is kept for it
+    assert get_time_slice(CONFIG, state, "users", ["orders", "users"], 200) == 100
+    config = dict(CONFIG, stream_budget_weights='{"orders": 3}')
+    assert get_time_slice(config, {}, "users", ["orders", "users"], 200) == 50
+    assert get_time_slice(CONFIG, state, "users", ["users"], 20) == 20
+    assert get_time_slice(CONFIG, state, "users", ["orders", "users"], -1) == 0
+
+
+def test_update_schedule_stats():
+    stats = update_schedule_stats({}, 40, True, NOW)
+    assert stats == {"duration_seconds": 40,
+                     "synced_at": "2026-01-01T00:00:00+00:00"}
+    assert update_schedule_stats(stats, 60, True, NOW + 10)["duration_seconds"] == 50
+    # Cut short: only a lower bound of the duration, and not synced
+    cut = update_schedule_stats(stats, 100, False, NOW + 10)
+    assert cut == dict(stats, duration_seconds=100)
+
+
+def test_slow_stream_leaves_time_for_the_others(sync_stubs):
+    import tap_rest_api.sync as S
+    from singer.catalog import Catalog
+
+    minutes = itertools.count()
+
+    def generate_request(stream_id, url, *a, **k):
+        if stream_id == "fast":
+            if url.endswith("page=0"):
+                return [{"id": 1, "modified": "2026-01-01T00:00:00+00:00"}]
+            return []
+        # A page per 50ms, never the last one
+        time.sleep(0.05)
+        return [{"id": 1, "modified": "2026-01-01T%02d:%02d:00+00:00"
+                 % divmod(next(minutes), 60)}]
+
+    sync_stubs.respond(generate_request)
+
+    config = {
+        "streams": "slow,fast",
+        "url": "http://x/{stream}?since={start_datetime}&page={current_page}",
+        "datetime_keys": {"slow": "modified", "fast": "modified"},
+        "start_datetime": "2025-01-01T00:00:00+00:00",
+        "end_datetime": "2027-01-01T00:00:00+00:00",
+        "items_per_page": 1,
+        "auth_method": "no_auth",
+        "filter_by_schema": False,
+        "global_timeout": 1,
+        "stream_scheduling": "deadline",
+    }
+    state = {"bookmarks": {"fast": {
+        "last_update": "2026-01-01T00:00:00+00:00",
+        "schedule": {"duration_seconds": 0.1,
+                     "synced_at": "2026-01-01T00:00:00+00:00"}}}}
+    catalog = Catalog.from_dict({"streams": [{
+        "tap_stream_id": stream, "stream": stream, "schema": {"selected": True},
+        "metadata": [{"breadcrumb": [], "metadata": {"selected": True}}]}
+        for stream in ("slow", "fast")]})
+
+    s = S.Sync(config, state, catalog)
+    s.sync()
+
+    # slow was never synced: it runs first, and stops at its time slice
+    assert sync_stubs.streams[0] == "slow" and sync_stubs.streams[-1] == "fast"
+    slow = s.state["bookmarks"]["slow"]["schedule"]
+    assert "synced_at" not in slow
+    assert 0.5 < slow["duration_seconds"] < 1
+    assert s.state["bookmarks"]["slow"]["pagination"]["current_page"] > 0
+    fast = s.state["bookmarks"]["fast"]["schedule"]
+    assert fast["synced_at"] != "2026-01-01T00:00:00+00:00"
+
+
+def test_unknown_stream_scheduling():
+    import tap_rest_api.sync as S
+    from singer.catalog import Catalog
+
+    catalog = Catalog.from_dict({"streams": [{
+        "tap_stream_id": "orders", "stream": "orders", "schema": {"selected": True},
+        "metadata": [{"breadcrumb": [], "metadata": {"selected": True}}]}]})
+    s = S.Sync({"streams": "orders", "stream_scheduling": "random"}, {}, catalog)
+    with pytest.raises(ValueError, match="stream_scheduling"):
+        s.sync()
@@ -95,3 +95,55 @@ def test_safe_update_lock_obj():
     safe_schema = Schema.safe_update(old_schema, new_schema, lock_obj)
     assert(safe_schema == expected_schema)
 
+
+
+def test_registry_loads_a_schema_once_until_the_file_changes(monkeypatch, tmp_path):
+    import json
+    import os
+    import tap_rest_api.schema as SC
+
+    path = tmp_path / "orders.json"
+    path.write_text(json.dumps({"type": "object", "properties": {"id": {"type": "integer"}}}))
+    loads = []
+    load_json = SC.utils.load_json
+    monkeypatch.setattr(SC.utils, "load_json", lambda p: loads.append(p) or load_json(p))
+    monkeypatch.setattr(SC, "REGISTRY", SC.SchemaRegistry())
+
+    schema_service = Schema({"schema_dir": str(tmp_path)})
+    first = schema_service.load_schema("orders")
+    assert schema_service.load_schema("orders") is first
+    assert len(loads) == 1
+
+    # discovery annotates a copy, not the shared schema
+    class Stream:
+        tap_stream_id = "orders"
+    discovered = schema_service.load_discovered_schema(Stream)
+    assert discovered["properties"]["id"]["inclusion"] == "automatic"
+    assert "inclusion" not in first["properties"]["id"]
+
+    path.write_text(json.dumps({"type": "object", "properties": {"id": {"type": "string"}}}))
+    os.utime(path, ns=(0, 0))
+    assert schema_service.load_schema("orders")["properties"]["id"]["type"] == "string"
+    assert len(loads) == 2
+
+
+def test_validate_reuses_the_compiled_validator(monkeypatch):
+    import tap_rest_api.schema as SC
+
+    monkeypatch.setattr(SC, "REGISTRY", SC.SchemaRegistry())
+    schema = {"type": "object", "properties": {"id": {"type": "integer"}}}
+    assert Schema.validate({"id": 1}, schema) == (True, None)
+    valid, reason = Schema.validate({"id": "x"}, schema)
+    assert not valid and "'x' is not of type 'integer'" in reason
+    assert len(SC.REGISTRY._validators) == 1
+
+
+def test_selected_streams():
+    from singer.catalog import Catalog
+    from tap_rest_api.helper import Stream, get_selected_streams
+
+    catalog = Catalog.from_dict({"streams": [
+        {"tap_stream_id": s, "stream": s,
+         "schema": {"type": "object", "selected": s != "b"}} for s in "abc"]})
+    streams = {s: Stream(s, {}) for s in "cba"}
+    assert [s.tap_stream_id for s in get_selected_streams(streams, catalog)] == ["c", "a"]
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from tap_rest_api.shard import merge_states, plan_shards
+
+
+def _config(**kwargs):
+    return dict({
+        "streams": "orders",
+        "url": "http://x/orders?since={start_datetime}&until={end_datetime}",
+        "datetime_keys": {"orders": "modified"},
+        "start_datetime": "2026-01-01T00:00:00+00:00",
+        "end_datetime": "2026-01-04T00:00:00+00:00",
+    }, **kwargs)
+
+
+def test_plan_shards():
+    shards = plan_shards(_config(), 3)
+    assert [(s["start_datetime"], s["end_datetime"]) for s in shards] == [
+        ("2026-01-01T00:00:00+00:00", "2026-01-02T00:00:00+00:00"),
+        ("2026-01-02T00:00:00+00:00", "2026-01-03T00:00:00+00:00"),
+        ("2026-01-03T00:00:00+00:00", "2026-01-04T00:00:00+00:00"),
+    ]
+    assert shards[1]["shard"] == {"index": 1, "count": 3,
+                                  "start": "2026-01-02T00:00:00+00:00",
+                                  "end": "2026-01-03T00:00:00+00:00"}
+    assert shards[1]["url"] == _config()["url"]
+
+    with pytest.raises(ValueError):
+        plan_shards(dict(_config(), datetime_keys=None,
+                         index_keys={"orders": "id"}, start_index=0), 3)
+
+
+def test_plan_shards_formats_the_bounds_as_configured():
+    config = _config(url_param_datetime_format="%Y-%m-%d %H:%M:%S",
+                     start_datetime="2026-01-01 00:00:00",
+                     end_datetime="2026-01-03 00:00:00")
+    shards = plan_shards(config, 2)
+    assert [(s["start_datetime"], s["end_datetime"]) for s in shards] == [
+        ("2026-01-01 00:00:00", "2026-01-02 00:00:00"),
+        ("2026-01-02 00:00:00", "2026-01-03 00:00:00"),
+    ]
+    assert shards[1]["shard"]["start"] == "2026-01-02 00:00:00"
+
+    shards = plan_shards(_config(url_param_isoformat_use_zulu=True), 3)
+    assert shards[0]["end_datetime"] == "2026-01-02T00:00:00Z"
+
+
+def _shard_state(index, last_update, completed=True, count=2):
+    return {"bookmarks": {"orders": {
+        "last_update": last_update,
+        "last_record_extracted": "{\"digest\": \"%d\"}" % index,
+        "shard": {"index": index, "count": count, "completed": completed}}}}
+
+
+def test_merge_states():
+    merged = merge_states([_shard_state(1, "2026-01-03T10:00:00.000000"),
+                           _shard_state(0, "2026-01-01T23:00:00.000000")])
+    assert merged == {"bookmarks": {"orders": {
+        "last_update": "2026-01-03T10:00:00.000000",
+        "last_record_extracted": "{\"digest\": \"1\"}"}}}
+
+    with pytest.raises(ValueError, match="orders shard 0"):
+        merge_states([_shard_state(1, "2026-01-03T10:00:00.000000"),
+                      _shard_state(0, "2026-01-01T23:00:00.000000", completed=False)])
+    with pytest.raises(ValueError, match="no state"):
+        merge_states([_shard_state(1, "2026-01-03T10:00:00.000000")])
+
+
+def test_shard_run_marks_the_stream_completed(sync_stubs):
+    import tap_rest_api.sync as S
+    from singer.catalog import Catalog
+
+    sync_stubs.respond([{"id": 1, "modified": "2026-01-02T05:00:00+00:00"}])
+
+    config = plan_shards(dict(_config(), items_per_page=100, auth_method="no_auth",
+                              filter_by_schema=False), 3)[1]
+    catalog = Catalog.from_dict({"streams": [{
+        "tap_stream_id": "orders", "stream": "orders", "schema": {"selected": True},
+        "metadata": [{"breadcrumb": [], "metadata": {"selected": True}}]}]})
+    s = S.Sync(config, {}, catalog)
+    s.sync()
+    bookmark = s.state["bookmarks"]["orders"]
+    assert bookmark["shard"]["index"] == 1
+    assert bookmark["shard"]["completed"] is True
+    merged = merge_states([json.loads(json.dumps(s.state))] + [
+        _shard_state(i, "2026-01-01T00:00:00+00:00", count=3) for i in (0, 2)])
+    assert merged["bookmarks"]["orders"]["last_update"] == bookmark["last_update"]
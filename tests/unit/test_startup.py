@@ -0,0 +1,42 @@
+import subprocess
+import sys
+
+
+def _imported_modules(statement):
+    """Run the statement in a fresh interpreter with -X importtime and return the
+    names of the modules it imported."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                          capture_output=True, text=True, check=True)
+    modules = set()
+    for line in proc.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            name = line.rsplit("|", 1)[1].strip()
+            if name != "imported package":
+                modules.add(name)
+    return modules
+
+
+# Modules a mode loads only when it needs them. (concurrent.futures is not one:
+# singer already loads it through asyncio.)
+DEFERRED = {"jsonpath_ng", "getschema", "yaml", "attr", "gzip", "orjson", "pyarrow"}
+
+
+def test_cli_startup_defers_the_mode_modules():
+    modules = _imported_modules("import tap_rest_api.main")
+    assert not modules & DEFERRED
+    assert not modules & {"tap_rest_api.sync", "tap_rest_api.schema",
+                          "tap_rest_api.batch"}
+
+
+def test_discover_does_not_load_the_sync_modules():
+    modules = _imported_modules("from tap_rest_api.schema import discover")
+    assert not modules & DEFERRED
+    assert not modules & {"tap_rest_api.sync", "tap_rest_api.batch"}
+
+
+def test_sync_loads_the_parsers_on_demand():
+    modules = _imported_modules("from tap_rest_api.sync import sync")
+    assert not modules & DEFERRED
+    modules = _imported_modules(
+        "from tap_rest_api.helper import get_record; get_record({'a': 1}, '$.a')")
+    assert "jsonpath_ng" in modules
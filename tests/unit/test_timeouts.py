@@ -0,0 +1,62 @@
+import time
+
+import pytest
+import requests
+
+import tap_rest_api.helper as H
+
+
+class Response(object):
+    status_code = 200
+    content = b"[]"
+
+    def raise_for_status(self):
+        pass
+
+
+class Session(object):
+    def __init__(self, error=None):
+        self.error = error
+        self.timeouts = []
+
+    def get(self, url, timeout=None, **kwargs):
+        self.timeouts.append(timeout)
+        if self.error:
+            raise self.error
+        return Response()
+
+
+def test_timeouts_are_passed_and_fit_the_deadline(monkeypatch):
+    session = Session()
+    monkeypatch.setattr(H, "get_session", lambda: session)
+    assert H.generate_request("orders", "http://x/orders", timeout=(3, 30)) == []
+    assert H.generate_request("orders", "http://x/orders") == []
+    H.generate_request("orders", "http://x/orders", timeout=(3, 30),
+                       deadline=time.time() + 5)
+    assert session.timeouts[:2] == [(3, 30), (H.CONNECT_TIMEOUT, H.READ_TIMEOUT)]
+    assert session.timeouts[2][0] == 3 and 4 < session.timeouts[2][1] <= 5
+
+    with pytest.raises(H.DeadlineExceeded):
+        H.generate_request("orders", "http://x/orders", deadline=time.time() - 1)
+
+
+def test_backoff_stops_at_the_deadline(monkeypatch):
+    now = [time.time()]
+    session = Session(error=requests.exceptions.ConnectionError("down"))
+
+    def get(url, timeout=None, **kwargs):
+        # Every failed try takes half a second
+        now[0] += 0.5
+        return Session.get(session, url, timeout=timeout, **kwargs)
+
+    monkeypatch.setattr(session, "get", get)
+    monkeypatch.setattr(H, "get_session", lambda: session)
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    # The backoff waits are skipped: only the clock tells the deadline
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    with pytest.raises(H.DeadlineExceeded):
+        H.generate_request("orders", "http://x/orders", deadline=now[0] + 1.5)
+    # 3 tries before the deadline instead of 5, none of them past it: the
+    # retries get the remaining time
+    assert len(session.timeouts) > 1
+    assert [read for _, read in session.timeouts] == pytest.approx([1.5, 1.0, 0.5])
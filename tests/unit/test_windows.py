@@ -6,6 +6,8 @@ import pytest
 
 from tap_rest_api.helper import (
     iter_window_bounds,
+    get_endpoint,
+    get_url_template,
     get_windowed_endpoint_params,
     get_window_seconds,
     format_datetime,
@@ -77,6 +79,30 @@ def test_windowed_params_datetime_bookmark():
     assert params["last_update"] == params["start_datetime"]
 
 
+def test_windowed_params_do_not_copy_the_config():
+    cfg = {"datetime_keys": {"orders": "modified"}, "unnest": {"orders": []}}
+    params = get_windowed_endpoint_params(cfg, "orders", 0, 3600)
+    assert params.maps[-1] is cfg
+    assert params["unnest"] is cfg["unnest"]
+    params["current_page"] = 3
+    assert "current_page" not in cfg
+
+
+def test_url_template_renders_the_referenced_fields():
+    url = "https://x/{resource}/items?q={query}&page={current_page}&{{literal}}"
+    template = get_url_template(url)
+    assert get_url_template(url) is template
+    assert template.fields == {"resource", "query", "current_page"}
+    # unreferenced values (e.g. a nested config dict) are never quoted
+    data = {"query": "a b/c", "current_page": 0, "http_headers": object()}
+    assert get_endpoint(url, "my stream", data) == \
+        "https://x/my%20stream/items?q=a%20b/c&page=0&{literal}"
+    data["current_page"] = 1
+    assert get_endpoint(url, "my stream", data).endswith("&page=1&{literal}")
+    with pytest.raises(KeyError):
+        get_endpoint(url, "my stream", {"query": "a"})
+
+
 def test_windowed_params_requires_time_bookmark():
     cfg = {"index_keys": {"orders": "id"}}
     with pytest.raises(ValueError):